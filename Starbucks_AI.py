@@ -1,60 +1,339 @@
 # Starbucks_AI.py
 import os
 import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
 import pandas as pd
-from openai import OpenAI
 
-def generate_ai_insights(df, date_range=None, active_filters=None):
-    if df.empty:
-        return "No data available for the current filters."
+from Starbucks_Perf import traced
+
+# -----------------------------
+# Insights service
+# -----------------------------
+# Facts are a few aggregates (KPIs, channel / category totals, growth) built
+# from frames the dashboard already has; no rows are copied. A response is
+# cached on disk under a hash of the facts JSON + model + prompt version, so
+# the same filters never pay for the API twice, even across restarts.
+# Requests run on a small thread pool and stream their text into an
+# InsightJob, which the app polls without blocking the rest of the page.
+# The client is pluggable: anything with stream(messages, model, timeout)
+# works, and
+# BREWED_AI_BASE_URL points the OpenAI client at e.g. the stub server below.
+
+MODEL = os.getenv("BREWED_AI_MODEL", "gpt-3.5-turbo")
+AI_TIMEOUT = float(os.getenv("BREWED_AI_TIMEOUT", "30"))  # seconds per answer, stream included
+AI_CACHE_DIR = os.getenv("BREWED_AI_CACHE_DIR", os.path.join("data", "ai_cache"))
+PROMPT_VERSION = 1  # bump when SYSTEM_PROMPT changes; part of the cache key
+
+SYSTEM_PROMPT = (
+    "You are an analytics assistant for a coffeehouse chain. "
+    "Use the provided data summary to write key insights in a friendly, business tone. "
+    "Highlight growth, trends, best performers, and 2 action recommendations. "
+    "Be concise — around 6–9 bullet points. Use $ and % where meaningful."
+)
 
-    # --- summary data ---
-    d = df.copy()
-    if 'Order Timestamp' in d.columns:
-        d['Order Timestamp'] = pd.to_datetime(d['Order Timestamp'])
-        d['date'] = d['Order Timestamp'].dt.date
+# -----------------------------
+# Facts
+# -----------------------------
 
-    revenue = d['Total Amount'].sum() if 'Total Amount' in d.columns else 0
-    orders = d['Order ID'].nunique() if 'Order ID' in d.columns else len(d)
-    aov = revenue / orders if orders else 0
+def _top(totals: pd.Series, n: int = 3) -> dict:
+    return {str(k): round(float(v), 2) for k, v in totals.nlargest(n).items()}
 
-    top_cat = d.groupby('Category')['Total Amount'].sum().nlargest(3).to_dict() if 'Category' in d.columns else {}
-    top_channel = d.groupby('Channel')['Total Amount'].sum().nlargest(3).to_dict() if 'Channel' in d.columns else {}
+def _num(x, digits=2):
+    # JSON-safe rounded float; NaN -> None
+    return None if x is None or pd.isna(x) else round(float(x), digits)
 
+def build_facts(kpis: dict, trend: pd.DataFrame = None, channel_share: pd.DataFrame = None,
+                items: pd.DataFrame = None, date_range=None, active_filters=None,
+                categories: pd.DataFrame = None) -> dict:
+    # kpis as returned by a query selection; trend / channel_share / categories are the chart frames
     facts = {
         "filters": active_filters,
-        "date_range": date_range,
-        "revenue": round(revenue, 2),
-        "orders": int(orders),
-        "aov": round(aov, 2),
-        "top_categories": top_cat,
-        "top_channels": top_channel,
+        "date_range": [str(d) for d in date_range] if date_range else None,
+        "revenue": _num(kpis["revenue"]),
+        "orders": int(kpis["orders"]),
+        "aov": _num(kpis["aov"]),
+        "gross_margin_pct": _num(kpis["gross_margin_pct"], 1),
+        "weather_sensitivity_pct": _num(kpis.get("weather_sensitivity"), 1),
     }
+    if trend is not None and len(trend) >= 2:
+        # second half of the window vs the first, on the trend chart's buckets
+        total = trend["Total"].to_numpy(dtype=np.float64)
+        half = len(total) // 2
+        first, second = total[:half].sum(), total[-half:].sum()
+        facts["revenue_change_pct"] = _num((second - first) / first * 100, 1) if first else None
+        peak = int(np.argmax(total))
+        facts["peak_period"] = str(pd.Timestamp(trend["Order Timestamp"].iloc[peak]).date())
+    if channel_share is not None and len(channel_share):
+        facts["top_channels"] = _top(channel_share.groupby("Channel", observed=True)["Revenue"].sum())
+    if categories is not None and len(categories):
+        facts["top_categories"] = _top(categories.groupby("Category", observed=True)["Revenue"].sum())
+    elif items is not None and len(items) and {"Category", "Price", "Quantity"}.issubset(items.columns):
+        line_revenue = items["Price"].to_numpy(dtype=np.float64) * items["Quantity"].to_numpy(dtype=np.float64)
+        facts["top_categories"] = _top(pd.Series(line_revenue).groupby(items["Category"].to_numpy()).sum())
+    return facts
 
-    system_prompt = (
-        "You are an analytics assistant for a coffeehouse chain. "
-        "Use the provided data summary to write key insights in a friendly, business tone. "
-        "Highlight growth, trends, best performers, and 2 action recommendations. "
-        "Be concise — around 6–9 bullet points. Use $ and % where meaningful."
-    )
+def facts_from_orders(df: pd.DataFrame, items: pd.DataFrame = None, date_range=None, active_filters=None) -> dict:
+    # the same facts straight from a filtered orders frame (column reductions only)
+    revenue = float(df["Total Amount"].sum()) if "Total Amount" in df.columns else 0.0
+    n_orders = int(df["Order ID"].nunique()) if "Order ID" in df.columns else len(df)
+    profit = float(df["Profit"].sum()) if "Profit" in df.columns else 0.0
+    kpis = {"revenue": revenue, "orders": n_orders, "aov": revenue / n_orders if n_orders else 0.0,
+            "gross_margin_pct": profit / revenue * 100 if revenue else 0.0}
+    channels = None
+    if {"Channel", "Total Amount"}.issubset(df.columns):
+        channels = df.groupby("Channel", observed=True)["Total Amount"].sum().rename("Revenue").reset_index()
+    return build_facts(kpis, None, channels, items, date_range, active_filters)
 
-    # --- OpenAI call ---
-    try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", None))
-        if not client.api_key:
-            return "⚠️ Missing OpenAI API key. Set it in environment or .streamlit/secrets.toml."
-
-        user = f"FACTS JSON:\n{json.dumps(facts, ensure_ascii=False, default=str)}"
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user},
-            ],
+def facts_json(facts: dict) -> str:
+    return json.dumps(facts, ensure_ascii=False, sort_keys=True, default=str)
+
+def build_messages(facts: dict) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"FACTS JSON:\n{facts_json(facts)}"},
+    ]
+
+# -----------------------------
+# Response cache
+# -----------------------------
+
+class InsightsCache:
+    # one small JSON file per answer; safe to delete at any time
+    def __init__(self, cache_dir: str = AI_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(facts: dict, model: str) -> str:
+        payload = f"{PROMPT_VERSION}\n{model}\n{facts_json(facts)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as fh:
+                return json.load(fh)["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, text: str, model: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"model": model, "created": time.time(), "text": text}, fh, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+
+# -----------------------------
+# Clients
+# -----------------------------
+
+class MissingKeyError(RuntimeError):
+    pass
+
+class OpenAIClient:
+    def __init__(self, api_key: str = None, base_url: str = None, timeout: float = AI_TIMEOUT):
+        from openai import OpenAI
+        # no retries: a retry would silently double the caller's timeout
+        self._client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+    def stream(self, messages: list, model: str, timeout: float = None, temperature: float = 0.7):
+        # timeout bounds the connect and every read, so a stalled stream fails instead of hanging
+        response = self._client.chat.completions.create(
+            model=model, temperature=temperature, messages=messages, stream=True,
+            **({"timeout": timeout} if timeout is not None else {}),
         )
-        return response.choices[0].message.content.strip()
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+def default_client():
+    # None when there is no key and no stand-in server; the service reports it per request
+    api_key = os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("BREWED_AI_BASE_URL")
+    if base_url:
+        return OpenAIClient(api_key=api_key or "stub", base_url=base_url)
+    if not api_key:
+        return None
+    return OpenAIClient(api_key=api_key)
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+
+class InsightJob:
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks = []
+        self.error = None
+        self.cached = False
+        self.done = threading.Event()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def finish(self, text: str = None, error: str = None):
+        if text is not None:
+            self.chunks = [text]
+        self.error = error
+        self.done.set()
+
+    def result(self, timeout: float = None) -> str:
+        # blocking convenience for scripts; errors come back as the message text
+        if not self.done.wait(timeout):
+            return "⚠️ Insights are still being generated."
+        return f"⚠️ {self.error}" if self.error else self.text.strip()
+
+class InsightsService:
+    def __init__(self, client=None, cache: InsightsCache = None, model: str = MODEL,
+                 timeout: float = AI_TIMEOUT, workers: int = 2):
+        self.client = client
+        self.cache = cache or InsightsCache()
+        self.model = model
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insights")
+        self._running = {}  # key -> in-flight job, so repeated clicks share one request
+        self._lock = threading.Lock()
+
+    def key(self, facts: dict) -> str:
+        return self.cache.key(facts, self.model)
+
+    def cached(self, facts: dict):
+        # finished job for a cached answer, else None
+        key = self.key(facts)
+        text = self.cache.get(key)
+        if text is None:
+            return None
+        job = InsightJob(key)
+        job.cached = True
+        job.finish(text)
+        return job
+
+    def submit(self, facts: dict) -> InsightJob:
+        job = self.cached(facts)
+        if job is not None:
+            return job
+        key = self.key(facts)
+        with self._lock:
+            job = self._running.get(key)
+            if job is None:
+                job = self._running[key] = InsightJob(key)
+                self._pool.submit(self._run, job, build_messages(facts))
+        return job
+
+    def _run(self, job: InsightJob, messages: list):
+        deadline = time.monotonic() + self.timeout
+        try:
+            if self.client is None:
+                raise MissingKeyError("Missing OpenAI API key. Set it in environment or .streamlit/secrets.toml.")
+            # the client's own timeout covers waits between chunks; the deadline covers the whole answer
+            for piece in self.client.stream(messages, self.model, timeout=self.timeout):
+                job.chunks.append(piece)
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"no complete answer within {self.timeout:g}s")
+            text = job.text.strip()
+            self.cache.put(job.key, text, self.model)
+            job.finish(text)
+        except MissingKeyError as e:
+            job.finish(error=str(e))
+        except Exception as e:
+            job.finish(error=f"Error generating insights: {e}")
+        finally:
+            with self._lock:
+                self._running.pop(job.key, None)
+
+@traced()
+def generate_ai_insights(df, date_range=None, active_filters=None, items=None, service: InsightsService = None):
+    # synchronous one-shot, for callers outside the app
+    if df.empty:
+        return "No data available for the current filters."
+    service = service or InsightsService(default_client())
+    job = service.submit(facts_from_orders(df, items, date_range, active_filters))
+    return job.result(service.timeout + 5)
+
+# -----------------------------
+# Stub server
+# -----------------------------
+# An OpenAI-compatible /v1/chat/completions endpoint that answers from the
+# facts in the prompt, streamed word by word. Point the app at it with
+# BREWED_AI_BASE_URL=http://127.0.0.1:8011/v1 to exercise the whole path
+# (cache, background job, streaming, timeout via --delay) without an API key.
+
+def stub_reply(messages: list) -> str:
+    content = messages[-1]["content"] if messages else ""
+    try:
+        facts = json.loads(content.split("\n", 1)[1])
+    except (IndexError, ValueError):
+        facts = {}
+    lines = [f"- Revenue was ${facts.get('revenue') or 0:,.2f} across {facts.get('orders') or 0:,} orders "
+             f"(AOV ${facts.get('aov') or 0:,.2f})."]
+    if facts.get("revenue_change_pct") is not None:
+        lines.append(f"- Revenue changed {facts['revenue_change_pct']:+.1f}% from the first to the second half.")
+    for field, label in (("top_channels", "channel"), ("top_categories", "category")):
+        if facts.get(field):
+            lines.append(f"- Top {label}: {next(iter(facts[field]))}.")
+    lines.append("- Stub answer: set OPENAI_API_KEY and unset BREWED_AI_BASE_URL for real insights.")
+    return "\n".join(lines)
+
+class _StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0  # seconds between streamed words
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        text = stub_reply(req.get("messages", []))
+        base = {"id": "stub", "created": int(time.time()), "model": req.get("model", "stub")}
+        if not req.get("stream"):
+            self._send_json({**base, "object": "chat.completion", "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def event(delta, finish=None):
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        for word in text.split(" "):
+            event({"content": word + " "})
+            time.sleep(self.delay)
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+def serve_stub(host: str = "127.0.0.1", port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    # starts in a daemon thread; port=0 picks a free one (see server.server_address)
+    handler = type("StubHandler", (_StubHandler,), {"delay": delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
 
-    except Exception as e:
-        return f"⚠️ Error generating insights: {e}"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stand-in for the chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds between streamed words")
+    args = parser.parse_args()
+    server = serve_stub(args.host, args.port, args.delay)
+    print(f"stub API on http://{args.host}:{server.server_address[1]}/v1")
+    threading.Event().wait()
@@ -1,18 +1,52 @@
-import os, hashlib
+import time
+_script_t0 = time.perf_counter()  # startup report: covers this script's imports too
+
+import os
 import streamlit as st
 import pandas as pd
 
-from Starbucks_AI import generate_ai_insights
-from Starbucks_Plots import monthly_trends, channel_share_over_time, daypart_week_heatmap, correlation_heatmap
-from Starbucks_Faker import generate_and_save 
+from Starbucks_AI import InsightsService, build_facts, default_client
+from Starbucks_Plots import (trend_figure, channel_share_figure, daypart_week_figure, correlation_figure,
+                             category_profitability_figure, basket_pairs_figure, forecast_figure,
+                             store_leaderboard_figure, trend_frame, channel_share_frame, daypart_week_frame)
+from Starbucks_Storage import (detect_format, load_tables, save_tables, load_table, table_path, table_columns,
+                               convert_csv_dir, DEFAULT_FORMAT, load_partition_meta, load_partitioned)
+from Starbucks_Rollup import (build_cube, slice_cube, load_cube, save_cube, build_category_cube, load_category_cube,
+                              save_category_cube, build_store_cube, load_store_cube, save_store_cube)
+from Starbucks_Index import FilterIndex, sort_for_index
+from Starbucks_Features import add_derived_features, has_features, FEATURE_COLUMNS
+from Starbucks_Manifest import dataset_fingerprint, sync_dataset, load_params, FINGERPRINT_FILE
+from Starbucks_Cache import ViewCache, view_key, figure_json, figure_from_json
+from Starbucks_Shared import SharedDataset, DatasetHandle
+from Starbucks_Stats import build_moments, load_moments, save_moments, CORR_SAMPLE_ROWS
+from Starbucks_Sketch import build_sketch, load_sketch, save_sketch, DISTINCT_MODE
+from Starbucks_Basket import (Basket, build_basket_table, load_basket_table, save_basket_table,
+                              baskets_from_table, BASKET_LEVELS)
+from Starbucks_Forecast import StoreForecast, BAND_LEVEL
+from Starbucks_Stores import StoreBoard, top_stores, STORE_METRICS, LEADERBOARD_K
+from Starbucks_Query import PandasBackend, DuckDBBackend, DEFAULT_ENGINE
+from Starbucks_Perf import span, begin_trace, end_trace, to_prometheus, write_prometheus, STARTUP
 
-def file_md5(path: str) -> str:
-    with open(path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+STARTUP.begin(_script_t0)
+STARTUP.mark("imports")
 
-FAKER_PATH = "Starbucks_Faker.py"
 os.makedirs("data", exist_ok=True)
-HASH_FILE = "data/_faker_hash.txt"
+HASH_FILE = os.path.join("data", FINGERPRINT_FILE)
+# DEFAULT_PARAMS unless a batch job (python Starbucks_Faker.py ...) generated data/ with others
+GEN_PARAMS = load_params("data")
+# "single": one file per table; "partitioned": Month/Region dataset read with filter pushdown
+LAYOUT = os.getenv("BREWED_LAYOUT", "single")
+# "standard": strings/UUIDs as generated; "compact": categoricals + integer surrogate keys
+SCHEMA = os.getenv("BREWED_SCHEMA", "standard")
+# per-process budget for cached filtered views (frames + KPIs + figures)
+VIEW_CACHE_MB = int(os.getenv("BREWED_VIEW_CACHE_MB", "512"))
+# "pandas": in-memory frames + rollups; "duckdb": SQL over the files in data/, nothing loaded up front
+ENGINE = DEFAULT_ENGINE
+# "exact": order counts from the cube / rows; "sketch": HyperLogLog estimates (BREWED_HLL_ERROR sets the error)
+DISTINCT = DISTINCT_MODE
+# "1" shows the Performance expander (also ?perf=1); BREWED_METRICS_FILE gets Prometheus text after each rerun
+PERF_PANEL = os.getenv("BREWED_PERF_PANEL", "0") == "1"
+METRICS_FILE = os.getenv("BREWED_METRICS_FILE")
 
 st.set_page_config(page_title="Brewed Insights ☕", page_icon="☕", layout="wide")
 
@@ -36,37 +70,239 @@ div[data-testid="stMetricValue"] { font-weight: 700; }
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data()
-def load_data(faker_hash: str):
-    prev_hash = None
+def stored_hash():
     if os.path.exists(HASH_FILE):
         try:
-            prev_hash = open(HASH_FILE, "r").read().strip()
+            return open(HASH_FILE, "r").read().strip()
         except Exception:
-            prev_hash = None
+            return None
+    return None
 
-    csv_missing = not (os.path.exists("data/stores.csv")
-                       and os.path.exists("data/orders.csv")
-                       and os.path.exists("data/order_items.csv"))
+@st.cache_data()
+def prepare_single_dir(faker_hash: str) -> str:
+    # single layout: make data/ current for faker_hash without keeping anything in memory; -> format
+    prev_hash = stored_hash()
+    fmt = detect_format("data")
 
-    if csv_missing or (faker_hash != prev_hash):
+    if fmt is None or (faker_hash != prev_hash):
+        from Starbucks_Faker import generate_to_dir  # only needed when data/ is missing or stale
         with st.spinner("Generating synthetic data…"):
-            stores_df, orders_df, items_df = generate_and_save()
+            generate_to_dir("data", **GEN_PARAMS)
         # record the new hash
         with open(HASH_FILE, "w") as f:
             f.write(faker_hash)
+    elif fmt == "csv" and DEFAULT_FORMAT != "csv":
+        # one-shot upgrade of an existing CSV data directory
+        with st.spinner("Converting data to columnar storage…"):
+            convert_csv_dir("data")
+    fmt = detect_format("data")
+    if not set(FEATURE_COLUMNS) <= set(table_columns(table_path("data", "orders", fmt), fmt)):
+        # data written before derived features existed: add and persist once
+        stores_df, orders_df, items_df = load_tables("data", fmt=fmt)
+        orders_df = add_derived_features(orders_df, items_df)
+        save_tables(stores_df, orders_df, items_df, "data", fmt=fmt)
+    return fmt
+
+def read_dataset(faker_hash: str) -> SharedDataset:
+    fmt = prepare_single_dir(faker_hash)
+    stores_df, orders_df, items_df = load_tables("data", fmt=fmt)
+    keys = None
+    if SCHEMA == "compact":
+        from Starbucks_Schema import to_compact  # only the compact schema needs the generator's domain sets
+        stores_df, orders_df, items_df, keys = to_compact(stores_df, orders_df, items_df)
+    # the snapshot is stored in index order, so the filter index references it instead of copying it
+    orders_df, items_df = sort_for_index(orders_df, items_df)
+    return SharedDataset(faker_hash, orders_df, items_df, stores_df, keys)
+
+def with_ids(df: pd.DataFrame, keys) -> pd.DataFrame:
+    # compact schema: surrogate keys back to the UUIDs; keys is None otherwise
+    if not keys:
+        return df
+    from Starbucks_Schema import restore_ids
+    return restore_ids(df, keys)
+
+@st.cache_resource()
+def dataset_handle():
+    # one read-only copy of the tables per process, shared by every session;
+    # a new faker_hash loads the new version and swaps it in atomically
+    return DatasetHandle()
+
+@st.cache_data()
+def load_partition_index(faker_hash: str):
+    # partitioned layout: only stores + dataset bounds are loaded up front.
+    # The manifest tracks shards, so a parameter change only regenerates the
+    # shards it touches (e.g. extending the window adds the new weeks).
+    with st.spinner("Syncing synthetic data…"):
+        sync_dataset("data", **GEN_PARAMS)
+    stores_df = load_table(table_path("data", "stores", "parquet"), "parquet")
+    return stores_df, load_partition_meta("data")
+
+@st.cache_data(max_entries=32)
+def load_filtered(faker_hash: str, _stores: pd.DataFrame, start_date, end_date, regions: tuple, channels: tuple):
+    f, fi = load_partitioned("data", start_date, end_date, list(regions), list(channels))
+    if not has_features(f):
+        f = add_derived_features(f, fi)
+    keys = None
+    if SCHEMA == "compact":
+        from Starbucks_Schema import to_compact
+        _, f, fi, keys = to_compact(_stores, f, fi)
+    return f, fi, keys
+
+@st.cache_data()
+def load_rollup(faker_hash: str, _orders: pd.DataFrame = None):
+    cube = load_cube("data")
+    if cube is None:
+        # data written before rollups existed: build once and persist
+        src = _orders if _orders is not None else load_partitioned("data")[0]
+        cube = build_cube(src)
+        save_cube(cube, "data")
+    return cube
+
+@st.cache_data()
+def load_category_table(faker_hash: str, _orders: pd.DataFrame = None, _items: pd.DataFrame = None):
+    # Date x Region x Channel x Category x Subcategory revenue and allocated profit
+    cat_cube = load_category_cube("data")
+    if cat_cube is None:
+        src, src_items = (_orders, _items) if _orders is not None else load_partitioned("data")
+        cat_cube = build_category_cube(src, src_items)
+        save_category_cube(cat_cube, "data")
+    return cat_cube
+
+@st.cache_data()
+def load_store_table(faker_hash: str, _orders: pd.DataFrame = None):
+    # Date x Store x Channel x Daypart revenue / profit / temperature sums
+    store_cube = load_store_cube("data")
+    if store_cube is None:
+        if _orders is not None:
+            src = _orders
+        elif LAYOUT == "partitioned":
+            src = load_partitioned("data")[0]
+        else:
+            src = load_table(table_path("data", "orders", detect_format("data")), detect_format("data"))
+        store_cube = build_store_cube(src)
+        save_store_cube(store_cube, "data")
+    return store_cube
+
+@st.cache_resource(max_entries=1)
+def load_forecasts(faker_hash: str) -> dict:
+    # channel selection -> StoreForecast for the current dataset; one entry, so a new version drops the old fits
+    return {}
+
+def load_forecast(faker_hash: str, channels: tuple, _orders: pd.DataFrame = None):
+    # every store fitted in one batched pass; refit only when the data or the channel selection changes
+    fits = load_forecasts(faker_hash)
+    if channels not in fits:
+        store_cube = load_store_table(faker_hash, _orders)
+        fits[channels] = StoreForecast.fit(store_cube, list(channels)) if len(store_cube) else None
+    return fits[channels]
+
+@st.cache_resource(max_entries=1)
+def load_store_board(faker_hash: str, _stores: pd.DataFrame, _orders: pd.DataFrame = None):
+    # per-store daily totals sorted by date + per-store rows for the drill-down; one entry, so a new
+    # dataset version replaces the old board instead of sitting next to it
+    return StoreBoard(load_store_table(faker_hash, _orders), _stores)
+
+@st.cache_data()
+def load_baskets(faker_hash: str, _items: pd.DataFrame = None):
+    # whole-history co-occurrence per level: the unfiltered Basket tab skips the item scan
+    table = load_basket_table("data")
+    if table is None:
+        if _items is not None:
+            src = _items
+        elif LAYOUT == "partitioned":
+            src = load_partitioned("data")[1]
+        else:
+            src = load_table(table_path("data", "items", detect_format("data")), detect_format("data"))
+        table = build_basket_table(src)
+        save_basket_table(table, "data")
+    return baskets_from_table(table)
+
+@st.cache_data()
+def load_moment_table(faker_hash: str, _orders: pd.DataFrame = None):
+    # per-cell covariance partials for the correlation heatmap
+    moments = load_moments("data")
+    if moments is None:
+        src = _orders if _orders is not None else load_partitioned("data")[0]
+        moments = build_moments(src)
+        save_moments(moments, "data")
+    return moments
+
+@st.cache_data()
+def load_sketch_table(faker_hash: str, _orders: pd.DataFrame = None):
+    # per-(month, region, channel) HyperLogLog registers for approximate distinct orders
+    sketch = load_sketch("data")
+    if sketch is None:
+        src = _orders if _orders is not None else load_partitioned("data")[0]
+        sketch = build_sketch(src)
+        save_sketch(sketch, "data")
+    return sketch
+
+@st.cache_resource()
+def insights_service():
+    return InsightsService(default_client())
+
+@st.cache_resource()
+def get_view_cache():
+    return ViewCache(max_bytes=VIEW_CACHE_MB * 2**20)
+
+@st.cache_resource()
+def load_duckdb_backend(faker_hash: str, layout: str):
+    return DuckDBBackend("data", layout)
+
+# ---------- TITLE ----------
+# drawn before any data work, so a cold start shows the page straight away
+st.markdown("### **Brewed Insights** — Starbucks-style Analytics ☕")
+st.caption("Warm, synthetic data. Not affiliated with Starbucks.")
+
+trace = begin_trace("rerun")
+
+# changes with generator parameters / domain config, not with edits to the generator's source
+faker_hash = dataset_fingerprint(**GEN_PARAMS)
+with span("load data"):
+    if LAYOUT == "partitioned":
+        stores, part_meta = load_partition_index(faker_hash)
+        orders = items = None
+        all_regions  = sorted(stores["Region"].dropna().unique().tolist()) if "Region" in stores else []
+        all_channels = part_meta["channels"]
+        min_date = pd.to_datetime(part_meta["min_ts"]).date()
+        max_date = pd.to_datetime(part_meta["max_ts"]).date()
+    elif ENGINE == "duckdb":
+        # the engine scans data/ itself; only the (small) stores table is read here
+        fmt = prepare_single_dir(faker_hash)
+        stores = load_table(table_path("data", "stores", fmt), fmt)
+        orders = items = id_keys = None
+        all_regions  = sorted(stores["Region"].dropna().unique().tolist()) if "Region" in stores else []
+        bounds = load_duckdb_backend(faker_hash, LAYOUT).bounds()
+        all_channels = bounds["channels"]
+        min_date = pd.to_datetime(bounds["min_ts"]).date()
+        max_date = pd.to_datetime(bounds["max_ts"]).date()
     else:
-        stores_df = pd.read_csv("data/stores.csv")
-        orders_df = pd.read_csv("data/orders.csv", parse_dates=["Order Timestamp"])
-        items_df  = pd.read_csv("data/order_items.csv")
-    return orders_df, items_df, stores_df
-
-faker_hash = file_md5(FAKER_PATH)
-orders, items, stores = load_data(faker_hash)
-all_regions  = sorted(stores["Region"].dropna().unique().tolist()) if "Region" in stores else []
-all_channels = sorted(orders["Channel"].dropna().unique().tolist()) if "Channel" in orders else []
-min_date = pd.to_datetime(orders["Order Timestamp"].min()).date()
-max_date = pd.to_datetime(orders["Order Timestamp"].max()).date()
+        dataset = dataset_handle().ensure(faker_hash, read_dataset)
+        orders, items, stores, id_keys = dataset.tables()
+        all_regions  = sorted(stores["Region"].dropna().unique().tolist()) if "Region" in stores else []
+        all_channels = sorted(orders["Channel"].dropna().unique().tolist()) if "Channel" in orders else []
+        min_date = pd.to_datetime(orders["Order Timestamp"].min()).date()
+        max_date = pd.to_datetime(orders["Order Timestamp"].max()).date()
+STARTUP.mark("data ready")
+
+def select_rows(start, end, regions, channels):
+    # pandas backend: filtered (orders, items, id keys) for the current layout
+    if LAYOUT == "partitioned":
+        return load_filtered(faker_hash, stores, start, end, tuple(regions), tuple(channels))
+    # built once per snapshot over its (already sorted) frames, and released with it on a swap
+    index = dataset.derived("filter index", lambda ds: FilterIndex(ds.orders, ds.items))
+    pos = index.positions(start, end, Region=regions, Channel=channels)
+    return index.take(pos), index.take_items(pos), id_keys
+
+with span("backend"):
+    if ENGINE == "duckdb":
+        backend = load_duckdb_backend(faker_hash, LAYOUT)
+    else:
+        # every sidebar filter is a cube dimension, so KPIs and charts read cube / moment slices
+        sketch = load_sketch_table(faker_hash, orders) if DISTINCT == "sketch" else None
+        backend = PandasBackend(select_rows, load_rollup(faker_hash, orders), load_moment_table(faker_hash, orders),
+                                slice_fn=slice_cube, sketch=sketch,
+                                cat_cube=load_category_table(faker_hash, orders, items))
 
 # ---------- APPLY FILTERS ----------
 if "date_range" not in st.session_state:
@@ -78,7 +314,8 @@ if "channels" not in st.session_state:
 
 # Ensure Region exists on orders (join once if needed)
 if (
-    "Region" not in orders.columns
+    orders is not None
+    and "Region" not in orders.columns
     and {"Store ID"}.issubset(orders.columns)
     and {"Store ID", "Region"}.issubset(stores.columns)
 ):
@@ -95,35 +332,65 @@ if isinstance(date_range, (tuple, list)) and len(date_range) == 2 and all(pd.not
 else:
     start_date, end_date = min_date, max_date
 
-# Apply filters to create f + fi
-f = orders.loc[
-    (orders["Order Timestamp"].dt.date >= start_date)
-    & (orders["Order Timestamp"].dt.date <= end_date)
-].copy()
-if regions_sel:
-    f = f[f["Region"].isin(regions_sel)]
-if channels_sel and "Channel" in f.columns:
-    f = f[f["Channel"].isin(channels_sel)]
-fi = items[items["Order ID"].isin(f["Order ID"].unique())].copy()
-
-# ---------- TITLE + KPIs ----------
-st.markdown("### **Brewed Insights** — Starbucks-style Analytics ☕")
-st.caption("Warm, synthetic data. Not affiliated with Starbucks.")
+def build_view():
+    # everything derived from the current filters; cached under view_key below. Only aggregates, figures
+    # and a preview are built here: the duckdb selection keeps rows in the files until a tab asks
+    with span("select"):
+        sel = backend.select(start_date, end_date, regions_sel, channels_sel)
+    with span("kpis"):
+        k = sel.kpis()
+    frames = {}
+    figures = {}
+    for name, build in [("trend", lambda: trend_figure(*frames.setdefault("trend", sel.trend()))),
+                        ("mix", lambda: channel_share_figure(*frames.setdefault("mix", sel.channel_share()))),
+                        ("heat", lambda: daypart_week_figure(sel.daypart_weekday())),
+                        # pandas reads moment slices; the row threshold only applies where rows get scanned
+                        ("corr", lambda: correlation_figure(*sel.corr(CORR_SAMPLE_ROWS))),
+                        ("cat", lambda: category_profitability_figure(frames.setdefault("cat", sel.category_profit())))]:
+        with span(f"chart:{name}"):
+            figures[name] = figure_json(build())
+    with span("ai facts"):
+        # the insights prompt only ever sees these aggregates, never rows
+        facts = build_facts(k, frames["trend"][0], frames["mix"][0], date_range=(start_date, end_date),
+                            active_filters={"regions": list(regions_sel), "channels": list(channels_sel)},
+                            categories=frames["cat"])
+    with span("preview") as s:
+        preview = sel.preview(100)
+        s.rows_out = len(preview)
+    return {
+        "sel": sel, "keys": sel.keys,
+        "kpis": (k["revenue"], k["orders"], k["aov"], k["gross_margin_pct"], k["weather_sensitivity"]),
+        "figures": figures,
+        "categories": frames["cat"],
+        "facts": facts,
+        "preview": preview,
+    }
 
-total_revenue = float(f["Total Amount"].sum())
-total_orders = int(f["Order ID"].nunique())
-aov = total_revenue / max(total_orders, 1)
-gross_margin_pct = (f["Profit"].sum() / total_revenue * 100) if total_revenue else 0.0
+def basket_for(level: str) -> Basket:
+    # co-occurrence for the current filters; the whole history comes precomputed
+    unfiltered = ((start_date, end_date) == (min_date, max_date)
+                  and set(all_regions) <= set(regions_sel or all_regions)
+                  and set(all_channels) <= set(channels_sel or all_channels))
+    if unfiltered:
+        return load_baskets(faker_hash, items)[level]
+    with span(f"basket:{level}"):
+        return view["sel"].basket(level)
 
-iced_subcats = {"Cold Coffee","Cold Tea","Refreshers","Frappuccino"}
-fi["Iced"] = fi["Subcategory"].isin(iced_subcats)
-merged = f.merge(fi[["Order ID","Iced"]], on="Order ID", how="left")
-hot_days = merged.loc[merged["Temperature (C)"] >= 26, "Iced"].mean()
-cold_days = merged.loc[merged["Temperature (C)"] < 18, "Iced"].mean()
-weather_sensitivity = (hot_days - cold_days) * 100
+view_cache = get_view_cache()
+current_view_key = view_key(start_date, end_date, regions_sel, channels_sel, faker_hash)
+with span("view") as view_span:
+    misses = view_cache.misses
+    view = view_cache.get_or_compute(current_view_key, build_view)
+    view_span.rows_out = view["kpis"][1]
+    view_span.name = "view (built)" if view_cache.misses > misses else "view (cached)"
+STARTUP.mark("view ready")
+id_keys = view["keys"]
+total_revenue, total_orders, aov, gross_margin_pct, weather_sensitivity = view["kpis"]
+no_rows = total_orders == 0
 
+# ---------- KPIs ----------
 rev_str = f"${total_revenue:,.2f}"
-orders_str = f"{total_orders:,}"
+orders_str = f"{'≈' if DISTINCT == 'sketch' else ''}{total_orders:,}"
 aov_str = f"${aov:,.2f}"
 gross_str = f"{gross_margin_pct:.1f}%"
 weather_str = f"{weather_sensitivity:+.1f}%"
@@ -182,44 +449,205 @@ with col_filters:
     st.markdown("</div>", unsafe_allow_html=True)
 
 with col_content:
-    tab_trend, tab_mix, tab_heat, tab_corr = st.tabs(
-        ["Monthly Trends", "Channel Mix", "Daypart × Weekday", "Correlations"]
+    tab_trend, tab_mix, tab_heat, tab_corr, tab_cat, tab_basket, tab_stores = st.tabs(
+        ["Monthly Trends", "Channel Mix", "Daypart × Weekday", "Correlations", "Category Profitability", "Basket",
+         "Stores"]
     )
-    with tab_trend:
-        st.plotly_chart(monthly_trends(f), use_container_width=True)
-    with tab_mix:
-        st.plotly_chart(channel_share_over_time(f), use_container_width=True)
-    with tab_heat:
-        hm = daypart_week_heatmap(f)
+    with tab_trend, span("render:trend"):
+        st.plotly_chart(figure_from_json(view["figures"]["trend"]), use_container_width=True)
+        # forecasts start after the last day of data, whatever the date filter
+        fc_channels = () if set(all_channels) <= set(channels_sel or all_channels) else tuple(sorted(channels_sel))
+        with span("forecast"):
+            forecast = load_forecast(faker_hash, fc_channels, orders)
+        ff = forecast_figure(forecast.frame(regions_sel), BAND_LEVEL) if forecast is not None else None
+        if ff is not None:
+            st.plotly_chart(ff, use_container_width=True)
+            with st.expander(f"Store forecasts ({len(forecast.stores):,} stores)"):
+                st.caption("Weekday × daypart seasonality plus trend, adjusted for each store's recent temperature; "
+                           f"{BAND_LEVEL:.0%} bands.")
+                money = ["Forecast", "Lower", "Upper", f"Last {len(forecast.dates)} Days"]
+                st.dataframe(forecast.store_frame(regions_sel).sort_values("Forecast", ascending=False),
+                             hide_index=True, use_container_width=True,
+                             column_config={**{c: st.column_config.NumberColumn(format="$%.0f") for c in money},
+                                            "Change %": st.column_config.NumberColumn(format="%+.1f%%")})
+        else:
+            st.info("No store history to forecast from.")
+    with tab_mix, span("render:mix"):
+        st.plotly_chart(figure_from_json(view["figures"]["mix"]), use_container_width=True)
+    with tab_heat, span("render:heat"):
+        hm = figure_from_json(view["figures"]["heat"])
         if hm is not None:
             st.plotly_chart(hm, use_container_width=True)
         else:
             st.info("Daypart column not found.")
-    with tab_corr:
-        ch = correlation_heatmap(f)
+    with tab_corr, span("render:corr"):
+        ch = figure_from_json(view["figures"]["corr"])
         if ch is not None:
             st.plotly_chart(ch, use_container_width=True) 
         else:
             st.info("Not enough numeric columns to build a correlation matrix.")
+    with tab_cat, span("render:cat"):
+        cf = figure_from_json(view["figures"]["cat"])
+        if cf is not None:
+            st.plotly_chart(cf, use_container_width=True)
+            st.caption("Order profit is allocated to line items by their share of the order's revenue.")
+            st.dataframe(view["categories"], hide_index=True, use_container_width=True,
+                         column_config={"Revenue": st.column_config.NumberColumn(format="$%.2f"),
+                                        "Profit": st.column_config.NumberColumn(format="$%.2f"),
+                                        "Margin %": st.column_config.NumberColumn(format="%.1f%%")})
+        else:
+            st.info("No line items for the current filters.")
+    with tab_basket, span("render:basket"):
+        b1, b2, b3, b4 = st.columns(4)
+        level = b1.selectbox("Pairs of", BASKET_LEVELS, index=BASKET_LEVELS.index("Subcategory"), key="basket_level")
+        rank_by = b2.selectbox("Rank by", ["Lift", "Orders", "A → B %", "B → A %"], key="basket_by")
+        top_k = b3.slider("Top pairs", 5, 50, 15, key="basket_k")
+        min_together = b4.number_input("Min orders together", 1, value=20, key="basket_min")
+        if view["categories"] is None or view["categories"].empty:
+            st.info("No line items for the current filters.")
+        else:
+            # baskets for a filter + level are cached alongside the view
+            bk = view_cache.get_or_compute(current_view_key + ("basket", level), lambda: basket_for(level))
+            cat_bk = bk if level == "Category" else view_cache.get_or_compute(
+                current_view_key + ("basket", "Category"), lambda: basket_for("Category"))
+            st.caption(f"{bk.orders:,} orders · Food attached to "
+                       f"{cat_bk.attach_rate('Beverages', 'Food'):.1f}% of beverage orders, "
+                       f"beverages to {cat_bk.attach_rate('Food', 'Beverages'):.1f}% of food orders. "
+                       "Lift above 1 means a pair is bought together more often than chance.")
+            top = bk.top_pairs(top_k, rank_by, min_orders=min_together)
+            bf = basket_pairs_figure(top, rank_by, level)
+            if bf is not None:
+                st.plotly_chart(bf, use_container_width=True)
+                st.dataframe(top, hide_index=True, use_container_width=True,
+                             column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                            for c in ["Support %", "A → B %", "B → A %", "Lift"]})
+            else:
+                st.info("No pairs bought together often enough; lower the minimum.")
+    with tab_stores, span("render:stores"):
+        s1, s2, s3, s4 = st.columns(4)
+        store_by = s1.selectbox("Rank by", STORE_METRICS, key="store_by")
+        side = s2.radio("Show", ["Highest", "Lowest"], horizontal=True, key="store_side")
+        store_k = s3.slider("Stores", 5, 50, LEADERBOARD_K, key="store_k")
+        min_orders = s4.number_input("Min orders", 1, value=10, key="store_min")
+        # compact schema: store attributes keyed by UUID like the store cube
+        board = load_store_board(faker_hash, with_ids(stores, id_keys), orders)
+        # per-store totals depend only on the filters; switching metric or side just re-ranks them
+        with span("store totals", rows_in=len(board)):
+            totals = view_cache.get_or_compute(current_view_key + ("store totals",),
+                                               lambda: board.totals(start_date, end_date, regions_sel, channels_sel))
+        top = top_stores(totals, store_by, store_k, side == "Highest", min_orders)
+        sf = store_leaderboard_figure(top, store_by, side == "Highest")
+        if sf is None:
+            st.info("No stores with enough orders for the current filters.")
+        else:
+            st.caption(f"Ranked among {int((totals['Orders'] >= min_orders).sum()):,} of {len(board):,} stores.")
+            st.plotly_chart(sf, use_container_width=True)
+            st.dataframe(top.drop(columns="Profit"), hide_index=True, use_container_width=True,
+                         column_config={"Revenue": st.column_config.NumberColumn(format="$%.2f"),
+                                        "AOV": st.column_config.NumberColumn(format="$%.2f"),
+                                        "Margin %": st.column_config.NumberColumn(format="%.1f%%")})
 
-with st.expander("☕ AI Insights Summary"):
-    run = st.button("Generate Insights", use_container_width=True)
+            st.markdown("#### Store detail")
+            labels = dict(zip(top["Store ID"], top["Rank"].astype(str) + ". " + top["Market"].astype(str) + " · "
+                              + top["Format"].astype(str) + " · " + top["Store ID"].astype(str)))
+            store_id = st.selectbox("Store", list(labels), format_func=labels.get, key="store_pick")
+            row = top.loc[top["Store ID"] == store_id].iloc[0]
+            cards = [("💵 Revenue", f"${row['Revenue']:,.2f}"), ("🧾 Orders", f"{row['Orders']:,}"),
+                     ("🍪 AOV", f"${row['AOV']:,.2f}"), ("💰 Margin %", f"{row['Margin %']:.1f}%"),
+                     ("⏱ Avg Wait", f"{row['Avg Wait Time (mins)']:.1f} min")]
+            for col, (title, value) in zip(st.columns(len(cards)), cards):
+                col.markdown(f'<div class="kpi-card"><div class="kpi-title">{title}</div>'
+                             f'<div class="kpi-value">{value}</div></div>', unsafe_allow_html=True)
+            with span("store detail"):
+                rows = board.detail(store_id, start_date, end_date, channels_sel)
+                d1, d2 = st.columns(2)
+                d1.plotly_chart(trend_figure(*trend_frame(None, rows)), use_container_width=True)
+                mix = channel_share_figure(*channel_share_frame(None, "auto", rows))
+                if mix is not None:
+                    d2.plotly_chart(mix, use_container_width=True)
+                d3, d4 = st.columns(2)
+                heat = daypart_week_figure(daypart_week_frame(None, rows))
+                if heat is not None:
+                    d3.plotly_chart(heat, use_container_width=True)
+                store_fc = forecast.frame(stores=[store_id]) if forecast is not None else None
+                if store_fc is not None:
+                    d4.plotly_chart(forecast_figure(store_fc, BAND_LEVEL), use_container_width=True)
 
-    active_filters = {
-        "regions": regions if 'regions' in locals() else None,
-        "channels": channels if 'channels' in locals() else None,
-        "date_range": (start_date, end_date) if 'start_date' in locals() else None
-    }
+insights = insights_service()
+if no_rows:
+    ai_job = None
+else:
+    # the last job, if it was for these filters; otherwise an answer already cached on disk shows
+    # straight away (a job this session just finished stays the uncached job, not a disk hit)
+    ai_job = st.session_state.get("ai_job")
+    if ai_job is not None and ai_job.key != insights.key(view["facts"]):
+        ai_job = None
+    if ai_job is None:
+        ai_job = insights.cached(view["facts"])
 
-    if run:
-        summary = generate_ai_insights(f, date_range=active_filters.get("date_range"), active_filters=active_filters)
-        st.markdown(f"<div class='ai-card'>{summary}</div>", unsafe_allow_html=True)
-    else:
-        st.info("Click **Generate Insights** to summarize your filtered data.")
+with st.expander("☕ AI Insights Summary", expanded=ai_job is not None and not ai_job.cached):
+    if st.button("Generate Insights", use_container_width=True, disabled=no_rows):
+        ai_job = st.session_state.ai_job = insights.submit(view["facts"])
 
-with st.expander("Preview data"):
-    st.dataframe(f.head(100), hide_index=True)
+    # the request runs on a worker thread; while it streams only this fragment reruns
+    @st.fragment(run_every=0.3 if ai_job is not None and not ai_job.done.is_set() else None)
+    def show_insights():
+        if no_rows:
+            st.info("No data available for the current filters.")
+        elif ai_job is None:
+            st.info("Click **Generate Insights** to summarize your filtered data.")
+        elif ai_job.error:
+            st.warning(f"⚠️ {ai_job.error}")
+        elif ai_job.done.is_set():
+            st.markdown(f"<div class='ai-card'>{ai_job.text}</div>", unsafe_allow_html=True)
+            if ai_job.cached:
+                st.caption("Cached answer for these filters.")
+        else:
+            st.markdown(f"<div class='ai-card'>{ai_job.text} ▌</div>", unsafe_allow_html=True)
+        if ai_job is not None and ai_job.done.is_set() and st.session_state.get("_ai_polling"):
+            # finished: one full rerun so the fragment is redefined without polling
+            st.session_state._ai_polling = False
+            st.rerun()
+        st.session_state._ai_polling = ai_job is not None and not ai_job.done.is_set()
+
+    show_insights()
+
+with st.expander("Preview data"), span("render:preview"):
+    preview = view["preview"]
+    st.dataframe(with_ids(preview, id_keys), hide_index=True)
+
+end_trace(trace)
+STARTUP.mark("first render")
+STARTUP.finish()
+if METRICS_FILE:
+    write_prometheus(METRICS_FILE, trace)
+
+if PERF_PANEL or st.query_params.get("perf") == "1":
+    with st.expander("⏱ Performance"):
+        spans = pd.DataFrame(trace.to_list())
+        if spans.empty:
+            st.info("No spans recorded.")
+        else:
+            spans["stage"] = [" " * d + n for d, n in zip(spans["depth"], spans["name"])]
+            st.caption(f"Rerun total: {spans.loc[spans['depth'] == 0, 'seconds'].sum() * 1000:,.0f} ms")
+            st.dataframe(
+                spans[["stage", "seconds", "rows_in", "rows_out", "rss_delta_mb"]].assign(
+                    ms=lambda d: d["seconds"] * 1000).drop(columns="seconds"),
+                hide_index=True,
+                column_config={"ms": st.column_config.NumberColumn("ms", format="%.1f"),
+                               "rss_delta_mb": st.column_config.NumberColumn("ΔRSS MB", format="%.1f")},
+            )
+        if STARTUP.finished:
+            st.caption(f"Cold start: {STARTUP.summary()}")
+        c1, c2 = st.columns(2)
+        c1.download_button("Trace (JSON)", trace.to_json(), file_name="trace.json", mime="application/json",
+                           use_container_width=True)
+        c2.download_button("Metrics (Prometheus)", to_prometheus(trace), file_name="metrics.prom",
+                           mime="text/plain", use_container_width=True)
 
 # ---------- Footer ----------
 st.markdown("<br>", unsafe_allow_html=True)
+vc = view_cache.stats()
+st.caption(f"View cache: {vc['entries']} views, {vc['mb']:.0f}/{vc['max_mb']:.0f} MB, "
+           f"{vc['hits']} hits / {vc['misses']} misses")
 st.caption("© Brewed Insights • Demo app for educational purposes.")
@@ -0,0 +1,192 @@
+# Starbucks_Basket.py
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Market-basket co-occurrence
+# -----------------------------
+# A basket is the set of distinct values of one item column (Product Name,
+# Subcategory, ...) in an order. Values are coded as integers over a sorted
+# vocabulary, (basket, code) keys are sorted once and de-duplicated, and the
+# pairs inside each basket come from comparing that array with itself
+# shifted by 1..largest basket - 1: one vectorized compare per shift, with
+# pair keys a * k + b counted by bincount. Cost is linear in line items
+# times the largest basket, instead of a self-merge on Order ID that grows
+# quadratically. Counts are kept by name and simply add up, so baskets from
+# shards, days or filtered slices merge, and new days fold into existing
+# totals without recounting the old ones.
+
+BASKET_FILE = "basket.parquet"
+BASKET_DIR = "basket"  # per-shard parts written by incremental generation
+BASKET_LEVELS = ["Product Name", "Subcategory", "Category", "Size"]
+DENSE_PAIRS = 1 << 22  # k * k above this counts pairs by sorting instead of a dense bincount
+
+def basket_ids(items: pd.DataFrame) -> np.ndarray:
+    # basket number per item row; every loader here keeps an order's lines together
+    ids = items["Order ID"].to_numpy()
+    if len(ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.r_[True, ids[1:] != ids[:-1]]
+    if "Line Item" in items.columns and not np.array_equal(starts, items["Line Item"].to_numpy() == 1):
+        # an order's lines are split up after all: key on the id itself
+        return pd.factorize(ids)[0].astype(np.int64)
+    return np.cumsum(starts) - 1
+
+def item_codes(values: pd.Series):
+    # -> (int codes, sorted vocabulary); categoricals reuse their codes instead of hashing strings
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cats = values.cat.categories
+        order = np.argsort(cats.to_numpy(dtype=object).astype(str), kind="stable")
+        remap = np.empty(len(cats) + 1, dtype=np.int64)
+        remap[order] = np.arange(len(cats))
+        remap[-1] = -1  # NaN code
+        return remap[values.cat.codes.to_numpy()], cats.to_numpy(dtype=object)[order]
+    codes, vocab = pd.factorize(values.to_numpy(), sort=True)
+    return codes, np.asarray(vocab, dtype=object)
+
+def _count(keys: np.ndarray, size: int):
+    # -> (distinct keys, counts)
+    if size <= DENSE_PAIRS:
+        counts = np.bincount(keys, minlength=size)
+        nz = np.flatnonzero(counts)
+        return nz, counts[nz]
+    keys = np.sort(keys)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+    return keys[starts], np.diff(np.r_[starts, len(keys)])
+
+def cooccurrence(baskets: np.ndarray, codes: np.ndarray, k: int):
+    # -> (pair keys a * k + b with a < b, pair counts, baskets per code, number of baskets)
+    key = np.sort(baskets.astype(np.int64) * k + codes)
+    key = key[np.r_[True, key[1:] != key[:-1]]] if len(key) else key
+    b, c = key // k, key % k
+    support = np.bincount(c, minlength=k)
+    n = int(np.count_nonzero(np.r_[True, b[1:] != b[:-1]])) if len(b) else 0
+    parts = []
+    shift = 1
+    while shift < len(b):
+        same = b[:-shift] == b[shift:]
+        if not same.any():
+            break  # no basket has more than `shift` values
+        parts.append(c[:-shift][same] * k + c[shift:][same])
+        shift += 1
+    pair_keys, counts = _count(np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64), k * k)
+    return pair_keys, counts, support, n
+
+class Basket:
+    # co-occurrence counts for one item column; baskets of the same level add up
+    def __init__(self, level: str, pairs: pd.Series, support: pd.Series, orders: int):
+        self.level = level
+        self.pairs = pairs      # (Item A, Item B) -> orders with both, Item A < Item B
+        self.support = support  # item -> orders containing it
+        self.orders = orders
+
+    @classmethod
+    def from_items(cls, items: pd.DataFrame, level: str = "Subcategory", ids: np.ndarray = None) -> "Basket":
+        # ids: basket_ids(items), when several levels are counted over the same items
+        codes, vocab = item_codes(items[level])
+        keep = codes >= 0
+        k = max(len(vocab), 1)
+        ids = basket_ids(items) if ids is None else ids
+        pair_keys, counts, support, n = cooccurrence(ids[keep], codes[keep], k)
+        a, b = vocab[pair_keys // k], vocab[pair_keys % k]
+        pairs = pd.Series(counts.astype(np.int64),
+                          index=pd.MultiIndex.from_arrays([a, b], names=["Item A", "Item B"]), name="Orders")
+        return cls(level, pairs, pd.Series(support[:len(vocab)].astype(np.int64), index=vocab, name="Orders"), n)
+
+    def __add__(self, other: "Basket") -> "Basket":
+        if other.level != self.level:
+            raise ValueError(f"can't merge {self.level!r} and {other.level!r} baskets")
+        return Basket(self.level,
+                      self.pairs.add(other.pairs, fill_value=0).astype(np.int64),
+                      self.support.add(other.support, fill_value=0).astype(np.int64),
+                      self.orders + other.orders)
+
+    def update(self, items: pd.DataFrame) -> "Basket":
+        # fold in newly arrived orders (e.g. the latest day's items)
+        return self + Basket.from_items(items, self.level)
+
+    def pair_frame(self) -> pd.DataFrame:
+        # every pair with support, both confidences and lift
+        df = self.pairs.reset_index()
+        n_ab = df["Orders"].to_numpy(dtype=np.float64)
+        n_a = self.support.reindex(df["Item A"]).to_numpy(dtype=np.float64)
+        n_b = self.support.reindex(df["Item B"]).to_numpy(dtype=np.float64)
+        n = float(max(self.orders, 1))
+        df["Support %"] = n_ab / n * 100
+        df["A → B %"] = n_ab / n_a * 100
+        df["B → A %"] = n_ab / n_b * 100
+        df["Lift"] = n_ab * n / (n_a * n_b)
+        return df
+
+    def top_pairs(self, k: int = 10, by: str = "Lift", min_orders: int = 1) -> pd.DataFrame:
+        df = self.pair_frame()
+        df = df[df["Orders"].to_numpy() >= min_orders]
+        if len(df) > k:
+            df = df.iloc[np.argpartition(-df[by].to_numpy(), k - 1)[:k]]
+        return df.sort_values([by, "Orders"], ascending=False).reset_index(drop=True)
+
+    def attach_rate(self, base: str, addon: str) -> float:
+        # % of orders containing `base` that also contain `addon`
+        n_base = self.support.get(base, 0)
+        both = self.pairs.get(tuple(sorted((base, addon))), 0)
+        return both / n_base * 100 if n_base else float("nan")
+
+# -----------------------------
+# Basket tables
+# -----------------------------
+# Whole-history baskets for every level in one long frame, persisted next to
+# the rollups: one row per (Level, Item A, Item B) pair, plus a row per item
+# with Item A == Item B holding its support. The order count rides in attrs.
+
+def build_basket_table(items: pd.DataFrame, levels=BASKET_LEVELS) -> pd.DataFrame:
+    ids = basket_ids(items)
+    return basket_table([Basket.from_items(items, lv, ids) for lv in levels if lv in items.columns])
+
+def basket_table(baskets) -> pd.DataFrame:
+    frames, orders = [], 0
+    for bk in baskets:
+        diag = pd.DataFrame({"Item A": bk.support.index, "Item B": bk.support.index, "Orders": bk.support.to_numpy()})
+        frames.append(pd.concat([bk.pairs.reset_index(), diag], ignore_index=True).assign(Level=bk.level))
+        orders = bk.orders
+    cols = ["Level", "Item A", "Item B", "Orders"]
+    out = pd.concat(frames, ignore_index=True)[cols] if frames else pd.DataFrame(columns=cols)
+    out["Orders"] = out["Orders"].astype(np.int64)
+    out.attrs["orders"] = int(orders)
+    return out
+
+def baskets_from_table(table: pd.DataFrame) -> dict:
+    # -> {level: Basket}
+    out = {}
+    for level, t in table.groupby("Level", sort=False):
+        diag = (t["Item A"] == t["Item B"]).to_numpy()
+        pairs = t[~diag].set_index(["Item A", "Item B"])["Orders"]
+        support = t[diag].set_index("Item A")["Orders"].rename_axis(None)
+        out[level] = Basket(level, pairs, support, int(table.attrs.get("orders", 0)))
+    return out
+
+def merge_basket_tables(parts) -> pd.DataFrame:
+    parts = list(parts)
+    out = (pd.concat(parts, ignore_index=True)
+             .groupby(["Level", "Item A", "Item B"], sort=True)["Orders"].sum()
+             .reset_index())
+    out.attrs["orders"] = int(sum(p.attrs.get("orders", 0) for p in parts))
+    return out
+
+# -----------------------------
+# Persistence
+# -----------------------------
+
+def save_basket_table(table: pd.DataFrame, data_dir: str = "data", path: str = None):
+    os.makedirs(data_dir, exist_ok=True)
+    table.to_parquet(path or os.path.join(data_dir, BASKET_FILE), index=False)
+
+def load_basket_table(data_dir: str = "data"):
+    path = os.path.join(data_dir, BASKET_FILE)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    parts = sorted(glob.glob(os.path.join(data_dir, BASKET_DIR, "*.parquet")))
+    if parts:
+        return merge_basket_tables([pd.read_parquet(p) for p in parts])
+    return None
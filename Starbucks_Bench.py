@@ -0,0 +1,300 @@
+# Starbucks_Bench.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from Starbucks_Perf import current_rss
+
+# -----------------------------
+# Benchmark suite
+# -----------------------------
+# Headless (no Streamlit) timings of the stages a dashboard session goes
+# through: generate -> features -> save -> load -> index / rollups ->
+# filter -> per-plot aggregation + figure, optionally the DuckDB engine too.
+# Every size runs in its own fresh process so peak RSS is per size, and each
+# stage records wall time, peak RSS while it ran and orders/sec.
+# The last stage is the app's own cold start: Starbucks_App.py run once by
+# Streamlit's AppTest in a new process over a data/ dir written the way the
+# batch generator writes it, with the app's startup phases as sub-stages.
+#
+#   python Starbucks_Bench.py --sizes xs,s --out bench.json
+#   python Starbucks_Bench.py --sizes m --baseline bench_baseline.json   # exit 1 on regression
+
+# orders ~= days * avg_orders (avg_orders is the daily total across all stores)
+SIZES = {
+    "xs": {"stores": 20, "days": 14, "avg_orders": 700},        # ~10k orders
+    "s": {"stores": 50, "days": 60, "avg_orders": 1_700},       # ~100k
+    "m": {"stores": 150, "days": 365, "avg_orders": 2_740},     # ~1M
+    "l": {"stores": 500, "days": 365, "avg_orders": 27_400},    # ~10M
+    "xl": {"stores": 1_000, "days": 730, "avg_orders": 68_500}, # ~50M
+}
+START = "2024-10-21"
+
+# -----------------------------
+# Measurement
+# -----------------------------
+
+class RssSampler:
+    # peak RSS over a block, sampled from a background thread
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+class Recorder:
+    def __init__(self, size: str, repeat: int = 1):
+        self.size = size
+        self.repeat = repeat  # for the cheap query / plot stages; best time is kept
+        self.results = []
+
+    def add(self, name: str, rows: int, seconds: float, peak_rss_mb: float):
+        self.results.append({
+            "size": self.size,
+            "stage": name,
+            "rows": int(rows),
+            "seconds": seconds,
+            "peak_rss_mb": peak_rss_mb,
+            "rows_per_sec": rows / seconds if seconds > 0 else None,
+        })
+
+    def stage(self, name: str, rows: int, fn, *args, repeat: int = 1, **kwargs):
+        seconds = float("inf")
+        with RssSampler() as rss:
+            for _ in range(repeat):
+                t = time.perf_counter()
+                out = fn(*args, **kwargs)
+                seconds = min(seconds, time.perf_counter() - t)
+        self.add(name, rows, seconds, rss.peak / 2**20)
+        return out
+
+# -----------------------------
+# Stages
+# -----------------------------
+
+def _filters(start, end):
+    # full window, a quarter of one region x two channels, and a single week
+    mid = start + (end - start) / 2
+    return {
+        "all": (start, end, [], []),
+        "quarter/west/2ch": (mid, min(end, mid + pd.Timedelta(days=90)), ["West"], ["Delivery", "In-Store"]),
+        "week": (mid, min(end, mid + pd.Timedelta(days=6)), [], []),
+    }
+
+def prepare_app_dir(app_dir: str, params: dict, fmt: str, workers: int):
+    # what `python Starbucks_Faker.py --data-dir <app_dir>/data` leaves behind, so the app serves it as-is
+    from Starbucks_Faker import generate_to_dir
+    from Starbucks_Manifest import dataset_fingerprint, save_params, FINGERPRINT_FILE
+    data_dir = os.path.join(app_dir, "data")
+    params = {"start": START, **params}
+    generate_to_dir(data_dir, fmt, workers=workers, **params)
+    with open(os.path.join(data_dir, FINGERPRINT_FILE), "w") as fh:
+        fh.write(dataset_fingerprint(**params))
+    save_params(data_dir, params)
+
+def _app_first_run(app_dir: str) -> dict:
+    # runs in a fresh process: imports, st.cache_* and the shared dataset all start cold
+    from streamlit.testing.v1 import AppTest
+    from Starbucks_Perf import STARTUP
+    os.chdir(app_dir)
+    with RssSampler() as rss:
+        at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Starbucks_App.py"),
+                               default_timeout=3600).run()
+    if at.exception:
+        raise RuntimeError(f"app failed on first run: {at.exception[0].value}")
+    return {"phases": dict(STARTUP.phases), "peak_rss_mb": rss.peak / 2**20}
+
+def app_cold_start(app_dir: str) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as ex:
+        return ex.submit(_app_first_run, app_dir).result()
+
+def run_size(size: str, params: dict, fmt: str = "parquet", workers: int = 1, duckdb: bool = False,
+             repeat: int = 3) -> list:
+    from Starbucks_Faker import generate
+    from Starbucks_Features import add_derived_features
+    from Starbucks_Storage import save_tables, load_tables
+    from Starbucks_Index import FilterIndex, sort_for_index
+    from Starbucks_Rollup import build_cube, build_category_cube, build_store_cube, slice_cube
+    from Starbucks_Forecast import StoreForecast
+    from Starbucks_Stores import StoreBoard, top_stores
+    from Starbucks_Stats import build_moments
+    from Starbucks_Query import PandasBackend
+    from Starbucks_Basket import Basket
+    from Starbucks_Plots import (trend_figure, channel_share_figure, daypart_week_figure, correlation_figure,
+                                 category_profitability_figure)
+
+    rec = Recorder(size, repeat)
+    data_dir = tempfile.mkdtemp(prefix=f"brewed-bench-{size}-")
+    try:
+        stores, orders, items = rec.stage("generate", 0, generate, start=START, workers=workers, **params)
+        n = len(orders)
+        rec.results[-1]["rows"] = n
+        rec.results[-1]["rows_per_sec"] = n / rec.results[-1]["seconds"]
+        orders = rec.stage("features", n, add_derived_features, orders, items)
+        rec.stage("save", n, save_tables, stores, orders, items, data_dir=data_dir, fmt=fmt)
+        del stores, orders, items
+        stores, orders, items = rec.stage("load", n, load_tables, data_dir, fmt=fmt)
+
+        # as the app does it: the loaded tables are sorted once, then indexed in place
+        orders, items = rec.stage("index:sort", n, sort_for_index, orders, items)
+        index = rec.stage("index", n, FilterIndex, orders, items)
+        cube = rec.stage("rollup:cube", n, build_cube, orders)
+        cat_cube = rec.stage("rollup:category", len(items), build_category_cube, orders, items)
+        moments = rec.stage("rollup:moments", n, build_moments, orders)
+        store_cube = rec.stage("rollup:store", n, build_store_cube, orders)
+        rec.stage("forecast:fit", len(store_cube), StoreForecast.fit, store_cube)
+        board = rec.stage("stores:board", len(store_cube), StoreBoard, store_cube, stores)
+
+        def select_rows(start, end, regions, channels):
+            pos = index.positions(start, end, Region=regions, Channel=channels)
+            return index.take(pos), index.take_items(pos), None
+        backend = PandasBackend(select_rows, cube, moments, slice_fn=slice_cube, cat_cube=cat_cube)
+
+        start, end = orders["Order Timestamp"].min().normalize(), orders["Order Timestamp"].max().normalize()
+        engines = [("pandas", backend)]
+        if duckdb:
+            from Starbucks_Query import DuckDBBackend, has_duckdb
+            if has_duckdb() and fmt != "feather":
+                engines.append(("duckdb", rec.stage("duckdb:open", n, DuckDBBackend, data_dir)))
+        for engine, be in engines:
+            for label, q in _filters(start, end).items():
+                r = rec.repeat
+                # pandas filters eagerly in select(); duckdb runs SQL per call, so its rows are the scan size
+                sel = rec.stage(f"{engine}:filter[{label}]", n, be.select, *q, repeat=r)
+                rows = len(sel.orders()) if engine == "pandas" else n
+                rec.stage(f"{engine}:kpis[{label}]", rows, sel.kpis, repeat=r)
+                rec.stage(f"{engine}:items[{label}]", rows, sel.items, repeat=r)
+                rec.stage(f"{engine}:plot:trend[{label}]", rows, lambda: trend_figure(*sel.trend()), repeat=r)
+                rec.stage(f"{engine}:plot:channel_mix[{label}]", rows,
+                          lambda: channel_share_figure(*sel.channel_share()), repeat=r)
+                rec.stage(f"{engine}:plot:heatmap[{label}]", rows, lambda: daypart_week_figure(sel.daypart_weekday()),
+                          repeat=r)
+                rec.stage(f"{engine}:plot:corr[{label}]", rows, lambda: correlation_figure(*sel.corr()), repeat=r)
+                rec.stage(f"{engine}:plot:category[{label}]", rows,
+                          lambda: category_profitability_figure(sel.category_profit()), repeat=r)
+                rec.stage(f"{engine}:basket[{label}]", rows, lambda: Basket.from_items(sel.items(), "Product Name"),
+                          repeat=r)
+        # engine-independent: the leaderboard reads the store cube, not the backend
+        for label, q in _filters(start, end).items():
+            rec.stage(f"stores:leaderboard[{label}]", len(board), lambda: top_stores(board.totals(*q), "AOV"),
+                      repeat=rec.repeat)
+
+        # cold start: a new process loading the data (load_data) and building the first view
+        app_dir = os.path.join(data_dir, "app")
+        rec.stage("app:generate_to_dir", n, prepare_app_dir, app_dir, params, fmt, workers)
+        cold = rec.stage("app:cold_start", n, app_cold_start, app_dir)
+        for phase, seconds in cold["phases"].items():
+            # seconds since the script started; RSS is the app process's peak
+            rec.add(f"app:cold_start[{phase}]", n, seconds, cold["peak_rss_mb"])
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return rec.results
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+
+def compare(results: list, baseline: list, threshold: float = 1.25, min_seconds: float = 0.05) -> pd.DataFrame:
+    # ratio > threshold on a stage that takes at least min_seconds is a regression
+    cur = pd.DataFrame(results).set_index(["size", "stage"])
+    base = pd.DataFrame(baseline).set_index(["size", "stage"])
+    joined = cur[["seconds", "peak_rss_mb"]].join(base[["seconds", "peak_rss_mb"]], rsuffix="_base", how="inner")
+    joined["time_ratio"] = joined["seconds"] / joined["seconds_base"]
+    joined["rss_ratio"] = joined["peak_rss_mb"] / joined["peak_rss_mb_base"]
+    joined["regression"] = ((joined["time_ratio"] > threshold) & (joined["seconds"] >= min_seconds)) | \
+                           (joined["rss_ratio"] > threshold)
+    return joined.reset_index()
+
+def environment() -> dict:
+    import numpy as np
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "timestamp": pd.Timestamp.now().isoformat(timespec="seconds"),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generation, load, filter and plot stages.")
+    parser.add_argument("--sizes", default="xs,s", help=f"comma list of {', '.join(SIZES)}, or 'custom'")
+    parser.add_argument("--stores", type=int)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--avg-orders", type=int)
+    parser.add_argument("--format", default="parquet", choices=["parquet", "feather", "csv"])
+    parser.add_argument("--workers", type=int, default=1, help="generator processes")
+    parser.add_argument("--duckdb", action="store_true", help="also time the DuckDB query engine")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query / plot stage (best is kept)")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown / RSS ratio counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns of stages faster than this")
+    args = parser.parse_args(argv)
+
+    sizes = {}
+    for name in args.sizes.split(","):
+        if name == "custom":
+            missing = [flag for flag, v in (("--stores", args.stores), ("--days", args.days),
+                                             ("--avg-orders", args.avg_orders)) if not v or v < 1]
+            if missing:
+                parser.error(f"--sizes custom needs a positive {', '.join(missing)}")
+            sizes["custom"] = {"stores": args.stores, "days": args.days, "avg_orders": args.avg_orders}
+        elif name in SIZES:
+            sizes[name] = SIZES[name]
+        else:
+            parser.error(f"unknown size {name!r}")
+
+    results = []
+    for name, params in sizes.items():
+        print(f"[{name}] {params}", flush=True)
+        # a fresh process per size: peak RSS of one size doesn't leak into the next
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as ex:
+            rows = ex.submit(run_size, name, params, args.format, args.workers, args.duckdb, args.repeat).result()
+        for r in rows:
+            rps = f"{r['rows_per_sec']:>14,.0f}" if r["rows_per_sec"] else " " * 14
+            print(f"  {r['stage']:<40} {r['seconds']:>9.3f}s {r['peak_rss_mb']:>9.0f} MB {rps} rows/s", flush=True)
+        results.extend(rows)
+
+    with open(args.out, "w") as fh:
+        json.dump({"environment": environment(), "params": sizes, "results": results}, fh, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["results"]
+        report = compare(results, baseline, args.threshold, args.min_seconds)
+        cols = ["size", "stage", "seconds", "seconds_base", "time_ratio", "rss_ratio", "regression"]
+        print(report[cols].round(3).to_string(index=False))
+        if report["regression"].any():
+            print(f"{int(report['regression'].sum())} stage(s) regressed beyond {args.threshold}x")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Starbucks_Cache.py
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# -----------------------------
+# Filter-keyed view cache
+# -----------------------------
+# Holds everything a rerun derives from the sidebar filters (filtered frames,
+# KPI tuple, figures as JSON) under a canonical key built from the filter
+# values themselves plus the dataset version. Looking a view up never hashes
+# a DataFrame, which is what st.cache_data would do with f / fi as arguments.
+# Entries are evicted least-recently-used once their estimated size exceeds
+# max_bytes.
+
+def view_key(start, end, regions, channels, version) -> tuple:
+    # empty selections don't filter, so they share a key regardless of order
+    return (str(pd.Timestamp(start).date()) if start is not None else None,
+            str(pd.Timestamp(end).date()) if end is not None else None,
+            tuple(sorted(map(str, regions or ()))),
+            tuple(sorted(map(str, channels or ()))),
+            version)
+
+def approx_bytes(obj, sample=1000) -> int:
+    # deep memory_usage walks every string; sample object columns instead
+    if isinstance(obj, pd.DataFrame):
+        total = int(obj.memory_usage(index=True, deep=False).sum())
+        for col in obj.columns:
+            s = obj[col]
+            if s.dtype == object and len(s):
+                vals = s.iloc[:: max(1, len(s) // sample)]
+                total += int(np.mean([sys.getsizeof(v) for v in vals]) * len(s))
+        return total
+    if isinstance(obj, pd.Series):
+        return approx_bytes(obj.to_frame())
+    if isinstance(obj, (str, bytes)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sum(approx_bytes(v) for v in obj.values()) + sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple)):
+        return sum(approx_bytes(v) for v in obj) + sys.getsizeof(obj)
+    return sys.getsizeof(obj)
+
+def figure_json(fig):
+    return None if fig is None else fig.to_json()
+
+def figure_from_json(s):
+    return None if s is None else pio.from_json(s, skip_invalid=True)
+
+class ViewCache:
+    def __init__(self, max_bytes: int = 512 * 2**20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()  # sessions run on separate threads
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, nbytes: int = None):
+        nbytes = approx_bytes(value) if nbytes is None else nbytes
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return value  # would evict everything else; don't keep it
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, n) = self._entries.popitem(last=False)
+                self.nbytes -= n
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "mb": self.nbytes / 2**20,
+            "max_mb": self.max_bytes / 2**20,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_MISSING = object()
@@ -6,6 +6,7 @@ from faker import Faker
 import random
 from datetime import datetime, timedelta
 import numpy as np
+from Starbucks_Sketch import approx_nunique_by, DISTINCT_MODE
 st.set_page_config(
     page_title="Starbucks Ecommerce Analytics Dashboard",
     page_icon=":coffee:",
@@ -84,8 +85,15 @@ monthly_sales["Sales Growth"] = monthly_sales["Total Sales"].pct_change().fillna
 latest_growth = monthly_sales.iloc[-1]["Sales Growth"] * 100
 st.metric(label="Monthly Sales Growth", value=f"{latest_growth:.2f}%")
 # Customer Acquisition Over Time Line Chart
-customer_acquisition = df.groupby(df["Order Date"].dt.to_period("M")).agg({"Customer ID": pd.Series.nunique}).reset_index()
-customer_acquisition["Order Date"] = customer_acquisition["Order Date"].dt.to_timestamp()
+if DISTINCT_MODE == "sketch":
+    month_codes, months = pd.factorize(df["Order Date"].dt.to_period("M"), sort=True)
+    customer_acquisition = pd.DataFrame({
+        "Order Date": months.to_timestamp(),
+        "Customer ID": np.round(approx_nunique_by(df["Customer ID"].to_numpy(), month_codes, len(months))).astype(int),
+    })
+else:
+    customer_acquisition = df.groupby(df["Order Date"].dt.to_period("M")).agg({"Customer ID": pd.Series.nunique}).reset_index()
+    customer_acquisition["Order Date"] = customer_acquisition["Order Date"].dt.to_timestamp()
 fig_customer_acquisition = px.line(
     customer_acquisition,
     x="Order Date",
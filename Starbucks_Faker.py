@@ -1,11 +1,29 @@
 import pandas as pd 
+import os, sys, time
 import random, uuid
-from faker import Faker 
+import argparse
+import functools
+import itertools
+from collections import deque
 import numpy as np
 from datetime import datetime, timedelta
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from Starbucks_Storage import (save_tables, save_partitioned, table_path, drop_other_formats, TableWriter,
+                               FORMATS, DEFAULT_FORMAT, DEFAULT_COMPRESSION)
+from Starbucks_Rollup import (build_cube, save_cube, merge_cubes, build_category_cube, save_category_cube,
+                              merge_category_cubes, build_store_cube, save_store_cube, merge_store_cubes)
+from Starbucks_Features import add_derived_features, FEATURE_COLUMNS
+from Starbucks_Stats import build_moments, save_moments, combine_moment_tables
+from Starbucks_Sketch import build_sketch, save_sketch, merge_sketches
+from Starbucks_Basket import build_basket_table, save_basket_table, merge_basket_tables
+from Starbucks_Perf import traced
+
+@functools.lru_cache(maxsize=None)
+def get_fake():
+    # built on first use: the generators below never need Faker, and importing it slows every cold start
+    from faker import Faker
+    return Faker()
 
-fake=Faker()
 random.seed(42)
 np.random.seed(42)
 
@@ -25,6 +43,9 @@ sizes = {
 }
 channels = ["In-Store", "Mobile Order", "Drive-Thru", "Delivery"]
 dayparts = [("Morning",6,11), ("Afternoon",11,15), ("Evening",15,19), ("Night",19,23)]
+markets = ["Seattle Metro", "LA Metro", "SF Bay", "Chicago Metro",
+    "Dallas-Fort Worth", "Atlanta Metro", "NYC Metro", "Boston Metro",
+    "Toronto Metro", "London Metro", "Tokyo Metro", "Sao Paulo Metro"]
 
 Region_Base_Temp = {
     "West": {1:0, 2:2, 3:6, 4:12, 5:18, 6:22, 7:25, 8:24, 9:20, 10:14, 11:7, 12:2},
@@ -102,11 +123,8 @@ def weather_for(ts, region):
 # Main Data Generation 
 # --------------------------
 
-def generate(start="2024-10-21", days=365, stores=150, avg_orders=900):
+def generate_scalar(start="2024-10-21", days=365, stores=150, avg_orders=900):
     start_date = datetime.fromisoformat(start)
-    markets = ["Seattle Metro", "LA Metro", "SF Bay", "Chicago Metro",
-        "Dallas-Fort Worth", "Atlanta Metro", "NYC Metro", "Boston Metro",
-        "Toronto Metro", "London Metro", "Tokyo Metro", "Sao Paulo Metro"]
 
     stores_df=pd.DataFrame({
         "Store ID": [str(uuid.uuid4()) for _ in range(stores)],
@@ -190,15 +208,447 @@ def generate(start="2024-10-21", days=365, stores=150, avg_orders=900):
                                                      "Subcategory", "Size", "Quantity", "Price", "COGS"])
     return stores_df, orders_df, order_items_df
 
+# --------------------------
+# Vectorized Data Generation
+# --------------------------
+# Same schema and distributions as generate_scalar(), but every draw for a
+# block of days is made in bulk with a numpy Generator instead of per order.
+
+ORDER_COLUMNS = ["Order ID", "Store ID", "Region", "Market", "Order Timestamp", "Daypart",
+                 "Channel", "Num Items", "Device", "Is Loyalty Member", "Payment Method",
+                 "Stars Redeemed", "Has Food Item", "Temperature (C)", "Weather Condition",
+                 "Subtotal", "Discount Amount", "Tax Amount", "Tip Amount", "Total Amount",
+                 "Total COGS", "Profit"]
+ITEM_COLUMNS = ["Order ID", "Line Item", "Product Name", "Category",
+                "Subcategory", "Size", "Quantity", "Price", "COGS"]
+
+store_formats = ["Drive-Thru", "In-Line", "Kiosk"]
+regions = ["West", "Midwest", "South", "Northeast"]
+devices = ["POS", "iOS", "Android", "UberEats", "DoorDash", "GrubHub"]
+payment_methods = ["Starbucks Card", "Credit Card", "Mobile Pay", "Cash"]
+weather_conditions = ["Cold", "Cool", "Mild", "Warm", "Hot"]
+promo_codes = ["None", "Holiday Promo", "Fall Promo"]
+
+# product table: one row per (subcategory, size) pair, in config order
+_category_names = list(categories.keys())
+_subcats = [(c, sc) for c in _category_names for sc in categories[c]]
+_products = [(c, sc, sz) for c, sc in _subcats for sz in sizes.get(sc, sizes["_default"])]
+_sub_start = np.cumsum([0] + [len(categories[c]) for c in _category_names])[:-1]
+_sub_count = np.array([len(categories[c]) for c in _category_names])
+_size_count = np.array([len(sizes.get(sc, sizes["_default"])) for _, sc in _subcats])
+_prod_start = np.cumsum(np.r_[0, _size_count])[:-1]
+_prod_subcat = np.array([_subcats.index((c, sc)) for c, sc, _ in _products])
+_cold_subcat = np.array([sc in ["Cold Coffee", "Cold Tea", "Refreshers", "Frappuccino"] for _, sc in _subcats])
+_hot_subcat = np.array([sc in ["Hot Coffee", "Hot Tea"] for _, sc in _subcats])
+_price_mean = np.array([4.0, 6.0, 15.0])
+_cogs_rate = np.array([0.3, 0.55, 0.55])
+
+# hour -> daypart label (index into _daypart_labels)
+_daypart_labels = [dp for dp, _, _ in dayparts] + ["Late Night"]
+_hour_daypart = np.array([_daypart_labels.index(daypart_of(datetime(2000, 1, 1, h))) for h in range(24)])
+
+_base_temp = np.array([[Region_Base_Temp[r][m] for m in range(1, 13)] for r in regions], dtype=float)
+_tip_rate = np.array([0.35, 0.25, 0.30, 0.15])
+_uuid_cols = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+_hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+def _cdf(weights):
+    w = np.asarray(weights, dtype=float)
+    return np.cumsum(w) / w.sum()
+
+def _draw(rng, weights, size):
+    # random.choices-style weighted draw of indices, vectorized
+    return np.searchsorted(_cdf(weights), rng.random(size), side="right")
+
+def _uuid_strings(rng, n):
+    # uuid4-formatted strings built from the generator, so ids are reproducible. Order IDs used to be
+    # 6 hex chars (str(uuid4())[2:8]), which collide within a year of default data; keep all 36
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    nib = np.empty((n, 32), dtype=np.uint8)
+    nib[:, 0::2] = _hex_digits[raw >> 4]
+    nib[:, 1::2] = _hex_digits[raw & 0x0F]
+    out = np.full((n, 36), ord("-"), dtype=np.uint8)
+    out[:, _uuid_cols] = nib
+    return out.view("S36").ravel().astype(str).astype(object)
+
+def _take(labels, codes):
+    return np.asarray(labels, dtype=object)[codes]
+
+def _generate_stores_vectorized(rng, stores):
+    fmt = rng.choice(store_formats, p=[0.55, 0.35, 0.10], size=stores)
+    region = rng.choice(regions, size=stores)
+    market = rng.choice(markets, size=stores)
+    wait = np.select(
+        [fmt == "Drive-Thru", fmt == "Kiosk"],
+        [np.maximum(2, np.round(rng.normal(4, 1.5, size=stores), 1)),
+         np.maximum(3, np.round(rng.normal(6, 2, size=stores), 1))],
+        np.maximum(4, np.round(rng.normal(8, 3, size=stores), 1)))
+    return pd.DataFrame({
+        "Store ID": _uuid_strings(rng, stores),
+        "Format": fmt,
+        "Region": region,
+        "Market": market,
+        "Avg Wait Time (mins)": np.round(wait, 1),
+    })
+
+def _generate_block(rng, start_date, day_offsets, stores_df, orders_per_store):
+    day_offsets = np.asarray(day_offsets, dtype=np.int64)
+    n_stores = len(stores_df)
+    is_dt = (stores_df["Format"].to_numpy() == "Drive-Thru")
+    store_region = pd.Categorical(stores_df["Region"], categories=regions).codes
+
+    day_ts = np.datetime64(start_date, "ns") + day_offsets.astype("timedelta64[D]")
+    day_num = day_ts.astype("datetime64[D]").astype(np.int64)
+    dow = (day_num + 3) % 7  # 1970-01-01 was a Thursday
+    month = day_ts.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    lam = orders_per_store * np.where(is_dt, 1.2, 1.0)[None, :] * np.where(dow >= 5, 1.3, 1.0)[:, None]
+    counts = rng.poisson(lam).ravel()
+    cell = np.repeat(np.arange(counts.size), counts)
+    d, s = cell // n_stores, cell % n_stores
+    n = cell.size
+
+    # --- order level ---
+    minute = rng.integers(6 * 60, 20 * 60 + 1, size=n)
+    order_ts = day_ts[d] + minute.astype("timedelta64[m]")
+    o_month = month[d]
+
+    u = rng.random(n)
+    channel = np.where(is_dt[s],
+                       np.searchsorted(_cdf([0.25, 0.65, 0.20, 0.02]), u, side="right"),
+                       np.searchsorted(_cdf([0.46, 0.30, 0.23, 0.05]), u, side="right"))
+
+    u = rng.random(n)
+    device = np.zeros(n, dtype=np.int64)
+    device = np.where(channel == 1, np.where(u < 0.65, 1, 2), device)
+    device = np.where(channel == 3, 3 + np.searchsorted(_cdf([0.5, 0.3, 0.2]), u, side="right"), device)
+
+    temp = np.round(rng.normal(_base_temp[store_region[s], o_month - 1], 3.0))
+    weather = np.select([temp >= 26, temp >= 18, temp >= 13, temp >= 8], [4, 3, 2, 1], 0)
+
+    n_items = 1 + _draw(rng, [0.72, 0.18, 0.07, 0.03], n)
+    offsets = np.cumsum(n_items) - n_items
+
+    # --- line level ---
+    L = int(n_items.sum())
+    line_order = np.repeat(np.arange(n), n_items)
+    line_no = np.arange(L) - offsets[line_order] + 1
+    cat = _draw(rng, [0.6, 0.3, 0.02], L)
+    sub = _sub_start[cat] + (rng.random(L) * _sub_count[cat]).astype(np.int64)
+    prod = _prod_start[sub] + (rng.random(L) * _size_count[sub]).astype(np.int64)
+    base_price = np.round(rng.normal(_price_mean[cat], 0.8), 2)
+    cogs = np.round(base_price * _cogs_rate[cat], 2)
+    qty = 1 + _draw(rng, [0.85, 0.10, 0.05], L)
+    l_month = o_month[line_order]
+    season = np.where(_cold_subcat[sub] & np.isin(l_month, [5, 6, 7, 8]), 1.35,
+                      np.where(_hot_subcat[sub] & np.isin(l_month, [10, 11, 12]), 1.25, 1.0))
+    price = base_price * season
+
+    if n:
+        subtotal = np.add.reduceat(price * qty, offsets)
+        cogs_total = np.add.reduceat(cogs * qty, offsets)
+        attached_food = np.add.reduceat((cat == 1).astype(np.int64), offsets) > 0
+    else:
+        subtotal = cogs_total = np.zeros(0)
+        attached_food = np.zeros(0, dtype=bool)
+
+    # --- pricing, loyalty, tips ---
+    basic_discount = np.array([0.0, 0.05, 0.10, 0.15])[_draw(rng, [0.85, 0.07, 0.05, 0.03], n)]
+    is_member = rng.random(n) < 0.4
+    loyalty_discount = np.where(is_member & (rng.random(n) < 0.2), 0.05, 0.0)
+    discount_rate = np.minimum(basic_discount + loyalty_discount, 0.3)
+    tax = np.round(subtotal * 0.08, 2)
+    total = subtotal * (1 - discount_rate) + tax
+
+    stars = np.where(is_member, np.array([0, 25, 50, 100])[_draw(rng, [0.7, 0.15, 0.1, 0.05], n)], 0)
+    u = rng.random(n)
+    payment = np.where(is_member,
+                       np.searchsorted(_cdf([0.5, 0.3, 0.2]), u, side="right"),
+                       1 + np.searchsorted(_cdf([0.6, 0.3, 0.1]), u, side="right"))
+    tipped = rng.random(n) < _tip_rate[channel]
+    tip = np.where(tipped, np.round(np.maximum(0.25, rng.gamma(2.0, 0.6, size=n)), 2), 0.0)
+
+    order_ids = _uuid_strings(rng, n)
+    orders_df = pd.DataFrame({
+        "Order ID": order_ids,
+        "Store ID": stores_df["Store ID"].to_numpy()[s],
+        "Region": stores_df["Region"].to_numpy()[s],
+        "Market": stores_df["Market"].to_numpy()[s],
+        "Order Timestamp": order_ts,
+        "Daypart": _take(_daypart_labels, _hour_daypart[minute // 60]),
+        "Channel": _take(channels, channel),
+        "Num Items": n_items,
+        "Device": _take(devices, device),
+        "Is Loyalty Member": is_member,
+        "Payment Method": _take(payment_methods, payment),
+        "Stars Redeemed": stars,
+        "Has Food Item": attached_food,
+        "Temperature (C)": temp.astype(float),
+        "Weather Condition": _take(weather_conditions, weather),
+        "Subtotal": np.round(subtotal, 2),
+        "Discount Amount": np.round(discount_rate * subtotal, 2),
+        "Tax Amount": tax,
+        "Tip Amount": np.round(tip, 2),
+        "Total Amount": np.round(total + tip, 2),
+        "Total COGS": np.round(cogs_total, 2),
+        "Profit": np.round(total - cogs_total, 2),
+    }, columns=ORDER_COLUMNS)
+    items_df = pd.DataFrame({
+        "Order ID": order_ids[line_order],
+        "Line Item": line_no,
+        "Product Name": np.array([f"{sz} {sc}" for _, sc, sz in _products], dtype=object)[prod],
+        "Category": _take(_category_names, cat),
+        "Subcategory": _take([sc for _, sc in _subcats], sub),
+        "Size": _take([sz for _, _, sz in _products], prod),
+        "Quantity": qty,
+        "Price": np.round(price, 2),
+        "COGS": np.round(cogs, 2),
+    }, columns=ITEM_COLUMNS)
+    return orders_df, items_df
+
+# --------------------------
+# Sharded Generation
+# --------------------------
+# The (day x store) space is cut into fixed-size shards. Each shard draws from
+# its own SeedSequence stream keyed on (seed, shard position), so the output
+# for a seed is identical no matter how many worker processes run the shards.
+
+SHARD_DAYS = 7
+SHARD_STORES = 256
+# bump whenever a change to the vectorized engine alters what a shard contains
+# (2: sketch parts keyed Date x Region x Channel, integer ranks; 3: dense monthly sketch buckets;
+#  4: no promo draw, which no column used)
+ENGINE_VERSION = 4
+DEFAULT_PARAMS = {"start": "2024-10-21", "days": 365, "stores": 150, "avg_orders": 900, "seed": 42}
+
+def _shard_rng(seed, *key):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+def generate_stores(stores=150, seed=42, shard_stores=SHARD_STORES):
+    # one stream per block of stores, always drawn at full block size and then
+    # trimmed, so adding stores never reshuffles the existing ones
+    parts = [_generate_stores_vectorized(_shard_rng(seed, 0, b), shard_stores).iloc[:stores - first]
+             for b, first in enumerate(range(0, stores, shard_stores))]
+    if not parts:
+        return _generate_stores_vectorized(_shard_rng(seed, 0, 0), 0)
+    return pd.concat(parts, ignore_index=True)
+
+def plan_shards(days=365, stores=150, shard_days=SHARD_DAYS, shard_stores=SHARD_STORES):
+    return [(db, sb) for db in range(-(-days // shard_days)) for sb in range(-(-stores // shard_stores))]
+
+def generate_shard(shard, stores_df, start="2024-10-21", days=365, avg_orders=900, seed=42,
+                   shard_days=SHARD_DAYS, shard_stores=SHARD_STORES):
+    db, sb = shard
+    day_offsets = np.arange(db * shard_days, min((db + 1) * shard_days, days))
+    block = stores_df.iloc[sb * shard_stores:(sb + 1) * shard_stores]
+    return _generate_block(_shard_rng(seed, 1, db, sb), datetime.fromisoformat(start), day_offsets,
+                           block, avg_orders / len(stores_df))
+
+def _run_shard(args):
+    return generate_shard(*args[:2], **args[2])
+
+def iter_shards(stores_df, shards, workers=1, **params):
+    # yields (shard, orders, items) in the order of `shards`
+    jobs = [(shard, stores_df, params) for shard in shards]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield (job[0], *_run_shard(job))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # at most two shards per worker in flight: finished shards never pile up
+        # in memory ahead of a slow consumer (e.g. one writing them to disk)
+        pending = deque()
+        queued = iter(jobs)
+        for job in itertools.islice(queued, 2 * workers):
+            pending.append((job, pool.submit(_run_shard, job)))
+        while pending:
+            job, fut = pending.popleft()
+            o, i = fut.result()
+            nxt = next(queued, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(_run_shard, nxt)))
+            yield job[0], o, i
+
+def generate_vectorized(start="2024-10-21", days=365, stores=150, avg_orders=900, seed=42, workers=1,
+                        shard_days=SHARD_DAYS, shard_stores=SHARD_STORES):
+    stores_df = generate_stores(stores, seed=seed, shard_stores=shard_stores)
+    parts_o, parts_i = [], []
+    for _, o, i in iter_shards(stores_df, plan_shards(days, stores, shard_days, shard_stores), workers=workers,
+                               start=start, days=days, avg_orders=avg_orders, seed=seed,
+                               shard_days=shard_days, shard_stores=shard_stores):
+        parts_o.append(o)
+        parts_i.append(i)
+    if not parts_o:
+        return stores_df, pd.DataFrame(columns=ORDER_COLUMNS), pd.DataFrame(columns=ITEM_COLUMNS)
+    orders_df = pd.concat(parts_o, ignore_index=True)
+    order_items_df = pd.concat(parts_i, ignore_index=True)
+    return stores_df, orders_df, order_items_df
+
+@traced(rows_out=lambda out: len(out[1]))
+def generate(start="2024-10-21", days=365, stores=150, avg_orders=900, engine="vectorized", seed=42, workers=1):
+    if engine == "scalar":
+        return generate_scalar(start=start, days=days, stores=stores, avg_orders=avg_orders)
+    if engine == "vectorized":
+        return generate_vectorized(start=start, days=days, stores=stores, avg_orders=avg_orders, seed=seed,
+                                   workers=workers)
+    raise ValueError(f"Unknown engine: {engine!r}")
+
+# --------------------------
+# Engine Comparison
+# --------------------------
+
+def summarize(orders: pd.DataFrame, items: pd.DataFrame) -> pd.Series:
+    # distribution fingerprint used to check the engines against each other
+    stats = {
+        "orders": len(orders),
+        "items per order": len(items) / max(len(orders), 1),
+        "mean total": orders["Total Amount"].mean(),
+        "mean subtotal": orders["Subtotal"].mean(),
+        "mean profit": orders["Profit"].mean(),
+        "mean tip": orders["Tip Amount"].mean(),
+        "mean temperature": orders["Temperature (C)"].mean(),
+        "loyalty share": orders["Is Loyalty Member"].mean(),
+        "food attach rate": orders["Has Food Item"].mean(),
+        "mean price": items["Price"].mean(),
+        "mean quantity": items["Quantity"].mean(),
+    }
+    for col in ["Channel", "Device", "Daypart", "Payment Method", "Weather Condition"]:
+        for k, v in orders[col].value_counts(normalize=True).items():
+            stats[f"{col}={k}"] = v
+    for k, v in items["Category"].value_counts(normalize=True).items():
+        stats[f"Category={k}"] = v
+    return pd.Series(stats)
+
+def compare_engines(start="2024-10-21", days=30, stores=20, avg_orders=900, seed=42):
+    _, o_s, i_s = generate_scalar(start=start, days=days, stores=stores, avg_orders=avg_orders)
+    _, o_v, i_v = generate_vectorized(start=start, days=days, stores=stores, avg_orders=avg_orders, seed=seed)
+    out = pd.concat({"scalar": summarize(o_s, i_s), "vectorized": summarize(o_v, i_v)}, axis=1).fillna(0.0)
+    out["rel diff"] = (out["vectorized"] - out["scalar"]) / out["scalar"].abs().where(out["scalar"] != 0)
+    return out
+
 # ---------------------------
 # Script Entry Point
 # ---------------------------
-def generate_and_save():
-    stores, orders, items = generate()
-    stores.to_csv("data/stores.csv", index=False)
-    orders.to_csv("data/orders.csv", index=False)
-    items.to_csv("data/order_items.csv", index=False)
+def generate_and_save(data_dir="data", fmt=DEFAULT_FORMAT, compression=DEFAULT_COMPRESSION, layout="single",
+                      params=None):
+    stores, orders, items = generate(**{**DEFAULT_PARAMS, **(params or {})})
+    orders = add_derived_features(orders, items)
+    if layout == "partitioned":
+        save_partitioned(stores, orders, items, data_dir=data_dir, compression=compression)
+    else:
+        save_tables(stores, orders, items, data_dir=data_dir, fmt=fmt, compression=compression)
+    save_cube(build_cube(orders), data_dir)
+    save_category_cube(build_category_cube(orders, items), data_dir)
+    save_store_cube(build_store_cube(orders), data_dir)
+    save_moments(build_moments(orders), data_dir)
+    save_sketch(build_sketch(orders), data_dir)
+    save_basket_table(build_basket_table(items), data_dir)
     return stores, orders, items
 
+def generate_to_dir(data_dir="data", fmt=DEFAULT_FORMAT, compression=DEFAULT_COMPRESSION, workers=1,
+                    progress=None, **params):
+    # single-file layout, streamed: each shard goes to disk as soon as it is generated,
+    # so memory holds a few shards plus the small rollup parts, never the whole dataset.
+    # Same tables as generate_and_save(params=params); returns the order count.
+    p = {**DEFAULT_PARAMS, **params}
+    os.makedirs(data_dir, exist_ok=True)
+    stores_df = generate_stores(p["stores"], seed=p["seed"])
+    shards = plan_shards(p["days"], p["stores"])
+    cubes, cat_cubes, store_cubes, moments, sketches, baskets = [], [], [], [], [], []
+    with TableWriter(table_path(data_dir, "stores", fmt), fmt, "stores", compression) as ws:
+        ws.write(stores_df)
+    with TableWriter(table_path(data_dir, "orders", fmt), fmt, "orders", compression,
+                     ORDER_COLUMNS + FEATURE_COLUMNS) as wo, \
+         TableWriter(table_path(data_dir, "items", fmt), fmt, "items", compression, ITEM_COLUMNS) as wi:
+        for done, (_, orders, items) in enumerate(
+                iter_shards(stores_df, shards, workers=workers, start=p["start"], days=p["days"],
+                            avg_orders=p["avg_orders"], seed=p["seed"]), start=1):
+            orders = add_derived_features(orders, items)
+            wo.write(orders)
+            wi.write(items)
+            cubes.append(build_cube(orders))
+            cat_cubes.append(build_category_cube(orders, items))
+            store_cubes.append(build_store_cube(orders))
+            moments.append(build_moments(orders))
+            sketches.append(build_sketch(orders))
+            baskets.append(build_basket_table(items))
+            if progress:
+                progress(done, len(shards), len(orders))
+    drop_other_formats(data_dir, fmt)
+    if cubes:
+        save_cube(merge_cubes(cubes), data_dir)
+        save_category_cube(merge_category_cubes(cat_cubes), data_dir)
+        save_store_cube(merge_store_cubes(store_cubes), data_dir)
+        save_moments(combine_moment_tables(moments), data_dir)
+        save_sketch(merge_sketches(sketches), data_dir)
+        save_basket_table(merge_basket_tables(baskets), data_dir)
+    return wo.rows
+
+class Progress:
+    # progress(done, total, rows) callback: a line every `every` seconds (and at the end)
+    # with rows so far, throughput and ETA; rows are counted even when quiet
+    def __init__(self, every: float = 2.0, stream=None, quiet: bool = False):
+        self.every = every
+        self.stream = stream or sys.stderr
+        self.quiet = quiet
+        self.rows = 0
+        self.t0 = self._last = time.perf_counter()
+
+    def __call__(self, done: int, total: int, rows: int):
+        self.rows += rows
+        now = time.perf_counter()
+        if self.quiet or (done < total and now - self._last < self.every):
+            return
+        self._last = now
+        elapsed = now - self.t0
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        eta = elapsed / done * (total - done) if done else 0.0
+        print(f"[{done:>{len(str(total))}}/{total} shards {done / max(total, 1):6.1%}] "
+              f"{self.rows:>13,} orders {rate:>11,.0f} orders/s  elapsed {elapsed:7.1f}s  eta {eta:7.1f}s",
+              file=self.stream, flush=True)
+
+def _dir_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 2**20
+
+def main(argv=None):
+    # headless generation for batch jobs; the app picks the result up through the params file
+    from Starbucks_Manifest import sync_dataset, dataset_fingerprint, save_params, FINGERPRINT_FILE
+
+    parser = argparse.ArgumentParser(description="Generate the synthetic Brewed Insights dataset.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--start", default=DEFAULT_PARAMS["start"], help="first day, YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=DEFAULT_PARAMS["days"])
+    parser.add_argument("--stores", type=int, default=DEFAULT_PARAMS["stores"])
+    parser.add_argument("--avg-orders", type=int, default=DEFAULT_PARAMS["avg_orders"],
+                        help="orders per day across all stores")
+    parser.add_argument("--seed", type=int, default=DEFAULT_PARAMS["seed"])
+    parser.add_argument("--format", default=DEFAULT_FORMAT, choices=list(FORMATS))
+    parser.add_argument("--compression", default=DEFAULT_COMPRESSION)
+    parser.add_argument("--layout", default="single", choices=["single", "partitioned"],
+                        help="partitioned is parquet only and regenerates just the shards that changed")
+    parser.add_argument("--workers", type=int, default=1, help="generator processes")
+    parser.add_argument("--quiet", action="store_true", help="no progress lines")
+    args = parser.parse_args(argv)
+    if args.layout == "partitioned" and args.format != "parquet":
+        parser.error("the partitioned layout is parquet only")
+
+    params = {"start": args.start, "days": args.days, "stores": args.stores, "avg_orders": args.avg_orders,
+              "seed": args.seed}
+    progress = Progress(quiet=args.quiet)
+    t0 = time.perf_counter()
+    if args.layout == "partitioned":
+        sync_dataset(args.data_dir, workers=args.workers, compression=args.compression, progress=progress, **params)
+    else:
+        generate_to_dir(args.data_dir, args.format, args.compression, args.workers, progress, **params)
+        with open(os.path.join(args.data_dir, FINGERPRINT_FILE), "w") as fh:
+            fh.write(dataset_fingerprint(**params))
+    save_params(args.data_dir, params)
+    seconds = time.perf_counter() - t0
+    print(f"wrote {progress.rows:,} orders to {args.data_dir}/ ({args.layout}, {args.format}) in {seconds:.1f}s, "
+          f"{progress.rows / seconds if seconds else 0:,.0f} orders/s, {_dir_mb(args.data_dir):,.0f} MB on disk")
+    return 0
 
-    
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# Starbucks_Features.py
+import numpy as np
+import pandas as pd
+
+from Starbucks_Storage import item_order_positions
+
+# -----------------------------
+# Derived per-order features
+# -----------------------------
+# Computed once when data is generated (or first loaded) and stored with the
+# orders, so the app, plots and AI facts read ready-made columns instead of
+# re-deriving them from timestamps and line items on every rerun.
+
+ICED_SUBCATS = ["Cold Coffee", "Cold Tea", "Refreshers", "Frappuccino"]
+FEATURE_COLUMNS = ["Iced Items", "Iced Share", "Weekday", "Order Date", "Order Month", "Order Hour"]
+
+def has_features(orders: pd.DataFrame) -> bool:
+    return all(c in orders.columns for c in FEATURE_COLUMNS)
+
+def iced_item_counts(orders: pd.DataFrame, items: pd.DataFrame) -> np.ndarray:
+    pos = item_order_positions(orders, items)
+    iced = items["Subcategory"].isin(ICED_SUBCATS).to_numpy()
+    keep = pos >= 0
+    return np.bincount(pos[keep], weights=iced[keep], minlength=len(orders)).astype(np.int64)
+
+def add_derived_features(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    ts = orders["Order Timestamp"]
+    iced = iced_item_counts(orders, items)
+    lines = orders["Num Items"].to_numpy()
+    features = pd.DataFrame({
+        "Iced Items": iced,
+        "Iced Share": np.divide(iced, lines, out=np.zeros(len(iced)), where=lines > 0),
+        "Weekday": ts.dt.weekday.astype("int8"),
+        "Order Date": ts.dt.normalize(),
+        "Order Month": ts.dt.to_period("M").dt.start_time.astype(ts.dtype),
+        "Order Hour": ts.dt.hour.astype("int8"),
+    }, index=orders.index)
+    return pd.concat([orders.drop(columns=[c for c in FEATURE_COLUMNS if c in orders.columns]), features], axis=1)
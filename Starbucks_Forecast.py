@@ -0,0 +1,156 @@
+# Starbucks_Forecast.py
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Per-store revenue forecasting
+# -----------------------------
+# Every store gets the same seasonal baseline: one level per weekday x
+# daypart, a linear trend and (optionally) a slope on the day's temperature
+# relative to the store's own mean. Revenue comes from the store cube as a
+# stores x (days x dayparts) matrix Y, so all stores are fitted at once:
+#
+#   - the weekday x daypart dummies and the trend are the same design X for
+#     every store, so X'X is computed once and X'Y is one matrix product;
+#   - temperature is the only per-store column; it adds one row/column to
+#     each store's normal equations, built from Z @ X (Z: stores x days);
+#   - the stores' (k x k) systems are solved in a single batched
+#     np.linalg.solve.
+#
+# Cost is a few matrix products over Y plus S tiny solves, no per-store
+# Python loop, so refitting thousands of stores after a regeneration takes
+# seconds. Bands assume independent residuals with a per-store variance.
+
+HORIZON_DAYS = 28
+HISTORY_DAYS = 56   # actuals shown in front of the forecast
+BAND_LEVEL = 0.8
+TEMP_WINDOW = 28    # future temperature: each store's mean deviation over its last TEMP_WINDOW days
+RIDGE = 1e-6        # relative to the mean diagonal of X'X; keeps unseen weekday x daypart cells solvable
+
+def _design(first_day: pd.Timestamp, days: np.ndarray, n_dayparts: int, n_days: int) -> np.ndarray:
+    # rows: (day, daypart) slots; columns: weekday x daypart dummies, then trend
+    P = n_dayparts
+    d = np.repeat(days, P)
+    p = np.tile(np.arange(P), len(days))
+    X = np.zeros((len(d), 7 * P + 1))
+    X[np.arange(len(d)), ((first_day.weekday() + d) % 7) * P + p] = 1.0
+    X[:, -1] = d / max(n_days, 1)
+    return X
+
+class StoreForecast:
+    # next-HORIZON_DAYS daily revenue for every store, with per-store residual spread
+    def __init__(self, stores, regions, dates, history, forecast, sigma, coef, dayparts):
+        self.stores = stores      # Store ID per row
+        self.regions = regions    # Region per row
+        self.dates = dates        # forecast days
+        self.history = history    # stores x days actual daily revenue, ending the day before dates[0]
+        self.forecast = forecast  # stores x horizon expected daily revenue
+        self.sigma = sigma        # per-store std. dev. of one day's revenue
+        self.coef = coef          # stores x (7 * dayparts + 1 [+ 1]) fitted coefficients
+        self.dayparts = dayparts
+
+    @classmethod
+    def fit(cls, store_cube: pd.DataFrame, channels=None, temperature: bool = True,
+            horizon: int = HORIZON_DAYS) -> "StoreForecast":
+        # store_cube: Starbucks_Rollup.build_store_cube; empty channels don't filter (like slice_cube)
+        cube = store_cube[store_cube["Channel"].isin(channels).to_numpy()] if channels else store_cube
+        s, stores = pd.factorize(cube["Store ID"].to_numpy(), sort=True)
+        p, dayparts = pd.factorize(cube["Daypart"].to_numpy(), sort=True)
+        first = pd.Timestamp(cube["Date"].min())
+        d = ((cube["Date"] - first) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+        S, P, D = len(stores), max(len(dayparts), 1), int(d.max()) + 1 if len(d) else 0
+        regions = np.empty(S, dtype=object)
+        regions[s] = cube["Region"].to_numpy()
+
+        slot = (s * D + d) * P + p
+        Y = np.bincount(slot, weights=cube["Total Amount"].to_numpy(dtype=np.float64), minlength=S * D * P)
+        Y = Y.reshape(S, D * P)
+        daily = Y.reshape(S, D, P).sum(axis=2)
+
+        X = _design(first, np.arange(D), P, D)
+        k0 = X.shape[1]
+        G = X.T @ X
+        ridge = RIDGE * max(np.trace(G) / k0, 1.0) * np.eye(k0 + temperature)
+        XtY = Y @ X
+        yy = np.einsum("ij,ij->i", Y, Y)
+
+        if temperature:
+            # z: day's mean order temperature minus the store's mean; 0 on days without orders
+            day = s * D + d
+            t_sum = np.bincount(day, weights=cube["Temperature (C)"].to_numpy(dtype=np.float64), minlength=S * D)
+            n = np.bincount(day, weights=cube["Orders"].to_numpy(dtype=np.float64), minlength=S * D)
+            t_sum, n = t_sum.reshape(S, D), n.reshape(S, D)
+            seen = n > 0
+            t_day = np.divide(t_sum, n, out=np.zeros_like(t_sum), where=seen)
+            t_mean = t_sum.sum(axis=1) / np.maximum(n.sum(axis=1), 1)
+            Z = np.where(seen, t_day - t_mean[:, None], 0.0)
+            Xd = X.reshape(D, P, k0).sum(axis=1)  # temperature is constant across a day's dayparts
+            c = Z @ Xd
+            A = np.empty((S, k0 + 1, k0 + 1))
+            A[:, :k0, :k0] = G
+            A[:, :k0, k0] = A[:, k0, :k0] = c
+            A[:, k0, k0] = P * np.einsum("ij,ij->i", Z, Z)
+            b = np.column_stack([XtY, np.einsum("ij,ij->i", Z, daily)])
+            coef = np.linalg.solve(A + ridge, b[..., None])[..., 0]
+            fit_ss = np.einsum("si,sij,sj->s", coef, A, coef)
+            recent = seen[:, -TEMP_WINDOW:]
+            z_future = Z[:, -TEMP_WINDOW:].sum(axis=1) / np.maximum(recent.sum(axis=1), 1)
+        else:
+            coef = np.linalg.solve(G + ridge, XtY.T).T
+            b = XtY
+            fit_ss = np.einsum("si,ij,sj->s", coef, G, coef)
+
+        # residual sum of squares from the normal equations, without materializing fitted values
+        rss = np.maximum(yy - 2 * np.einsum("si,si->s", coef, b) + fit_ss, 0.0)
+        sigma = np.sqrt(rss / max(D * P - coef.shape[1], 1) * P)
+
+        Xf = _design(first, np.arange(D, D + horizon), P, D)
+        fc = (coef[:, :k0] @ Xf.T).reshape(S, horizon, P).sum(axis=2)
+        if temperature:
+            fc += coef[:, k0:] * P * z_future[:, None]
+        dates = first + pd.to_timedelta(np.arange(D, D + horizon), unit="D")
+        return cls(np.asarray(stores, dtype=object), regions, dates, daily, fc, sigma, coef,
+                   np.asarray(dayparts, dtype=object))
+
+    def mask(self, regions=None, stores=None) -> np.ndarray:
+        # empty region / store lists don't filter
+        m = np.isin(self.regions, list(regions)) if regions else np.ones(len(self.stores), dtype=bool)
+        return m & np.isin(self.stores, list(stores)) if stores else m
+
+    def frame(self, regions=None, level: float = BAND_LEVEL, history_days: int = HISTORY_DAYS, stores=None):
+        # -> daily Date / Revenue (actuals) / Forecast / Lower / Upper summed over the selected stores
+        m = self.mask(regions, stores)
+        if not m.any():
+            return None
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        hist = self.history[m][:, -history_days:].sum(axis=0)
+        mean = self.forecast[m].sum(axis=0)
+        half = z * np.sqrt((self.sigma[m] ** 2).sum())
+        h_dates = self.dates[0] - pd.to_timedelta(np.arange(len(hist), 0, -1), unit="D")
+        nan = np.full(len(hist), np.nan)
+        return pd.DataFrame({
+            "Date": np.r_[h_dates, self.dates],
+            "Revenue": np.r_[hist, np.full(len(mean), np.nan)],
+            "Forecast": np.r_[nan, mean],
+            "Lower": np.r_[nan, np.maximum(mean - half, 0.0)],
+            "Upper": np.r_[nan, mean + half],
+        })
+
+    def store_frame(self, regions=None, level: float = BAND_LEVEL) -> pd.DataFrame:
+        # one row per selected store: forecast total over the horizon vs the same span just before it
+        m = self.mask(regions)
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        h = self.forecast.shape[1]
+        total = self.forecast[m].sum(axis=1)
+        half = z * self.sigma[m] * np.sqrt(h)
+        last = self.history[m][:, -h:].sum(axis=1)
+        return pd.DataFrame({
+            "Store ID": self.stores[m],
+            "Region": self.regions[m],
+            "Forecast": total,
+            "Lower": np.maximum(total - half, 0.0),
+            "Upper": total + half,
+            f"Last {h} Days": last,
+            "Change %": np.divide((total - last) * 100, last, out=np.full(len(last), np.nan), where=last > 0),
+        })
@@ -0,0 +1,133 @@
+# Starbucks_Index.py
+import numpy as np
+import pandas as pd
+
+from Starbucks_Storage import item_order_positions
+
+# -----------------------------
+# Filter index
+# -----------------------------
+# Built once per dataset. Orders are kept sorted by timestamp so a date range
+# is two searchsorted calls, and each Region / Channel value has a packed
+# bitmap over that sorted order; a filter is OR within a column, AND across
+# columns, evaluated only over the bytes covering the date slice.
+#
+# When items are given they are regrouped CSR-style: items for sorted order i
+# are rows offsets[i]:offsets[i+1], so the items of any order selection are a
+# vectorized range-take with no key lookup.
+#
+# Frames that are already in that layout (sort_for_index) are indexed as-is:
+# the index then holds the caller's frames plus perm / offsets / bitmaps, so
+# a shared read-only snapshot is never duplicated.
+
+def _is_sorted(a: np.ndarray) -> bool:
+    return len(a) < 2 or bool((a[1:] >= a[:-1]).all())
+
+def sort_for_index(orders: pd.DataFrame, items: pd.DataFrame = None, ts_col="Order Timestamp"):
+    # -> (orders by timestamp, items grouped in that order sequence), the layout FilterIndex keeps without copying
+    perm = np.argsort(orders[ts_col].to_numpy(), kind="stable")
+    orders = orders.take(perm).reset_index(drop=True)
+    if items is not None:
+        pos = item_order_positions(orders, items)
+        keep = pos >= 0
+        items = items[keep].take(np.argsort(pos[keep], kind="stable")).reset_index(drop=True)
+    return orders, items
+
+class FilterIndex:
+    def __init__(self, orders: pd.DataFrame, items: pd.DataFrame = None, columns=("Region", "Channel"),
+                 ts_col="Order Timestamp"):
+        ts = orders[ts_col].to_numpy()
+        if _is_sorted(ts):
+            self.perm = np.arange(len(orders))
+            self.orders = orders  # already in timestamp order: no copy
+        else:
+            self.perm = np.argsort(ts, kind="stable")  # sorted position -> row in the original frame
+            self.orders = orders.take(self.perm).reset_index(drop=True)
+        self.ts = self.orders[ts_col].to_numpy()
+        self.bitmaps = {}
+        for col in columns:
+            if col not in self.orders.columns:
+                continue
+            codes, uniques = pd.factorize(self.orders[col], sort=True)
+            self.bitmaps[col] = {v: np.packbits(codes == k) for k, v in enumerate(uniques)}
+        self.items = self.offsets = None
+        if items is not None:
+            self._build_items(orders, items)
+
+    def _build_items(self, orders: pd.DataFrame, items: pd.DataFrame):
+        inv = np.empty(len(self.perm), dtype=np.int64)
+        inv[self.perm] = np.arange(len(self.perm))
+        pos = item_order_positions(orders, items)
+        keep = pos >= 0  # items whose order isn't in `orders` are dropped
+        sorted_pos = inv[pos[keep]]
+        if keep.all() and _is_sorted(sorted_pos):
+            self.items = items  # already grouped in sorted order sequence: no copy
+        else:
+            order = np.argsort(sorted_pos, kind="stable")
+            self.items = items[keep].take(order).reset_index(drop=True)
+        counts = np.bincount(sorted_pos, minlength=len(self.orders))
+        self.offsets = np.r_[0, np.cumsum(counts)]
+
+    def __len__(self):
+        return len(self.orders)
+
+    def date_bounds(self, start=None, end=None):
+        # [lo, hi) positions covering calendar days start..end inclusive
+        lo, hi = 0, len(self.ts)
+        if start is not None:
+            lo = int(np.searchsorted(self.ts, np.datetime64(pd.Timestamp(start)).astype(self.ts.dtype), side="left"))
+        if end is not None:
+            stop = np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1)).astype(self.ts.dtype)
+            hi = int(np.searchsorted(self.ts, stop, side="left"))
+        return lo, max(lo, hi)
+
+    def _mask_bytes(self, col, values, b0, b1):
+        bitmaps = self.bitmaps[col]
+        acc = np.zeros(b1 - b0, dtype=np.uint8)
+        for v in values:
+            bm = bitmaps.get(v)
+            if bm is not None:
+                acc |= bm[b0:b1]
+        return acc
+
+    def positions(self, start=None, end=None, **filters):
+        # sorted positions matching the date range and {column: values} filters;
+        # a slice when only the date range applies. Empty value lists don't filter.
+        lo, hi = self.date_bounds(start, end)
+        active = {c: v for c, v in filters.items() if v and c in self.bitmaps}
+        if not active or lo == hi:
+            return slice(lo, hi)
+        b0, b1 = lo // 8, -(-hi // 8)
+        acc = None
+        for col, values in active.items():
+            m = self._mask_bytes(col, values, b0, b1)
+            acc = m if acc is None else acc & m
+        pos = np.flatnonzero(np.unpackbits(acc)) + b0 * 8
+        return pos[(pos >= lo) & (pos < hi)]
+
+    def take(self, pos) -> pd.DataFrame:
+        if isinstance(pos, slice):
+            return self.orders.iloc[pos]
+        return self.orders.take(pos)
+
+    def select(self, start=None, end=None, regions=None, channels=None) -> pd.DataFrame:
+        return self.take(self.positions(start, end, Region=regions, Channel=channels))
+
+    # --- order -> line items (CSR) ---
+
+    def item_rows(self, pos):
+        # item row indices (or a slice) for the selected sorted order positions
+        if isinstance(pos, slice):
+            lo, hi, _ = pos.indices(len(self.orders))
+            return slice(int(self.offsets[lo]), int(self.offsets[max(lo, hi)]))
+        starts = self.offsets[pos]
+        lens = self.offsets[pos + 1] - starts
+        total = int(lens.sum())
+        shift = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+        return np.arange(total) + shift
+
+    def take_items(self, pos) -> pd.DataFrame:
+        rows = self.item_rows(pos)
+        if isinstance(rows, slice):
+            return self.items.iloc[rows]
+        return self.items.take(rows)
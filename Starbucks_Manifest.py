@@ -0,0 +1,202 @@
+# Starbucks_Manifest.py
+import os
+import glob
+import shutil
+import json
+import hashlib
+import pandas as pd
+
+import Starbucks_Faker as faker_mod
+from Starbucks_Faker import (generate_stores, plan_shards, iter_shards, SHARD_DAYS, SHARD_STORES,
+                             ENGINE_VERSION, DEFAULT_PARAMS)
+from Starbucks_Storage import (save_partitioned, save_table, table_path, refresh_partition_meta,
+                               PARTITION_DIRS, PARTITION_META, DEFAULT_COMPRESSION)
+from Starbucks_Features import add_derived_features
+from Starbucks_Rollup import (build_cube, build_category_cube, build_store_cube, CUBE_DIR, CUBE_FILE, CATEGORY_DIR,
+                              CATEGORY_FILE, STORE_DIR, STORE_FILE)
+from Starbucks_Stats import build_moments, MOMENTS_DIR, MOMENTS_FILE
+from Starbucks_Sketch import build_sketch, SKETCH_DIR, SKETCH_FILE
+from Starbucks_Basket import build_basket_table, save_basket_table, BASKET_DIR, BASKET_FILE
+
+# -----------------------------
+# Incremental regeneration
+# -----------------------------
+# The manifest records, for every (day block x store block) shard on disk, a
+# key derived from exactly what that shard's rows depend on: seed, start date,
+# per-store order rate, the shard's day/store span, the domain config and the
+# monthly temperature table for the months the shard covers. Syncing the data
+# directory regenerates only shards whose key is missing or changed and drops
+# shards that are no longer part of the plan, so extending the window or
+# adding store blocks only generates the new slices.
+#
+# The per-store rate is avg_orders / stores, so adding stores without scaling
+# avg_orders changes every shard (a real config change) and regenerates all.
+#
+# The key also covers SHARD_PARTS, the per-shard artifact directories a sync
+# writes next to the partitions. Adding an artifact changes every key, so a
+# directory synced before the artifact existed regenerates its shards instead
+# of serving, say, moments for only the shards written after the upgrade. A
+# shard whose part file is missing on disk is regenerated as well.
+
+MANIFEST_FILE = "_manifest.json"
+# written by the command-line generator: the parameters a batch job used, which the
+# app then adopts instead of DEFAULT_PARAMS, and (single layout) the dataset fingerprint
+PARAMS_FILE = "_params.json"
+FINGERPRINT_FILE = "_faker_hash.txt"
+# per-shard artifacts (one <shard>.parquet each); append when sync_dataset writes a new one
+SHARD_PARTS = [CUBE_DIR, MOMENTS_DIR, SKETCH_DIR, CATEGORY_DIR, BASKET_DIR, STORE_DIR]
+
+def _digest(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def domain_config() -> dict:
+    # everything in the generator's domain config except the monthly temperature table
+    return {
+        "engine": ENGINE_VERSION,
+        "categories": faker_mod.categories,
+        "sizes": faker_mod.sizes,
+        "channels": faker_mod.channels,
+        "dayparts": faker_mod.dayparts,
+        "markets": faker_mod.markets,
+        "store_formats": faker_mod.store_formats,
+        "regions": faker_mod.regions,
+        "devices": faker_mod.devices,
+        "payment_methods": faker_mod.payment_methods,
+        "weather_conditions": faker_mod.weather_conditions,
+        "promo_codes": faker_mod.promo_codes,
+    }
+
+def _month_temps(months) -> dict:
+    return {m: {r: faker_mod.Region_Base_Temp[r][m] for r in faker_mod.regions} for m in sorted(months)}
+
+def dataset_fingerprint(**params) -> str:
+    # identifies the full dataset for a parameter set; unlike hashing the
+    # generator's source, formatting or comment edits don't change it
+    p = {**DEFAULT_PARAMS, **params}
+    return _digest({"params": p, "domain": domain_config(), "temps": _month_temps(range(1, 13)),
+                    "shard": [SHARD_DAYS, SHARD_STORES]})
+
+def shard_name(shard) -> str:
+    return f"shard-d{shard[0]:04d}-s{shard[1]:04d}"
+
+def shard_key(shard, start, days, stores, avg_orders, seed, domain_digest=None) -> str:
+    db, sb = shard
+    lo, hi = db * SHARD_DAYS, min((db + 1) * SHARD_DAYS, days)
+    dates = pd.Timestamp(start) + pd.to_timedelta(range(lo, hi), unit="D")
+    return _digest({
+        "seed": seed,
+        "start": str(pd.Timestamp(start)),
+        "rate": avg_orders / stores,
+        "days": [lo, hi],
+        "stores": [sb * SHARD_STORES, min((sb + 1) * SHARD_STORES, stores)],
+        "domain": domain_digest or _digest(domain_config()),
+        "temps": _month_temps(set(dates.month)),
+        "parts": sorted(SHARD_PARTS),
+    })
+
+def save_params(data_dir: str, params: dict):
+    tmp = os.path.join(data_dir, PARAMS_FILE + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump({**DEFAULT_PARAMS, **params}, fh, indent=2)
+    os.replace(tmp, os.path.join(data_dir, PARAMS_FILE))
+
+def load_params(data_dir: str = "data") -> dict:
+    # generator parameters for data_dir: a batch job's, else the defaults
+    try:
+        with open(os.path.join(data_dir, PARAMS_FILE)) as fh:
+            return {**DEFAULT_PARAMS, **json.load(fh)}
+    except (OSError, ValueError):
+        return dict(DEFAULT_PARAMS)
+
+def load_manifest(data_dir: str = "data") -> dict:
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"shards": {}}
+    with open(path) as fh:
+        return json.load(fh)
+
+def _write_manifest(data_dir: str, manifest: dict):
+    tmp = os.path.join(data_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, os.path.join(data_dir, MANIFEST_FILE))
+
+def _drop_shard_files(data_dir: str, name: str):
+    for sub in PARTITION_DIRS.values():
+        for path in glob.glob(os.path.join(data_dir, sub, "*", "*", f"{name}.parquet")):
+            os.remove(path)
+    for sub in SHARD_PARTS:
+        part = os.path.join(data_dir, sub, f"{name}.parquet")
+        if os.path.exists(part):
+            os.remove(part)
+
+def plan_sync(data_dir="data", **params):
+    # -> (expected {name: (shard, key)}, names to (re)generate, names to drop)
+    p = {**DEFAULT_PARAMS, **params}
+    domain_digest = _digest(domain_config())
+    expected = {}
+    for shard in plan_shards(p["days"], p["stores"], SHARD_DAYS, SHARD_STORES):
+        expected[shard_name(shard)] = (shard, shard_key(shard, p["start"], p["days"], p["stores"],
+                                                        p["avg_orders"], p["seed"], domain_digest))
+    have = load_manifest(data_dir)["shards"]
+    # recorded but with a part file gone (deleted, or an interrupted write): regenerate it
+    incomplete = {n for n in have if not all(os.path.exists(os.path.join(data_dir, sub, f"{n}.parquet"))
+                                             for sub in SHARD_PARTS)}
+    missing = [n for n, (_, key) in expected.items() if have.get(n) != key or n in incomplete]
+    stale = [n for n in have if n not in expected or have[n] != expected[n][1] or n in incomplete]
+    return expected, missing, stale
+
+def sync_dataset(data_dir="data", workers=1, compression=DEFAULT_COMPRESSION, progress=None, **params):
+    # brings a partitioned data directory in line with params; returns the dataset version
+    p = {**DEFAULT_PARAMS, **params}
+    os.makedirs(data_dir, exist_ok=True)
+    expected, missing, stale = plan_sync(data_dir, **p)
+    manifest = load_manifest(data_dir)
+    if not manifest["shards"]:
+        # fresh or pre-manifest directory: nothing on disk can be attributed to a shard
+        for sub in list(PARTITION_DIRS.values()) + SHARD_PARTS:
+            shutil.rmtree(os.path.join(data_dir, sub), ignore_errors=True)
+    # single-file cube / moments from a full write would double count alongside shard parts
+    for fname in (CUBE_FILE, CATEGORY_FILE, STORE_FILE, MOMENTS_FILE, SKETCH_FILE, BASKET_FILE):
+        if os.path.exists(os.path.join(data_dir, fname)):
+            os.remove(os.path.join(data_dir, fname))
+
+    for name in stale:
+        _drop_shard_files(data_dir, name)
+        manifest["shards"].pop(name, None)
+
+    stores_df = generate_stores(p["stores"], seed=p["seed"], shard_stores=SHARD_STORES)
+    save_table(stores_df, table_path(data_dir, "stores", "parquet"), "parquet", compression)
+
+    shards = [expected[n][0] for n in missing]
+    for sub in SHARD_PARTS:
+        os.makedirs(os.path.join(data_dir, sub), exist_ok=True)
+    for done, (shard, orders, items) in enumerate(
+            iter_shards(stores_df, shards, workers=workers, start=p["start"], days=p["days"],
+                        avg_orders=p["avg_orders"], seed=p["seed"],
+                        shard_days=SHARD_DAYS, shard_stores=SHARD_STORES), start=1):
+        name = shard_name(shard)
+        _drop_shard_files(data_dir, name)
+        orders = add_derived_features(orders, items)
+        save_partitioned(None, orders, items, data_dir=data_dir, compression=compression, part=name,
+                         replace=False, write_meta=False)
+        build_cube(orders).to_parquet(os.path.join(data_dir, CUBE_DIR, f"{name}.parquet"), index=False)
+        build_category_cube(orders, items).to_parquet(os.path.join(data_dir, CATEGORY_DIR, f"{name}.parquet"),
+                                                      index=False)
+        build_store_cube(orders).to_parquet(os.path.join(data_dir, STORE_DIR, f"{name}.parquet"), index=False)
+        build_moments(orders).to_parquet(os.path.join(data_dir, MOMENTS_DIR, f"{name}.parquet"), index=False)
+        build_sketch(orders).to_parquet(os.path.join(data_dir, SKETCH_DIR, f"{name}.parquet"), index=False)
+        save_basket_table(build_basket_table(items), data_dir, os.path.join(data_dir, BASKET_DIR, f"{name}.parquet"))
+        # record each shard as soon as it is on disk so an interrupted sync resumes
+        manifest["shards"][name] = expected[name][1]
+        manifest["params"] = p
+        _write_manifest(data_dir, manifest)
+        if progress:
+            progress(done, len(shards), len(orders))
+
+    manifest["params"] = p
+    manifest["version"] = _digest(sorted(manifest["shards"].items()))
+    _write_manifest(data_dir, manifest)
+    if missing or stale or not os.path.exists(os.path.join(data_dir, PARTITION_META)):
+        refresh_partition_meta(data_dir)
+    return manifest["version"]
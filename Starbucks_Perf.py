@@ -0,0 +1,259 @@
+# Starbucks_Perf.py
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# -----------------------------
+# Spans
+# -----------------------------
+# A trace is the list of spans recorded during one app rerun (or any block
+# wrapped in start_trace). A span has a duration, optional rows in / out and
+# the RSS change over its lifetime; spans nest, so a chart span contains its
+# aggregation and rendering spans. With no active trace, span() and @traced
+# cost one context-variable lookup. Finished traces also feed process-wide
+# totals that export as Prometheus text.
+
+def current_rss() -> int:
+    # bytes; /proc is exact on Linux, elsewhere fall back to the process high-water mark
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def _rows(obj):
+    # rows of a frame / array / sequence, None for anything else
+    if obj is None or isinstance(obj, (str, bytes, dict)):
+        return None
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    return len(obj) if isinstance(obj, (list, tuple)) else None
+
+class Span:
+    __slots__ = ("name", "depth", "start", "seconds", "rows_in", "rows_out", "rss_delta", "_rss0")
+
+    def __init__(self, name, depth, rows_in=None):
+        self.name, self.depth, self.rows_in = name, depth, rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+        self.rss_delta = 0
+        self._rss0 = current_rss()
+        self.start = time.perf_counter()
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+        self.rss_delta = current_rss() - self._rss0
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "depth": self.depth, "seconds": self.seconds,
+                "rows_in": self.rows_in, "rows_out": self.rows_out, "rss_delta_mb": self.rss_delta / 2**20}
+
+class Trace:
+    def __init__(self, name="trace"):
+        self.name = name
+        self.spans = []  # in start order
+        self._depth = 0
+
+    def to_list(self) -> list:
+        return [s.to_dict() for s in self.spans]
+
+    def to_json(self) -> str:
+        return json.dumps({"trace": self.name, "spans": self.to_list()}, indent=2)
+
+_current = contextvars.ContextVar("brewed_trace", default=None)
+
+@contextmanager
+def span(name: str, rows_in=None):
+    # with span("filter", rows_in=len(orders)) as s: ...; s.rows_out = len(f)
+    trace = _current.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+    s = Span(name, trace._depth, rows_in)
+    trace.spans.append(s)
+    trace._depth += 1
+    try:
+        yield s
+    finally:
+        trace._depth -= 1
+        s.finish()
+
+def traced(name: str = None, rows_out=None):
+    # decorator: a span named after the function; rows in = first positional arg,
+    # rows out = the result (its first element for tuples) unless rows_out(result) says otherwise
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(label, rows_in=_rows(args[0]) if args else None) as s:
+                out = fn(*args, **kwargs)
+                s.rows_out = rows_out(out) if rows_out else _rows(out[0] if isinstance(out, tuple) and out else out)
+                return out
+        return inner
+    return wrap
+
+class _NullSpan:
+    # what span() yields with no active trace; attribute writes are dropped
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def begin_trace(name: str = "rerun") -> Trace:
+    # for code that can't wrap itself in a with-block (a Streamlit script);
+    # a trace that is never ended is simply replaced by the next one
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+def end_trace(trace: Trace):
+    if _current.get() is trace:
+        _current.set(None)
+    REGISTRY.observe(trace)
+
+@contextmanager
+def start_trace(name: str = "rerun"):
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        REGISTRY.observe(trace)
+
+def current_trace():
+    return _current.get()
+
+# -----------------------------
+# Startup report
+# -----------------------------
+# Phases of the first script run in a process (a cold start: container
+# restart, new replica), as seconds since the script began executing. Later
+# reruns hit warm imports and caches and leave it alone.
+
+def process_uptime():
+    # seconds since this process started; None where /proc isn't available
+    try:
+        with open("/proc/self/stat") as fh:
+            start_ticks = int(fh.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as fh:
+            boot_seconds = float(fh.read().split()[0])
+        return boot_seconds - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupReport:
+    def __init__(self):
+        self.phases = {}     # phase -> seconds since the script started, in order
+        self.before = None   # process age when the first run started (server boot + first request)
+        self.finished = False
+        self._t0 = None
+
+    def begin(self, t0: float):
+        # t0: time.perf_counter() taken at the very top of the script
+        if self._t0 is None:
+            self._t0 = t0
+            up = process_uptime()
+            self.before = up - (time.perf_counter() - t0) if up is not None else None
+
+    def mark(self, phase: str):
+        if not self.finished and self._t0 is not None:
+            self.phases[phase] = time.perf_counter() - self._t0
+
+    def finish(self):
+        if not self.finished and self._t0 is not None:
+            self.finished = True
+            print(f"[startup] {self.summary()}", file=sys.stderr, flush=True)
+
+    def summary(self) -> str:
+        parts = [f"{phase} {t:.2f}s" for phase, t in self.phases.items()]
+        if self.before is not None:
+            parts.insert(0, f"process up {self.before:.2f}s before first run")
+        return ", ".join(parts)
+
+STARTUP = StartupReport()
+
+# -----------------------------
+# Process totals + export
+# -----------------------------
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}  # span name -> {"calls", "seconds", "rows_out"}
+        self.last = {}    # span name -> last span dict
+        self.traces = 0
+
+    def observe(self, trace: Trace):
+        with self._lock:
+            self.traces += 1
+            for s in trace.spans:
+                t = self.totals.setdefault(s.name, {"calls": 0, "seconds": 0.0, "rows_out": 0})
+                t["calls"] += 1
+                t["seconds"] += s.seconds
+                t["rows_out"] += s.rows_out or 0
+                self.last[s.name] = s.to_dict()
+
+REGISTRY = Registry()
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def to_prometheus(trace: Trace = None, registry: Registry = REGISTRY) -> str:
+    # text exposition format: per-stage totals since process start, plus the given trace's spans
+    lines = [
+        "# HELP brewed_stage_seconds_total Time spent in each dashboard stage since process start.",
+        "# TYPE brewed_stage_seconds_total counter",
+    ]
+    with registry._lock:
+        totals = {k: dict(v) for k, v in registry.totals.items()}
+        traces = registry.traces
+    for name, t in sorted(totals.items()):
+        lines.append(f'brewed_stage_seconds_total{{stage="{_label(name)}"}} {t["seconds"]:.6f}')
+    lines += ["# HELP brewed_stage_calls_total Times each dashboard stage ran since process start.",
+              "# TYPE brewed_stage_calls_total counter"]
+    for name, t in sorted(totals.items()):
+        lines.append(f'brewed_stage_calls_total{{stage="{_label(name)}"}} {t["calls"]}')
+    lines += ["# HELP brewed_traces_total Traced reruns since process start.",
+              "# TYPE brewed_traces_total counter",
+              f"brewed_traces_total {traces}"]
+    if STARTUP.finished:
+        lines += ["# HELP brewed_startup_seconds Seconds from script start to each phase of the first run.",
+                  "# TYPE brewed_startup_seconds gauge"]
+        lines += [f'brewed_startup_seconds{{phase="{_label(p)}"}} {t:.6f}' for p, t in STARTUP.phases.items()]
+    if trace is not None:
+        # a stage can run more than once per rerun; one series per stage, summed
+        per_stage = {}
+        for s in trace.spans:
+            agg = per_stage.setdefault(s.name, {"seconds": 0.0, "rows_out": None, "rss_delta": 0})
+            agg["seconds"] += s.seconds
+            agg["rss_delta"] += s.rss_delta
+            if s.rows_out is not None:
+                agg["rows_out"] = (agg["rows_out"] or 0) + s.rows_out
+        gauges = [("brewed_span_seconds", "seconds", "Duration of each stage in the last rerun."),
+                  ("brewed_span_rows_out", "rows_out", "Rows produced by each stage in the last rerun."),
+                  ("brewed_span_rss_delta_bytes", "rss_delta", "RSS change over each stage in the last rerun.")]
+        for metric, key, help_text in gauges:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for name, agg in per_stage.items():
+                if agg[key] is not None:
+                    lines.append(f'{metric}{{stage="{_label(name)}"}} {agg[key]}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str, trace: Trace = None):
+    # node_exporter textfile-collector style: write a temp file, then rename over
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(to_prometheus(trace))
+    os.replace(tmp, path)
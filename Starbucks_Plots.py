@@ -1,89 +1,331 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.io as pio
 import plotly.graph_objects as go
 
+from Starbucks_Stats import CORR_COLUMNS, merge_moments, streaming_corr, sampled_corr
+from Starbucks_Rollup import build_category_cube, CATEGORY_MEASURES
+from Starbucks_Perf import traced
+
 COFFEE = ["#006241", "#7A5228", "#B6895B", "#CBB58A", "#3C2F2F"]
-pio.templates["coffee"] = pio.templates["plotly_white"]
-pio.templates["coffee"].layout.colorway = COFFEE
-pio.templates.default = "coffee"
 
-def monthly_trends(orders: pd.DataFrame):
+def _px():
+    # plotly.express and the base template's JSON cost a few hundred ms at import;
+    # both load on the first figure instead, so frame-only imports (and cold starts) skip them
+    import plotly.express as px
+    if "coffee" not in pio.templates:
+        coffee = go.layout.Template(pio.templates["plotly_white"])
+        coffee.layout.colorway = COFFEE
+        pio.templates["coffee"] = coffee
+        pio.templates.default = "coffee"
+    return px
+
+# -----------------------------
+# Adaptive time resolution
+# -----------------------------
+# Time-series charts pick their bucket size from the span being shown: the
+# coarsest of monthly/weekly/daily/hourly that still gives MIN_POINTS points,
+# so a full year stays monthly and narrowing the date filter drills down.
+# Whatever the resolution, a trace never carries more than POINT_BUDGET
+# points (LTTB or min/max downsampling server-side), and traces above
+# WEBGL_THRESHOLD points render with Scattergl.
+
+RESOLUTIONS = {  # freq -> (label, nominal bucket width); coarse to fine
+    "MS": ("Monthly", pd.Timedelta(days=30.44)),
+    "W-MON": ("Weekly", pd.Timedelta(days=7)),
+    "D": ("Daily", pd.Timedelta(days=1)),
+    "h": ("Hourly", pd.Timedelta(hours=1)),
+}
+MIN_POINTS = 10
+POINT_BUDGET = 1500
+WEBGL_THRESHOLD = 1000
+
+def choose_freq(start, end, min_points=MIN_POINTS, budget=POINT_BUDGET, finest="h"):
+    # start/end are inclusive calendar days
+    span = pd.Timestamp(end).normalize() - pd.Timestamp(start).normalize() + pd.Timedelta(days=1)
+    freqs = list(RESOLUTIONS)[: list(RESOLUTIONS).index(finest) + 1]
+    for freq in freqs:
+        n = span / RESOLUTIONS[freq][1]
+        if n >= min_points:
+            return freq if n <= budget or freq == freqs[0] else freqs[freqs.index(freq) - 1]
+    return freqs[-1]
+
+def resample_time(df: pd.DataFrame, time_col: str, freq: str):
+    # resampler with weeks starting (and labelled) on Monday
+    if freq.startswith("W"):
+        return df.set_index(time_col).resample(freq, label="left", closed="left")
+    return df.set_index(time_col).resample(freq)
+
+def _as_float(x) -> np.ndarray:
+    x = np.asarray(x)
+    return x.astype("datetime64[ns]").astype(np.int64).astype(float) if np.issubdtype(x.dtype, np.datetime64) else x.astype(float)
+
+def lttb(x, y, n: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices of n points that keep the visual shape
+    N = len(y)
+    if n >= N or n < 3:
+        return np.arange(N)
+    x, y = _as_float(x), _as_float(y)
+    edges = np.linspace(1, N - 1, n - 1).astype(np.int64)  # n - 2 inner buckets
+    idx = np.empty(n, dtype=np.int64)
+    idx[0], idx[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (N - 1, N)
+        ax, ay = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - ax) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ay - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def minmax_downsample(y, n: int) -> np.ndarray:
+    # indices of the min and max of each of n // 2 buckets; keeps spikes LTTB can smooth over
+    N = len(y)
+    if n >= N or n < 2:
+        return np.arange(N)
+    y = _as_float(y)
+    edges = np.linspace(0, N, n // 2 + 1).astype(np.int64)
+    lo, hi = edges[:-1], edges[1:]
+    mins = np.array([a + np.argmin(y[a:b]) for a, b in zip(lo, hi)])
+    maxs = np.array([a + np.argmax(y[a:b]) for a, b in zip(lo, hi)])
+    return np.unique(np.concatenate([mins, maxs]))
+
+def downsample(x, y, n: int = POINT_BUDGET, method: str = "lttb"):
+    if len(y) <= n:
+        return np.asarray(x), np.asarray(y)
+    idx = lttb(x, y, n) if method == "lttb" else minmax_downsample(y, n)
+    return np.asarray(x)[idx], np.asarray(y)[idx]
+
+def time_trace(x, y, name, budget=POINT_BUDGET, method="lttb", **kwargs):
+    x, y = downsample(x, y, budget, method)
+    trace = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, name=name, **kwargs)
+
+def resolve_freq(orders: pd.DataFrame, cube: pd.DataFrame = None, freq="auto"):
+    # -> (freq, use_cube). The cube is daily, so hourly buckets need order rows.
+    has_orders = orders is not None and len(orders) > 0 and "Order Timestamp" in orders.columns
+    if freq == "auto":
+        if has_orders:
+            start, end = orders["Order Timestamp"].min(), orders["Order Timestamp"].max()
+        elif cube is not None and len(cube):
+            start, end = cube["Date"].min(), cube["Date"].max()
+        else:
+            return "MS", cube is not None
+        freq = choose_freq(start, end, finest="h" if has_orders else "D")
+    return freq, cube is not None and not (freq == "h" and has_orders)
+
+# Each chart is split into an aggregation (*_frame, pandas over orders or the
+# cube) and a renderer (*_figure) so another query backend (Starbucks_Query)
+# can produce the same small frames and reuse the figure code.
+
+@traced()
+def trend_frame(orders: pd.DataFrame, cube: pd.DataFrame = None, freq="auto"):
+    # -> (frame with Order Timestamp / Total / Orders per bucket, freq)
+    ts = "Order Timestamp"
+    freq, use_cube = resolve_freq(orders, cube, freq)
+    if use_cube:
+        m = (resample_time(cube, "Date", freq)
+             .agg(Total=("Total Amount","sum"), Orders=("Orders","sum"))
+             .rename_axis(ts).reset_index())
+    else:
+        m = (resample_time(orders, ts, freq)
+             .agg(Total=("Total Amount","sum"), Orders=("Order ID","nunique"))
+             .reset_index())
+    return m, freq
+
+@traced()
+def monthly_trends(orders: pd.DataFrame, cube: pd.DataFrame = None, freq="auto", budget=POINT_BUDGET):
+    m, freq = trend_frame(orders, cube, freq)
+    return trend_figure(m, freq, budget)
+
+@traced()
+def trend_figure(m: pd.DataFrame, freq: str, budget=POINT_BUDGET):
     ts = "Order Timestamp"
-    m = (orders
-         .set_index(ts).resample("MS")
-         .agg(Total=("Total Amount","sum"), Orders=("Order ID","nunique"))
-         .reset_index())
+    mode = "lines+markers" if len(m) <= 200 else "lines"
+    _px()  # coffee template
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=m[ts], y=m["Total"], name="Revenue", mode="lines+markers"))
-    fig.add_trace(go.Scatter(x=m[ts], y=m["Orders"], name="Orders", mode="lines+markers", yaxis="y2"))
+    fig.add_trace(time_trace(m[ts], m["Total"], "Revenue", budget, mode=mode))
+    fig.add_trace(time_trace(m[ts], m["Orders"], "Orders", budget, mode=mode, yaxis="y2"))
     fig.update_layout(
-        title="Monthly Trends: Revenue & Orders",
+        title=f"{RESOLUTIONS.get(freq, (freq,))[0]} Trends: Revenue & Orders",
         yaxis=dict(title="Revenue"),
         yaxis2=dict(title="Orders", overlaying="y", side="right"),
         margin=dict(l=10,r=10,t=50,b=10)
     )
     return fig
 
+@traced()
+def forecast_figure(fc: pd.DataFrame, level: float = 0.8):
+    # fc: StoreForecast.frame(); recent daily actuals, then the forecast inside its band
+    if fc is None or fc.empty:
+        return None
+    _px()  # coffee template
+    ahead = fc[fc["Forecast"].notna()]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=fc["Date"], y=fc["Revenue"], name="Revenue", mode="lines"))
+    fig.add_trace(go.Scatter(x=ahead["Date"], y=ahead["Upper"], mode="lines", line=dict(width=0),
+                             showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=ahead["Date"], y=ahead["Lower"], mode="lines", line=dict(width=0),
+                             fill="tonexty", fillcolor="rgba(182,137,91,0.3)", name=f"{level:.0%} band"))
+    fig.add_trace(go.Scatter(x=ahead["Date"], y=ahead["Forecast"], name="Forecast", mode="lines",
+                             line=dict(dash="dash", color=COFFEE[1])))
+    fig.update_layout(title=f"Next {len(ahead)} Days: Daily Revenue Forecast", yaxis=dict(title="Revenue"),
+                      margin=dict(l=10,r=10,t=50,b=10))
+    return fig
+
+@traced()
+def store_leaderboard_figure(top: pd.DataFrame, by: str = "Revenue", largest: bool = True):
+    # top: Starbucks_Stores.top_stores(); rank 1 on top
+    if top is None or top.empty:
+        return None
+    df = top.assign(Store=top["Rank"].astype(str) + ". " + top["Market"].astype(str) + " · "
+                    + top["Store ID"].astype(str).str[:8]).iloc[::-1]
+    px = _px()
+    fig = px.bar(df, x=by, y="Store", orientation="h", color="Region",
+                 hover_data={"Store ID": True, "Format": True, "Revenue": ":$,.0f", "Orders": ":,",
+                             "Margin %": ":.1f", "AOV": ":$.2f", "Avg Wait Time (mins)": ":.1f"},
+                 title=f"{'Highest' if largest else 'Lowest'} {len(df)} Stores by {by}", labels={"Store": ""})
+    fig.update_layout(margin=dict(l=10,r=10,t=50,b=10), height=max(320, 28 * len(df) + 100),
+                      yaxis=dict(categoryorder="array", categoryarray=df["Store"].tolist()))
+    return fig
+
+@traced()
+def category_profit_frame(orders: pd.DataFrame, items: pd.DataFrame, cat_cube: pd.DataFrame = None):
+    # -> Category x Subcategory revenue / allocated profit / margin, from a category cube slice
+    # (Starbucks_Rollup) or built from the filtered frames; None when items lack the columns
+    if cat_cube is None:
+        if items is None or not {"Order ID","Category","Subcategory","Price","Quantity"}.issubset(items.columns):
+            return None
+        cat_cube = build_category_cube(orders, items)
+    cat = (cat_cube.groupby(["Category","Subcategory"], observed=True, sort=True)[CATEGORY_MEASURES]
+                   .sum().reset_index())
+    revenue = cat["Revenue"].to_numpy()
+    cat["Margin %"] = np.divide(cat["Profit"].to_numpy() * 100, revenue, out=np.zeros(len(cat)), where=revenue != 0)
+    return cat
+
+@traced()
 def category_profitability(orders: pd.DataFrame, items: pd.DataFrame):
-    if not {"Order ID","Category","Price","Quantity"}.issubset(items.columns):
+    return category_profitability_figure(category_profit_frame(orders, items))
+
+@traced()
+def category_profitability_figure(cat: pd.DataFrame):
+    if cat is None or cat.empty:
         return None
-    it = items.copy()
-    it["Line Revenue"] = it["Price"] * it["Quantity"]
-    cat = (it.groupby("Category", as_index=False)
-             .agg(Revenue=("Line Revenue","sum")))
-    # join order Profit at order level then re-aggregate by Category via share
-    # simpler: approximate profit by allocating proportionally to item revenue per order
-    per_order_rev = it.groupby("Order ID", as_index=False)["Line Revenue"].sum().rename(columns={"Line Revenue":"OrderRevenue"})
-    it = it.merge(per_order_rev, on="Order ID", how="left")
-    orders_profit = orders[["Order ID","Profit"]]
-    it = it.merge(orders_profit, on="Order ID", how="left")
-    it["AllocProfit"] = it["Profit"] * (it["Line Revenue"] / it["OrderRevenue"]).fillna(0)
-    cat_profit = it.groupby("Category", as_index=False).agg(Revenue=("Line Revenue","sum"), Profit=("AllocProfit","sum"))
-
-    fig = px.bar(cat_profit.melt(id_vars="Category", value_vars=["Revenue","Profit"]),
+    per_cat = cat.groupby("Category", observed=True, sort=True)[["Revenue","Profit"]].sum().reset_index()
+    px = _px()
+    fig = px.bar(per_cat.melt(id_vars="Category", value_vars=["Revenue","Profit"]),
                  x="Category", y="value", color="variable",
                  barmode="group", title="Category Profitability: Revenue vs Profit",
                  labels={"value":"","variable":""})
     fig.update_layout(margin=dict(l=10,r=10,t=50,b=10))
     return fig
 
-def channel_share_over_time(orders: pd.DataFrame, freq="MS"):
-    if "Channel" not in orders.columns:
+@traced()
+def basket_pairs_figure(top: pd.DataFrame, by: str = "Lift", level: str = "Subcategory"):
+    # top: Basket.top_pairs(); best pair on top
+    if top is None or top.empty:
         return None
+    df = top.assign(Pair=top["Item A"].astype(str) + " + " + top["Item B"].astype(str)).iloc[::-1]
+    px = _px()
+    fig = px.bar(df, x=by, y="Pair", orientation="h",
+                 hover_data={"Orders": True, "Support %": ":.2f", "A → B %": ":.1f", "B → A %": ":.1f", "Lift": ":.2f"},
+                 title=f"Bought Together: top {level} pairs by {by}", labels={"Pair": ""})
+    if by == "Lift":
+        fig.add_vline(x=1, line_dash="dot", line_color="#7A5228")  # independence
+    fig.update_layout(margin=dict(l=10,r=10,t=50,b=10), height=max(320, 28 * len(df) + 100))
+    return fig
+
+@traced()
+def channel_share_frame(orders: pd.DataFrame, freq="auto", cube: pd.DataFrame = None):
+    # -> (frame with Order Timestamp / Channel / Revenue, freq), or (None, freq)
+    freq, use_cube = resolve_freq(orders, cube, freq)
+    src = cube if use_cube else orders
+    if "Channel" not in src.columns:
+        return None, freq
     ts = "Order Timestamp"
-    grp = (orders
-           .set_index(ts)
-           .groupby([pd.Grouper(freq=freq), "Channel"])
+    # bucket count is bounded by choose_freq, so the stacked areas stay small
+    weekly = dict(label="left", closed="left") if freq.startswith("W") else {}
+    grp = (src
+           .set_index("Date" if use_cube else ts).rename_axis(ts)
+           .groupby([pd.Grouper(freq=freq, **weekly), "Channel"], observed=True)
            .agg(Revenue=("Total Amount","sum"))
            .reset_index())
+    return grp, freq
+
+@traced()
+def channel_share_over_time(orders: pd.DataFrame, freq="auto", cube: pd.DataFrame = None):
+    grp, freq = channel_share_frame(orders, freq, cube)
+    return channel_share_figure(grp, freq)
+
+@traced()
+def channel_share_figure(grp: pd.DataFrame, freq: str):
+    if grp is None:
+        return None
+    ts = "Order Timestamp"
+    grp = grp.copy()
     total = grp.groupby(ts)["Revenue"].transform("sum")
     grp["Share"] = grp["Revenue"] / total * 100
+    px = _px()
     fig = px.area(grp, x=ts, y="Share", color="Channel",
-                  title="Channel Mix Over Time (100% share)", groupnorm="fraction")
+                  title=f"Channel Mix Over Time (100% share, {RESOLUTIONS.get(freq, (freq,))[0].lower()})", groupnorm="fraction")
     fig.update_layout(yaxis_ticksuffix="%", margin=dict(l=10,r=10,t=50,b=10))
     return fig
 
-def daypart_week_heatmap(orders: pd.DataFrame):
-    if "Daypart" not in orders.columns:
-        return None
-    df = orders.copy()
-    df["Weekday"] = df["Order Timestamp"].dt.day_name()
+def daypart_week_pivot(daypart, weekday_codes, amount) -> pd.DataFrame:
     order = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
-    df["Weekday"] = pd.Categorical(df["Weekday"], categories=order, ordered=True)
-    pivot = df.pivot_table(index="Daypart", columns="Weekday", values="Total Amount", aggfunc="sum", fill_value=0)
+    df = pd.DataFrame({
+        "Daypart": daypart,
+        "Total Amount": amount,
+        "Weekday": pd.Categorical.from_codes(weekday_codes, categories=order, ordered=True),
+    })
+    return df.pivot_table(index="Daypart", columns="Weekday", values="Total Amount", aggfunc="sum", fill_value=0)
+
+@traced()
+def daypart_week_frame(orders: pd.DataFrame, cube: pd.DataFrame = None):
+    src = cube if cube is not None else orders
+    if "Daypart" not in src.columns:
+        return None
+    # Weekday is a 0-6 code on the cube and on orders with derived features
+    codes = src["Weekday"] if "Weekday" in src.columns else src["Order Timestamp"].dt.weekday
+    return daypart_week_pivot(src["Daypart"], codes, src["Total Amount"])
+
+@traced()
+def daypart_week_heatmap(orders: pd.DataFrame, cube: pd.DataFrame = None):
+    return daypart_week_figure(daypart_week_frame(orders, cube))
+
+@traced()
+def daypart_week_figure(pivot: pd.DataFrame):
+    if pivot is None:
+        return None
+    px = _px()
     fig = px.imshow(pivot, text_auto=True, aspect="auto",
                     title="Heatmap: Revenue by Daypart × Weekday",
                     labels=dict(color="Revenue"))
     fig.update_layout(margin=dict(l=10,r=10,t=50,b=10))
     return fig
 
-def correlation_heatmap(orders):
-    # select numerical columns of interest
-    num_cols = ["Total Amount","Profit","Temperature (C)","Num Items","Discount Amount","Tip Amount"]
-    df = orders[num_cols].copy()
-    corr = df.corr().round(2)
-    fig = px.imshow(corr, text_auto=True, aspect="auto",
+@traced()
+def correlation_frame(orders, moments: pd.DataFrame = None, sample_rows: int = None):
+    # -> (corr, title note). moments: per-cell partials for the current filter
+    # (Starbucks_Stats) -> no row scan; otherwise one chunked pass over orders,
+    # or a row sample when sample_rows is set
+    if moments is not None:
+        return merge_moments(moments, CORR_COLUMNS).corr(), ""
+    if sample_rows and len(orders) > sample_rows:
+        corr, half = sampled_corr(orders, sample_rows, CORR_COLUMNS)
+        return corr, f" (sample of {sample_rows:,} orders, ±{half:.2f} at 95%)"
+    return streaming_corr(orders, CORR_COLUMNS), ""
+
+@traced()
+def correlation_heatmap(orders, moments: pd.DataFrame = None, sample_rows: int = None):
+    return correlation_figure(*correlation_frame(orders, moments, sample_rows))
+
+@traced()
+def correlation_figure(corr: pd.DataFrame, note: str = ""):
+    title = "Correlation Matrix of Key Metrics" + note
+    px = _px()
+    fig = px.imshow(corr.round(2), text_auto=True, aspect="auto",
                     color_continuous_scale="BrBG",
-                    title="Correlation Matrix of Key Metrics")
+                    title=title)
     return fig
@@ -0,0 +1,358 @@
+# Starbucks_Query.py
+import os
+import threading
+import importlib.util
+import numpy as np
+import pandas as pd
+
+from Starbucks_Storage import detect_format, table_path, PARTITION_DIRS
+from Starbucks_Rollup import cube_kpis
+from Starbucks_Plots import (trend_frame, channel_share_frame, daypart_week_frame, daypart_week_pivot,
+                             correlation_frame, category_profit_frame, choose_freq)
+from Starbucks_Stats import CORR_COLUMNS, corr_halfwidth
+from Starbucks_Sketch import sketch_count, sketch_counts_at, slice_sketch, DISTINCT_MODE
+from Starbucks_Basket import Basket, basket_ids
+from Starbucks_Cache import approx_bytes
+
+# -----------------------------
+# Query backends
+# -----------------------------
+# The app asks a backend for a Selection (date range + region/channel
+# filters) and reads everything it shows from it: the filtered frames, the
+# KPI dict and the small aggregate frames the Starbucks_Plots *_figure
+# renderers take. Two backends serve the same API:
+#
+#   pandas  in-memory frames via the FilterIndex / partition reader, the
+#           rollup cube and the covariance moments (the default)
+#   duckdb  SQL straight over the files in data/ (single or partitioned
+#           layout), multi-threaded and out-of-core; nothing is loaded up front
+#
+# Order counts are exact by default. With BREWED_DISTINCT_COUNTS=sketch they
+# come from HyperLogLog sketches instead (Starbucks_Sketch; approx_count_distinct
+# in DuckDB), which merge across any slice without touching raw rows. The
+# pandas sketches are per month, so a date range that cuts through a month
+# keeps exact counts.
+
+ENGINES = ["pandas", "duckdb"]
+
+def has_duckdb() -> bool:
+    # checked without importing: duckdb loads only when a DuckDBBackend is built
+    return importlib.util.find_spec("duckdb") is not None
+
+DEFAULT_ENGINE = os.getenv("BREWED_QUERY_ENGINE", "pandas")
+if DEFAULT_ENGINE == "duckdb" and not has_duckdb():
+    DEFAULT_ENGINE = "pandas"
+
+def iced_share(iced_items, lines, mask):
+    # share of line items that are iced, over the orders in mask
+    n = lines[mask].sum()
+    return iced_items[mask].sum() / n if n else float("nan")
+
+# --- pandas ---
+
+class PandasSelection:
+    def __init__(self, f, fi, cube=None, moments=None, keys=None, sketch=None, cat_cube=None):
+        self.f, self.fi, self.cube, self.moments = f, fi, cube, moments
+        self.keys = keys  # surrogate key tables when f / fi use the compact schema
+        self.sketch = sketch  # sliced HLL table (slice_sketch): approximate distinct orders when set
+        self.cat_cube = cat_cube
+        self._basket_ids = None
+
+    def __sizeof__(self):
+        # what a ViewCache entry holding this selection keeps alive
+        return sum(approx_bytes(t) for t in (self.f, self.fi, self.cube, self.moments, self.sketch, self.cat_cube)
+                   if t is not None)
+
+    def orders(self) -> pd.DataFrame:
+        return self.f
+
+    def items(self) -> pd.DataFrame:
+        return self.fi
+
+    def preview(self, n: int = 100) -> pd.DataFrame:
+        return self.f.head(n)
+
+    def basket(self, level: str) -> Basket:
+        # the basket numbering is shared by every level counted over these items
+        if self._basket_ids is None:
+            self._basket_ids = basket_ids(self.fi)
+        return Basket.from_items(self.fi, level, self._basket_ids)
+
+    def kpis(self) -> dict:
+        f = self.f
+        if self.cube is not None:
+            k = cube_kpis(self.cube)
+        else:
+            revenue = float(f["Total Amount"].sum())
+            n_orders = int(f["Order ID"].nunique())
+            k = {"revenue": revenue, "orders": n_orders, "aov": revenue / max(n_orders, 1),
+                 "gross_margin_pct": (f["Profit"].sum() / revenue * 100) if revenue else 0.0}
+        if self.sketch is not None:
+            k["orders"] = int(round(sketch_count(self.sketch)))
+            k["aov"] = k["revenue"] / max(k["orders"], 1)
+        # "Iced Items" is a stored per-order feature; "Num Items" is the order's line count
+        iced_items = f["Iced Items"].to_numpy()
+        lines = f["Num Items"].to_numpy()
+        temp = f["Temperature (C)"].to_numpy()
+        k["weather_sensitivity"] = (iced_share(iced_items, lines, temp >= 26)
+                                    - iced_share(iced_items, lines, temp < 18)) * 100
+        return k
+
+    def trend(self, freq="auto"):
+        m, freq = trend_frame(self.f, self.cube, freq)
+        # the sketch is per month: finer buckets keep their exact counts
+        if self.sketch is not None and freq == "MS" and len(m):
+            m["Orders"] = np.round(sketch_counts_at(self.sketch, m["Order Timestamp"])).astype(np.int64)
+        return m, freq
+
+    def channel_share(self, freq="auto"):
+        return channel_share_frame(self.f, freq, self.cube)
+
+    def daypart_weekday(self):
+        return daypart_week_frame(self.f, self.cube)
+
+    def corr(self, sample_rows=None):
+        return correlation_frame(self.f, self.moments, sample_rows)
+
+    def category_profit(self):
+        return category_profit_frame(self.f, self.fi, self.cat_cube)
+
+class PandasBackend:
+    name = "pandas"
+
+    def __init__(self, select_fn, cube=None, moments=None, slice_fn=None, sketch=None, cat_cube=None):
+        # select_fn(start, end, regions, channels) -> (f, fi, keys); slice_fn slices the cubes / moments
+        self.select_fn, self.cube, self.moments, self.slice_fn = select_fn, cube, moments, slice_fn
+        self.sketch, self.cat_cube = sketch, cat_cube
+
+    def select(self, start=None, end=None, regions=None, channels=None) -> PandasSelection:
+        f, fi, keys = self.select_fn(start, end, regions, channels)
+        sl = lambda t: self.slice_fn(t, start, end, regions, channels) if t is not None else None
+        sk = slice_sketch(self.sketch, start, end, regions, channels) if self.sketch is not None else None
+        return PandasSelection(f, fi, sl(self.cube), sl(self.moments), keys, sk, sl(self.cat_cube))
+
+# --- duckdb ---
+
+_TRUNC = {"h": "hour", "D": "day", "W-MON": "week", "MS": "month"}
+
+def _q(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+class DuckDBSelection:
+    keys = None  # rows come straight from the files: always the standard schema
+
+    def __init__(self, backend, start=None, end=None, regions=None, channels=None):
+        self.backend = backend
+        self.start, self.end, self.regions = start, end, list(regions or [])
+        conds, params = [], []
+        if start is not None:
+            conds.append('"Order Timestamp" >= ?')
+            params.append(pd.Timestamp(start).to_pydatetime())
+        if end is not None:
+            conds.append('"Order Timestamp" < ?')
+            params.append((pd.Timestamp(end) + pd.Timedelta(days=1)).to_pydatetime())
+        # empty selections don't filter, same as the sidebar / FilterIndex
+        for col, values in (("Region", regions), ("Channel", channels)):
+            if values:
+                conds.append(f"{_q(col)} IN ({', '.join('?' * len(values))})")
+                params.extend(map(str, values))
+        self.where = " AND ".join(conds) or "TRUE"
+        self.params = params
+
+    def _df(self, sql: str, params=None) -> pd.DataFrame:
+        return self.backend.query(sql, self.params if params is None else params)
+
+    def orders(self) -> pd.DataFrame:
+        # every selected row; the app reads aggregates and preview() instead
+        return self._df(f'SELECT * FROM orders WHERE {self.where} ORDER BY "Order Timestamp"')
+
+    def preview(self, n: int = 100) -> pd.DataFrame:
+        return self._df(f'SELECT * FROM orders WHERE {self.where} ORDER BY "Order Timestamp" LIMIT {int(n)}')
+
+    def _item_filter(self):
+        # -> (conditions on items i, params including the order filter's)
+        conds, params = [], list(self.params)
+        if self.backend.partitioned:
+            # prune item partitions the same way the order filter prunes order partitions
+            if self.start is not None:
+                conds.append("i.Month >= ?")
+                params.append(pd.Timestamp(self.start).strftime("%Y-%m"))
+            if self.end is not None:
+                conds.append("i.Month <= ?")
+                params.append(pd.Timestamp(self.end).strftime("%Y-%m"))
+            if self.regions:
+                conds.append(f"i.Region IN ({', '.join('?' * len(self.regions))})")
+                params.extend(map(str, self.regions))
+        return " AND ".join(conds) or "TRUE", params
+
+    def items(self) -> pd.DataFrame:
+        item_where, params = self._item_filter()
+        cols = ", ".join(f"i.{_q(c)}" for c in self.backend.item_columns)
+        return self._df(
+            f'SELECT {cols} FROM items i '
+            f'JOIN (SELECT "Order ID", "Order Timestamp" FROM orders WHERE {self.where}) o USING ("Order ID") '
+            f'WHERE {item_where} '
+            f'ORDER BY o."Order Timestamp", o."Order ID", i."Line Item"',
+            params)
+
+    def basket(self, level: str) -> Basket:
+        # co-occurrence counted in SQL over distinct (order, value) pairs; no item rows leave DuckDB
+        item_where, params = self._item_filter()
+        b = (f'WITH b AS (SELECT DISTINCT i."Order ID" AS oid, i.{_q(level)} AS v FROM items i '
+             f'JOIN (SELECT "Order ID" FROM orders WHERE {self.where}) o USING ("Order ID") '
+             f'WHERE {item_where} AND i.{_q(level)} IS NOT NULL) ')
+        support = self._df(b + 'SELECT v, count(*) AS "Orders" FROM b GROUP BY v ORDER BY v', params)
+        pairs = self._df(b + 'SELECT a.v AS "Item A", c.v AS "Item B", count(*) AS "Orders" '
+                             'FROM b a JOIN b c ON a.oid = c.oid AND a.v < c.v GROUP BY 1, 2 ORDER BY 1, 2', params)
+        n = self._df(b + "SELECT count(DISTINCT oid) AS n FROM b", params)["n"].iloc[0]
+        return Basket(level,
+                      pairs.set_index(["Item A", "Item B"])["Orders"].astype(np.int64),
+                      pd.Series(support["Orders"].to_numpy(dtype=np.int64), index=support["v"].to_numpy(dtype=object),
+                                name="Orders"),
+                      int(n))
+
+    def kpis(self) -> dict:
+        r = self._df(f'''
+            SELECT sum("Total Amount") AS revenue, {self.backend.count_orders} AS orders, sum("Profit") AS profit,
+                   sum("Iced Items") FILTER (WHERE "Temperature (C)" >= 26) AS hot_iced,
+                   sum("Num Items") FILTER (WHERE "Temperature (C)" >= 26) AS hot_lines,
+                   sum("Iced Items") FILTER (WHERE "Temperature (C)" < 18) AS cold_iced,
+                   sum("Num Items") FILTER (WHERE "Temperature (C)" < 18) AS cold_lines
+            FROM orders WHERE {self.where}''').iloc[0]
+        revenue = float(r["revenue"]) if pd.notna(r["revenue"]) else 0.0
+        n_orders = int(r["orders"])
+        share = lambda a, b: float(a) / float(b) if pd.notna(b) and b else float("nan")
+        return {
+            "revenue": revenue,
+            "orders": n_orders,
+            "aov": revenue / max(n_orders, 1),
+            "gross_margin_pct": (float(r["profit"]) / revenue * 100) if revenue else 0.0,
+            "weather_sensitivity": (share(r["hot_iced"], r["hot_lines"]) - share(r["cold_iced"], r["cold_lines"])) * 100,
+        }
+
+    def _freq(self, freq):
+        if freq != "auto":
+            return freq
+        if self.start is None or self.end is None:
+            b = self._df(f'SELECT min("Order Timestamp") AS lo, max("Order Timestamp") AS hi FROM orders WHERE {self.where}')
+            lo, hi = b["lo"].iloc[0], b["hi"].iloc[0]
+            if pd.isna(lo):
+                return "MS"
+            return choose_freq(self.start or lo, self.end or hi)
+        return choose_freq(self.start, self.end)
+
+    def trend(self, freq="auto"):
+        freq = self._freq(freq)
+        ts = "Order Timestamp"
+        m = self._df(f'''
+            SELECT date_trunc('{_TRUNC[freq]}', "Order Timestamp") AS "{ts}",
+                   sum("Total Amount") AS "Total", {self.backend.count_orders} AS "Orders"
+            FROM orders WHERE {self.where} GROUP BY 1 ORDER BY 1''')
+        if len(m):
+            # resample() semantics: empty buckets between the first and last are zero
+            full = pd.date_range(m[ts].min(), m[ts].max(), freq=freq)
+            m = m.set_index(ts).reindex(full, fill_value=0).rename_axis(ts).reset_index()
+        return m, freq
+
+    def channel_share(self, freq="auto"):
+        freq = self._freq(freq)
+        ts = "Order Timestamp"
+        grp = self._df(f'''
+            SELECT date_trunc('{_TRUNC[freq]}', "Order Timestamp") AS "{ts}", "Channel",
+                   sum("Total Amount") AS "Revenue"
+            FROM orders WHERE {self.where} GROUP BY 1, 2 ORDER BY 1, 2''')
+        return grp, freq
+
+    def daypart_weekday(self):
+        d = self._df(f'''
+            SELECT "Daypart", isodow("Order Timestamp") - 1 AS "Weekday", sum("Total Amount") AS "Total Amount"
+            FROM orders WHERE {self.where} GROUP BY 1, 2''')
+        return daypart_week_pivot(d["Daypart"], d["Weekday"].to_numpy(), d["Total Amount"])
+
+    def corr(self, sample_rows=None):
+        # above sample_rows matching orders the pairs are computed over a repeatable reservoir sample
+        cols = CORR_COLUMNS
+        pairs = [(i, j) for i in range(len(cols)) for j in range(i + 1, len(cols))]
+        exprs = ", ".join(f"corr({_q(cols[i])}, {_q(cols[j])}) AS c{i}_{j}" for i, j in pairs)
+        src = f"(SELECT * FROM orders WHERE {self.where})"
+        sampled = bool(sample_rows) and self._df(f"SELECT count(*) AS n FROM {src}")["n"].iloc[0] > sample_rows
+        if sampled:
+            src += f" USING SAMPLE reservoir({int(sample_rows)} ROWS) REPEATABLE (0)"
+        r = self._df(f"SELECT {exprs} FROM {src}").iloc[0]
+        c = np.eye(len(cols))
+        for i, j in pairs:
+            c[i, j] = c[j, i] = r[f"c{i}_{j}"]
+        corr = pd.DataFrame(c, index=cols, columns=cols)
+        if sampled:
+            return corr, f" (sample of {sample_rows:,} orders, ±{corr_halfwidth(corr, sample_rows):.2f} at 95%)"
+        return corr, ""
+
+    def category_profit(self):
+        # order Profit spread over its lines by line revenue share, as in Starbucks_Rollup.allocate_profit
+        item_where, params = self._item_filter()
+        cat = self._df(f'''
+            SELECT "Category", "Subcategory", sum(line) AS "Revenue",
+                   sum(CASE WHEN order_revenue > 0 THEN profit * line / order_revenue ELSE 0 END) AS "Profit",
+                   sum("Quantity") AS "Quantity", count(*) AS "Lines"
+            FROM (SELECT i."Category", i."Subcategory", i."Quantity", i."Price" * i."Quantity" AS line,
+                         o."Profit" AS profit,
+                         sum(i."Price" * i."Quantity") OVER (PARTITION BY i."Order ID") AS order_revenue
+                  FROM items i
+                  JOIN (SELECT "Order ID", "Profit" FROM orders WHERE {self.where}) o USING ("Order ID")
+                  WHERE {item_where})
+            GROUP BY 1, 2 ORDER BY 1, 2''', params)
+        return category_profit_frame(None, None, cat)
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    def __init__(self, data_dir="data", layout="single", threads=None, distinct=DISTINCT_MODE):
+        import duckdb
+        # orders are one row per Order ID, so count(*) is the exact distinct count
+        self.count_orders = 'approx_count_distinct("Order ID")' if distinct == "sketch" else "count(*)"
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self._lock = threading.Lock()
+        self.partitioned = layout == "partitioned"
+        if self.partitioned:
+            for view, table in (("orders", "orders"), ("items", "items")):
+                glob_path = os.path.join(data_dir, PARTITION_DIRS[table], "*", "*", "*.parquet")
+                self.con.execute(f"CREATE VIEW {view}_raw AS SELECT * FROM read_parquet('{glob_path}', hive_partitioning = true)")
+            # Month is a partition key only; Region is a real column of orders
+            self.con.execute("CREATE VIEW orders AS SELECT * EXCLUDE (Month) FROM orders_raw")
+            self.con.execute("CREATE VIEW items AS SELECT * FROM items_raw")
+            self.item_columns = [c for c in self._columns("items") if c not in ("Month", "Region")]
+        else:
+            fmt = detect_format(data_dir)
+            for view, table in (("orders", "orders"), ("items", "items")):
+                path = table_path(data_dir, table, fmt)
+                if fmt == "parquet":
+                    self.con.execute(f"CREATE VIEW {view} AS SELECT * FROM read_parquet('{path}')")
+                elif fmt == "csv":
+                    self.con.execute(f"CREATE VIEW {view} AS SELECT * FROM read_csv_auto('{path}')")
+                else:
+                    # Arrow IPC: scan the memory-mapped table in place
+                    import pyarrow.feather as feather
+                    self.con.register(view, feather.read_table(path, memory_map=True))
+            self.item_columns = self._columns("items")
+
+    def _columns(self, view):
+        return [r[0] for r in self.con.execute(f"DESCRIBE {view}").fetchall()]
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        # one cursor per query: cursors share the database but not statement state
+        with self._lock:
+            cur = self.con.cursor()
+        try:
+            return cur.execute(sql, list(params)).df()
+        finally:
+            cur.close()
+
+    def bounds(self) -> dict:
+        r = self.query('SELECT min("Order Timestamp") AS lo, max("Order Timestamp") AS hi FROM orders').iloc[0]
+        channels = self.query('SELECT DISTINCT "Channel" FROM orders ORDER BY 1')["Channel"].tolist()
+        return {"min_ts": r["lo"], "max_ts": r["hi"], "channels": channels}
+
+    def select(self, start=None, end=None, regions=None, channels=None) -> DuckDBSelection:
+        return DuckDBSelection(self, start, end, regions, channels)
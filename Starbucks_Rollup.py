@@ -0,0 +1,173 @@
+# Starbucks_Rollup.py
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+from Starbucks_Storage import item_order_positions
+
+# -----------------------------
+# Aggregate cube
+# -----------------------------
+# One row per Date x Region (or Store) x Channel x Daypart; Weekday rides
+# along with Date. Measures keep the names of the order columns they sum so
+# chart code can treat a cube slice like a (much smaller) orders frame.
+
+CUBE_FILE = "rollup.parquet"
+CUBE_DIR = "rollup"  # per-shard partial cubes written by incremental generation
+CUBE_MEASURES = ["Total Amount", "Profit", "Tax Amount", "Tip Amount", "Total COGS"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def build_cube(orders: pd.DataFrame, level: str = "Region") -> pd.DataFrame:
+    keys = ["Date", level] + (["Region"] if level != "Region" else []) + ["Channel", "Daypart"]
+    df = pd.DataFrame({
+        "Date": orders["Order Date"] if "Order Date" in orders.columns else orders["Order Timestamp"].dt.normalize(),
+        **{c: orders[c] for c in keys[1:]},
+        **{m: orders[m] for m in CUBE_MEASURES},
+    })
+    cube = (df.groupby(keys, observed=True, sort=True)
+              .agg(**{m: (m, "sum") for m in CUBE_MEASURES}, Orders=("Total Amount", "size"))
+              .reset_index())
+    cube.insert(1, "Weekday", cube["Date"].dt.weekday.astype("int8"))
+    cube["Orders"] = cube["Orders"].astype("int64")
+    return cube
+
+def slice_cube(cube: pd.DataFrame, start=None, end=None, regions=None, channels=None) -> pd.DataFrame:
+    # same semantics as the app's filter block: empty region/channel lists don't filter
+    mask = np.ones(len(cube), dtype=bool)
+    if start is not None:
+        mask &= (cube["Date"] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (cube["Date"] <= pd.Timestamp(end)).to_numpy()
+    if regions:
+        mask &= cube["Region"].isin(regions).to_numpy()
+    if channels:
+        mask &= cube["Channel"].isin(channels).to_numpy()
+    return cube[mask]
+
+def merge_cubes(parts, measures=CUBE_MEASURES + ["Orders"]) -> pd.DataFrame:
+    # partial cubes (e.g. one per shard) share cells along Date/Region/...; sums merge
+    cube = pd.concat(parts, ignore_index=True)
+    keys = [c for c in cube.columns if c not in measures]
+    return (cube.groupby(keys, observed=True, sort=True)[measures]
+                .sum().reset_index())
+
+def cube_kpis(sl: pd.DataFrame) -> dict:
+    revenue = float(sl["Total Amount"].sum())
+    orders = int(sl["Orders"].sum())
+    profit = float(sl["Profit"].sum())
+    return {
+        "revenue": revenue,
+        "orders": orders,
+        "aov": revenue / max(orders, 1),
+        "gross_margin_pct": (profit / revenue * 100) if revenue else 0.0,
+    }
+
+# -----------------------------
+# Category cube
+# -----------------------------
+# Item-level rollup: one row per Date x Region x Channel x Category x
+# Subcategory with line revenue, quantity, line count and the order's Profit
+# allocated to its lines by their share of the order's line revenue. The
+# allocation is a segment sum over each item's order position (bincount),
+# so there is no join on Order ID; the cube slices with slice_cube.
+
+CATEGORY_FILE = "category_rollup.parquet"
+CATEGORY_DIR = "category_rollup"  # per-shard parts, like CUBE_DIR
+CATEGORY_KEYS = ["Date", "Region", "Channel", "Category", "Subcategory"]
+CATEGORY_MEASURES = ["Revenue", "Profit", "Quantity", "Lines"]
+
+def allocate_profit(orders: pd.DataFrame, items: pd.DataFrame, pos: np.ndarray = None):
+    # -> (line revenue, allocated profit), both aligned with items; pos = item_order_positions
+    pos = item_order_positions(orders, items) if pos is None else pos
+    line = items["Price"].to_numpy(dtype=np.float64) * items["Quantity"].to_numpy(dtype=np.float64)
+    alloc = np.zeros(len(items))
+    keep = pos >= 0
+    p = pos[keep]
+    order_revenue = np.bincount(p, weights=line[keep], minlength=len(orders))[p]
+    profit = orders["Profit"].to_numpy(dtype=np.float64)[p]
+    nonzero = order_revenue > 0
+    alloc[np.flatnonzero(keep)[nonzero]] = profit[nonzero] * line[keep][nonzero] / order_revenue[nonzero]
+    return line, alloc
+
+def build_category_cube(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    pos = item_order_positions(orders, items)
+    line, alloc = allocate_profit(orders, items, pos)
+    keep = pos >= 0
+    p = pos[keep]
+    date = orders["Order Date"] if "Order Date" in orders.columns else orders["Order Timestamp"].dt.normalize()
+    df = pd.DataFrame({
+        "Date": date.to_numpy()[p],
+        **{c: orders[c].take(p).reset_index(drop=True) for c in ("Region", "Channel")},
+        **{c: items[c][keep].reset_index(drop=True) for c in ("Category", "Subcategory")},
+        "Revenue": line[keep],
+        "Profit": alloc[keep],
+        "Quantity": items["Quantity"].to_numpy()[keep].astype(np.int64),
+    })
+    return (df.groupby(CATEGORY_KEYS, observed=True, sort=True)
+              .agg(Revenue=("Revenue", "sum"), Profit=("Profit", "sum"), Quantity=("Quantity", "sum"),
+                   Lines=("Revenue", "size"))
+              .reset_index())
+
+def merge_category_cubes(parts) -> pd.DataFrame:
+    return merge_cubes(parts, CATEGORY_MEASURES)
+
+# -----------------------------
+# Store cube
+# -----------------------------
+# The order cube at Store grain: Date x Store ID x Channel x Daypart (Region
+# and Weekday ride along). "Temperature (C)" is summed like the other
+# measures, so Temperature (C) / Orders is a cell's mean order temperature.
+# Per-store forecasting (Starbucks_Forecast) reads its stores x days series
+# from here instead of grouping the orders table.
+
+STORE_FILE = "store_rollup.parquet"
+STORE_DIR = "store_rollup"  # per-shard parts, like CUBE_DIR
+STORE_MEASURES = CUBE_MEASURES + ["Temperature (C)"]
+
+def build_store_cube(orders: pd.DataFrame) -> pd.DataFrame:
+    keys = ["Date", "Store ID", "Region", "Channel", "Daypart"]
+    df = pd.DataFrame({
+        "Date": orders["Order Date"] if "Order Date" in orders.columns else orders["Order Timestamp"].dt.normalize(),
+        **{c: orders[c] for c in keys[1:]},
+        **{m: orders[m] for m in STORE_MEASURES},
+    })
+    cube = (df.groupby(keys, observed=True, sort=True)
+              .agg(**{m: (m, "sum") for m in STORE_MEASURES}, Orders=("Total Amount", "size"))
+              .reset_index())
+    cube.insert(1, "Weekday", cube["Date"].dt.weekday.astype("int8"))
+    cube["Orders"] = cube["Orders"].astype("int64")
+    return cube
+
+def merge_store_cubes(parts) -> pd.DataFrame:
+    return merge_cubes(parts, STORE_MEASURES + ["Orders"])
+
+# -----------------------------
+# Persistence
+# -----------------------------
+
+def save_cube(cube: pd.DataFrame, data_dir: str = "data", fname: str = CUBE_FILE):
+    os.makedirs(data_dir, exist_ok=True)
+    cube.to_parquet(os.path.join(data_dir, fname), index=False)
+
+def load_cube(data_dir: str = "data", fname: str = CUBE_FILE, part_dir: str = CUBE_DIR, merge=merge_cubes):
+    path = os.path.join(data_dir, fname)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    part_dir = os.path.join(data_dir, part_dir)
+    parts = sorted(glob.glob(os.path.join(part_dir, "*.parquet")))
+    if parts:
+        return merge([pd.read_parquet(p) for p in parts])
+    return None
+
+def save_category_cube(cube: pd.DataFrame, data_dir: str = "data"):
+    save_cube(cube, data_dir, CATEGORY_FILE)
+
+def load_category_cube(data_dir: str = "data"):
+    return load_cube(data_dir, CATEGORY_FILE, CATEGORY_DIR, merge_category_cubes)
+
+def save_store_cube(cube: pd.DataFrame, data_dir: str = "data"):
+    save_cube(cube, data_dir, STORE_FILE)
+
+def load_store_cube(data_dir: str = "data"):
+    return load_cube(data_dir, STORE_FILE, STORE_DIR, merge_store_cubes)
@@ -0,0 +1,139 @@
+# Starbucks_Schema.py
+import argparse
+import numpy as np
+import pandas as pd
+
+from Starbucks_Faker import (categories, sizes, channels, dayparts, markets, regions, store_formats,
+                             devices, payment_methods, weather_conditions)
+
+# -----------------------------
+# Compact schema
+# -----------------------------
+# Low-cardinality strings become categoricals with fixed category sets taken
+# from the generator's domain config, Order ID / Store ID become integer
+# surrogate keys (UUIDs move to side tables), and integer columns are narrowed.
+# Currency columns stay float64 so KPI sums are unchanged to the cent.
+
+_subcategories = [sc for c in categories for sc in categories[c]]
+_sizes = list(dict.fromkeys(sz for sc in _subcategories for sz in sizes.get(sc, sizes["_default"])))
+
+CATEGORY_SETS = {
+    "Format": store_formats,
+    "Region": regions,
+    "Market": markets,
+    "Channel": channels,
+    "Daypart": [dp for dp, _, _ in dayparts] + ["Late Night"],
+    "Device": devices,
+    "Payment Method": payment_methods,
+    "Weather Condition": weather_conditions,
+    "Category": list(categories),
+    "Subcategory": _subcategories,
+    "Size": _sizes,
+    "Product Name": [f"{sz} {sc}" for sc in _subcategories for sz in sizes.get(sc, sizes["_default"])],
+}
+
+NARROW_DTYPES = {
+    "Num Items": "int8",
+    "Stars Redeemed": "int16",
+    "Temperature (C)": "float32",
+    "Line Item": "int8",
+    "Quantity": "int8",
+    "Avg Wait Time (mins)": "float32",
+    "Iced Items": "int8",
+    "Iced Share": "float32",
+    "Weekday": "int8",
+    "Order Hour": "int8",
+}
+
+def as_category(s: pd.Series, cats) -> pd.Series:
+    # fixed domain categories first; anything unexpected is appended, never dropped
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        extra = sorted(set(map(str, s.cat.categories)) - set(cats))
+        return s.cat.set_categories(list(cats) + extra)
+    extra = sorted(set(map(str, pd.unique(s.dropna()))) - set(cats))
+    return pd.Series(pd.Categorical(s, categories=list(cats) + extra), index=s.index, name=s.name)
+
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORY_SETS:
+            s = as_category(s, CATEGORY_SETS[col])
+        elif col in NARROW_DTYPES:
+            s = s.astype(NARROW_DTYPES[col])
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+def surrogate_keys(ids: pd.Series, dtype="int64"):
+    codes, uniques = pd.factorize(ids.astype(object), sort=False)
+    return codes.astype(dtype), pd.Index(uniques)
+
+def to_compact(stores: pd.DataFrame, orders: pd.DataFrame, items: pd.DataFrame):
+    # returns compact (stores, orders, items) plus {"orders"/"stores": key -> UUID side table}
+    store_codes, store_uuids = surrogate_keys(stores["Store ID"], "int32")
+    order_codes, order_uuids = surrogate_keys(orders["Order ID"], "int64")
+
+    stores_c = _compact_frame(stores)
+    stores_c["Store ID"] = store_codes
+
+    orders_c = _compact_frame(orders)
+    orders_c["Order ID"] = order_codes
+    orders_c["Store ID"] = store_uuids.get_indexer(orders["Store ID"].astype(object)).astype("int32")
+
+    items_c = _compact_frame(items)
+    items_c["Order ID"] = order_uuids.get_indexer(items["Order ID"].astype(object)).astype("int64")
+
+    keys = {
+        "stores": pd.DataFrame({"Store ID": np.arange(len(store_uuids), dtype="int32"), "Store UUID": store_uuids}),
+        "orders": pd.DataFrame({"Order ID": np.arange(len(order_uuids), dtype="int64"), "Order UUID": order_uuids}),
+    }
+    return stores_c, orders_c, items_c, keys
+
+def restore_ids(df: pd.DataFrame, keys: dict) -> pd.DataFrame:
+    # map surrogate keys back to UUID strings, e.g. for display
+    out = df.copy()
+    if "Order ID" in out.columns and pd.api.types.is_integer_dtype(out["Order ID"]):
+        out["Order ID"] = keys["orders"]["Order UUID"].to_numpy()[out["Order ID"].to_numpy()]
+    if "Store ID" in out.columns and pd.api.types.is_integer_dtype(out["Store ID"]):
+        out["Store ID"] = keys["stores"]["Store UUID"].to_numpy()[out["Store ID"].to_numpy()]
+    return out
+
+# -----------------------------
+# Memory footprint report
+# -----------------------------
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+def memory_report(standard: dict, compact: dict) -> pd.DataFrame:
+    # standard / compact: {"table name": DataFrame}; side tables only in compact count too
+    rows = []
+    for name in dict.fromkeys(list(standard) + list(compact)):
+        a = frame_bytes(standard[name]) if name in standard else 0
+        b = frame_bytes(compact[name]) if name in compact else 0
+        rows.append({"Table": name, "Standard (MB)": a / 2**20, "Compact (MB)": b / 2**20})
+    report = pd.DataFrame(rows)
+    total = report[["Standard (MB)", "Compact (MB)"]].sum()
+    report.loc[len(report)] = {"Table": "Total", **total.to_dict()}
+    report["Ratio"] = report["Standard (MB)"] / report["Compact (MB)"].where(report["Compact (MB)"] > 0)
+    return report.round(2)
+
+def main(argv=None):
+    from Starbucks_Storage import load_tables
+    parser = argparse.ArgumentParser(description="Compare memory footprint of the standard and compact schemas.")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    args = parser.parse_args(argv)
+    stores, orders, items = load_tables(args.data_dir)
+    # columnar files load with dictionary-encoded strings; compare against plain objects
+    stores, orders, items = (df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+                             for df in (stores, orders, items))
+    stores_c, orders_c, items_c, keys = to_compact(stores, orders, items)
+    report = memory_report(
+        {"stores": stores, "orders": orders, "items": items},
+        {"stores": stores_c, "orders": orders_c, "items": items_c,
+         "order key table": keys["orders"], "store key table": keys["stores"]},
+    )
+    print(report.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
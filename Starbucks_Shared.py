@@ -0,0 +1,113 @@
+# Starbucks_Shared.py
+import threading
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Shared read-only dataset
+# -----------------------------
+# st.cache_data pickles its return value and gives every session / rerun its
+# own copy. The dataset is instead loaded once per process (st.cache_resource)
+# and every session reads the same frames. Column buffers are flagged
+# read-only and the frames refuse column assignment / in-place ops, so a
+# session that wants to change something has to take its own copy first.
+# Anything derived from a shared frame (take, merge, copy, ...) is a plain
+# DataFrame again.
+
+def _readonly(*args, **kwargs):
+    raise TypeError("shared dataset is read-only; take a .copy() to modify it")
+
+class _ReadOnlyIndexer:
+    # .loc / .iloc / .at / .iat that can read but not assign
+    def __init__(self, indexer):
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    def __call__(self, *args, **kwargs):
+        return _ReadOnlyIndexer(self._indexer(*args, **kwargs))
+
+    __setitem__ = _readonly
+
+class ReadOnlyFrame(pd.DataFrame):
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    loc = property(lambda self: _ReadOnlyIndexer(pd.DataFrame.loc.fget(self)))
+    iloc = property(lambda self: _ReadOnlyIndexer(pd.DataFrame.iloc.fget(self)))
+    at = property(lambda self: _ReadOnlyIndexer(pd.DataFrame.at.fget(self)))
+    iat = property(lambda self: _ReadOnlyIndexer(pd.DataFrame.iat.fget(self)))
+
+    __setitem__ = __delitem__ = insert = pop = _readonly
+    _update_inplace = _readonly  # drop/fillna/...(inplace=True) funnel here
+
+    def __setattr__(self, name, value):
+        # rename(inplace=True), set_axis and plain `df.columns = ...` all land here
+        if name in ("columns", "index"):
+            _readonly()
+        super().__setattr__(name, value)
+
+def _freeze_buffers(df: pd.DataFrame):
+    for blk in df._mgr.blocks:
+        v = blk.values
+        v = getattr(v, "_ndarray", v)  # datetime / timedelta arrays
+        v = getattr(v, "_codes", v)    # categoricals
+        if isinstance(v, np.ndarray):
+            v.flags.writeable = False
+
+def freeze(df: pd.DataFrame) -> pd.DataFrame:
+    if df is None or isinstance(df, ReadOnlyFrame):
+        return df
+    out = ReadOnlyFrame(df)
+    _freeze_buffers(out)
+    return out
+
+class SharedDataset:
+    # one immutable snapshot of the tables for a dataset version
+    def __init__(self, version: str, orders, items, stores, keys=None):
+        self.version = version
+        self.orders = freeze(orders)
+        self.items = freeze(items)
+        self.stores = freeze(stores)
+        self.keys = {k: freeze(v) for k, v in keys.items()} if keys else None
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def tables(self):
+        return self.orders, self.items, self.stores, self.keys
+
+    def derived(self, name: str, build):
+        # an object built once from this snapshot (e.g. the filter index); it lives and dies with the
+        # snapshot, so a swap releases the old version's along with its tables
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+class DatasetHandle:
+    # process-wide pointer to the current snapshot. A rerun reads current()
+    # once and keeps using that snapshot, so a swap mid-rerun never mixes versions.
+    def __init__(self):
+        self._current = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        return self._current
+
+    def swap(self, dataset: SharedDataset):
+        old, self._current = self._current, dataset  # single reference assignment
+        return old
+
+    def ensure(self, version: str, loader) -> SharedDataset:
+        # return the snapshot for version, loading it (once, under the lock) if needed
+        ds = self._current
+        if ds is not None and ds.version == version:
+            return ds
+        with self._lock:
+            ds = self._current
+            if ds is None or ds.version != version:
+                ds = loader(version)
+                self.swap(ds)
+        return ds
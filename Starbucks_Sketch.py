@@ -0,0 +1,211 @@
+# Starbucks_Sketch.py
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Distinct-count sketches
+# -----------------------------
+# HyperLogLog over 64-bit hashes of an id column. Each (Month x Region x
+# Channel) bucket keeps dense registers (2**precision bytes) plus the first
+# and last day it has ids for. Days are too small a grain: a day x region x
+# channel bucket holds a few dozen ids against ~16k registers, so a per-day
+# sketch is as big as the ids and slower to count than nunique. Sketches
+# merge by union (max per register), which makes distinct counts add up
+# across buckets, shards and partitions without going back to raw rows.
+#
+# A filter can only use the sketch when every bucket it touches lies wholly
+# inside the date range (slice_sketch returns None otherwise and callers
+# count exactly); the full window and month-aligned ranges qualify. The
+# error bound sets the precision: standard error is about
+# 1.04 / sqrt(2**precision).
+
+SKETCH_FILE = "sketch.parquet"
+SKETCH_DIR = "sketch"  # per-shard partial sketches written by incremental generation
+SKETCH_KEYS = ["Date", "Region", "Channel"]  # Date: first day of the month
+HLL_ERROR = float(os.getenv("BREWED_HLL_ERROR", "0.01"))
+# "exact": nunique / row counts over raw rows or the cube; "sketch": unique counts from the HLL tables
+DISTINCT_MODE = os.getenv("BREWED_DISTINCT_COUNTS", "exact")
+
+def precision_for(error: float) -> int:
+    # smallest precision whose standard error is within `error`, clamped to 4..16
+    p = int(np.ceil(np.log2((1.04 / error) ** 2)))
+    return min(max(p, 4), 16)
+
+def standard_error(precision: int) -> float:
+    return 1.04 / np.sqrt(2 ** precision)
+
+def _alpha(m: int) -> float:
+    return {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+
+def hash_ids(values) -> np.ndarray:
+    # stable 64-bit hashes; the same id hashes the same in every process and shard
+    return pd.util.hash_array(np.asarray(values), categorize=False)
+
+def bit_length(x: np.ndarray) -> np.ndarray:
+    # int.bit_length for uint64 arrays, by binary search with shifts (a float log2 rounds above 2**53)
+    x = np.asarray(x, dtype=np.uint64)
+    n = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >> np.uint64(shift)
+        big = high > 0
+        n += big * shift
+        x = np.where(big, high, x)
+    return n + (x > 0)
+
+def registers(hashes: np.ndarray, precision: int):
+    # -> (register index, rank): top bits pick the register, rank = leading zeros of the rest + 1
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    width = 64 - precision
+    reg = (hashes >> np.uint64(width)).astype(np.uint16)
+    rest = hashes & np.uint64((1 << width) - 1)
+    rank = (width - bit_length(rest) + 1).astype(np.uint8)
+    return reg, rank
+
+def estimate_dense(regs: np.ndarray) -> np.ndarray:
+    # distinct-count estimate for each row of a (groups x 2**precision) register matrix
+    regs = np.atleast_2d(regs)
+    m = regs.shape[1]
+    zeros = (regs == 0).sum(axis=1)
+    z = np.exp2(-regs.astype(np.float64)).sum(axis=1)
+    est = _alpha(m) * m * m / z
+    # small-range correction: linear counting while registers are still empty
+    small = (est <= 2.5 * m) & (zeros > 0)
+    with np.errstate(divide="ignore"):
+        est = np.where(small, m * np.log(m / np.maximum(zeros, 1)), est)
+    est[zeros == m] = 0.0
+    return est
+
+def estimate_groups(codes: np.ndarray, reg: np.ndarray, rank: np.ndarray, k: int, precision: int) -> np.ndarray:
+    # distinct-count estimate for each of k groups from per-id (group, register, rank)
+    m = 1 << precision
+    dense = np.zeros(k * m, dtype=np.uint8)
+    np.maximum.at(dense, codes.astype(np.int64) * m + reg, rank)
+    return estimate_dense(dense.reshape(k, m)) if k else np.zeros(0)
+
+def approx_nunique_by(ids, codes: np.ndarray, k: int, precision: int = None) -> np.ndarray:
+    # distinct ids per group code (0..k-1), straight from a column; e.g. unique customers per month
+    reg, rank = registers(hash_ids(ids), precision or precision_for(HLL_ERROR))
+    return estimate_groups(np.asarray(codes), reg, rank, k, precision or precision_for(HLL_ERROR))
+
+# -----------------------------
+# Sketch tables
+# -----------------------------
+
+def _buckets(keys: pd.DataFrame):
+    # -> (bucket code per row, one key row per bucket in code order)
+    codes = keys.groupby(SKETCH_KEYS, observed=True, sort=True).ngroup().to_numpy()
+    first = np.unique(codes, return_index=True)[1]
+    return codes, keys.iloc[first][SKETCH_KEYS].reset_index(drop=True)
+
+def register_matrix(sketch: pd.DataFrame) -> np.ndarray:
+    # (buckets x 2**precision) uint8 view of the Registers column
+    if len(sketch) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+    return np.frombuffer(b"".join(sketch["Registers"]), dtype=np.uint8).reshape(len(sketch), -1)
+
+def _sketch_frame(keys: pd.DataFrame, first, last, regs: np.ndarray) -> pd.DataFrame:
+    out = keys.assign(**{"First Date": np.asarray(first, dtype="datetime64[ns]"),
+                         "Last Date": np.asarray(last, dtype="datetime64[ns]")})
+    out["Registers"] = [r.tobytes() for r in regs]
+    return out
+
+def build_sketch(orders: pd.DataFrame, id_col: str = "Order ID", precision: int = None) -> pd.DataFrame:
+    # one row per (month, region, channel) bucket with ids: its registers and the days they span
+    precision = precision or precision_for(HLL_ERROR)
+    m = 1 << precision
+    day = orders["Order Date"] if "Order Date" in orders.columns else orders["Order Timestamp"].dt.normalize()
+    day = pd.Series(day.to_numpy(dtype="datetime64[ns]"))
+    keys = pd.DataFrame({"Date": day.dt.to_period("M").dt.to_timestamp(),
+                         **{c: orders[c].to_numpy() for c in SKETCH_KEYS[1:]}})
+    codes, out = _buckets(keys)
+    reg, rank = registers(hash_ids(orders[id_col].to_numpy()), precision)
+    dense = np.zeros(len(out) * m, dtype=np.uint8)
+    np.maximum.at(dense, codes * m + reg, rank)
+    span = day.groupby(codes).agg(["min", "max"])
+    return _sketch_frame(out, span["min"], span["max"], dense.reshape(len(out), m))
+
+def sketch_precision(sketch: pd.DataFrame) -> int:
+    # dense registers: the width says it
+    if len(sketch) == 0:
+        return precision_for(HLL_ERROR)
+    return int(len(sketch["Registers"].iloc[0])).bit_length() - 1
+
+def merge_sketches(parts) -> pd.DataFrame:
+    # union: max per register within each bucket, widest day span
+    parts = [p for p in parts if len(p)]
+    precisions = {sketch_precision(p) for p in parts}
+    if len(precisions) > 1:
+        raise ValueError(f"can't merge sketches of different precisions {sorted(precisions)}")
+    if not parts:
+        return _sketch_frame(pd.DataFrame(columns=SKETCH_KEYS), [], [], np.zeros((0, 0), dtype=np.uint8))
+    cat = pd.concat(parts, ignore_index=True)
+    codes, keys = _buckets(cat)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    regs = np.maximum.reduceat(register_matrix(cat)[order], starts, axis=0)
+    first = np.minimum.reduceat(cat["First Date"].to_numpy(dtype="datetime64[ns]")[order], starts)
+    last = np.maximum.reduceat(cat["Last Date"].to_numpy(dtype="datetime64[ns]")[order], starts)
+    return _sketch_frame(keys, first, last, regs)
+
+def slice_sketch(sketch: pd.DataFrame, start=None, end=None, regions=None, channels=None):
+    # the buckets for a filter, or None when the date range cuts through one (count exactly then).
+    # Same filter semantics as slice_cube: empty region/channel lists don't filter
+    mask = np.ones(len(sketch), dtype=bool)
+    if regions:
+        mask &= sketch["Region"].isin(regions).to_numpy()
+    if channels:
+        mask &= sketch["Channel"].isin(channels).to_numpy()
+    sk = sketch[mask]
+    first, last = sk["First Date"], sk["Last Date"]
+    inside = np.ones(len(sk), dtype=bool)
+    outside = np.zeros(len(sk), dtype=bool)
+    if start is not None:
+        lo = pd.Timestamp(start).normalize()
+        inside &= (first >= lo).to_numpy()
+        outside |= (last < lo).to_numpy()
+    if end is not None:
+        hi = pd.Timestamp(end).normalize()
+        inside &= (last <= hi).to_numpy()
+        outside |= (first > hi).to_numpy()
+    if not (inside | outside).all():
+        return None
+    return sk[inside]
+
+def sketch_count(sl: pd.DataFrame) -> float:
+    # distinct ids across every bucket in the slice
+    if sl is None or len(sl) == 0:
+        return 0.0
+    return float(estimate_dense(register_matrix(sl).max(axis=0))[0])
+
+def sketch_counts_at(sl: pd.DataFrame, starts) -> np.ndarray:
+    # distinct ids per time bucket; starts are the (sorted) bucket start timestamps, at most one per month
+    # (e.g. a monthly trend frame's index): buckets finer than the sketch's months can't be answered
+    starts = pd.DatetimeIndex(starts)
+    if sl is None or len(sl) == 0 or len(starts) == 0:
+        return np.zeros(len(starts))
+    dates = sl["Date"].to_numpy(dtype="datetime64[ns]")
+    codes = np.searchsorted(starts.to_numpy(dtype="datetime64[ns]"), dates, side="right") - 1
+    keep = codes >= 0
+    regs = register_matrix(sl)
+    out = np.zeros((len(starts), regs.shape[1]), dtype=np.uint8)
+    np.maximum.at(out, codes[keep], regs[keep])
+    return estimate_dense(out)
+
+# -----------------------------
+# Persistence
+# -----------------------------
+
+def save_sketch(sketch: pd.DataFrame, data_dir: str = "data", path: str = None):
+    os.makedirs(data_dir, exist_ok=True)
+    sketch.to_parquet(path or os.path.join(data_dir, SKETCH_FILE), index=False)
+
+def load_sketch(data_dir: str = "data"):
+    path = os.path.join(data_dir, SKETCH_FILE)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    parts = sorted(glob.glob(os.path.join(data_dir, SKETCH_DIR, "*.parquet")))
+    if parts:
+        return merge_sketches([pd.read_parquet(p) for p in parts])
+    return None
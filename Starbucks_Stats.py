@@ -0,0 +1,201 @@
+# Starbucks_Stats.py
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Streaming covariance
+# -----------------------------
+# Covariance / correlation from (n, mean, M2) moments instead of a float64
+# copy of every selected row. Chunks are folded in with the Chan et al.
+# parallel update, which stays numerically stable where the naive
+# sum-of-products formula loses precision, and two accumulators merge the
+# same way, so partial states computed per partition (or per cube cell) can
+# be combined for any selection without touching raw rows.
+
+CORR_COLUMNS = ["Total Amount", "Profit", "Temperature (C)", "Num Items", "Discount Amount", "Tip Amount"]
+# orders above which a heatmap that would scan rows reads a uniform sample instead; 0 = always exact
+CORR_SAMPLE_ROWS = int(os.getenv("BREWED_CORR_SAMPLE_ROWS", "0"))
+
+class CovAccumulator:
+    def __init__(self, columns=CORR_COLUMNS):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(p)
+        self.m2 = np.zeros((p, p))  # sum of outer products of deviations from the mean
+
+    def _merge_moments(self, n, mean, m2):
+        if n == 0:
+            return self
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * (self.n * n / total)
+        self.mean = self.mean + delta * (n / total)
+        self.n = total
+        return self
+
+    def update(self, x: np.ndarray):
+        x = np.asarray(x, dtype=np.float64)
+        x = x[~np.isnan(x).any(axis=1)]
+        if len(x) == 0:
+            return self
+        mean = x.mean(axis=0)
+        xc = x - mean
+        return self._merge_moments(len(x), mean, xc.T @ xc)
+
+    def update_frame(self, df: pd.DataFrame, chunk_rows: int = 65536):
+        # one pass; only chunk_rows x len(columns) floats are materialized at a time
+        for lo in range(0, len(df), chunk_rows):
+            part = df.iloc[lo:lo + chunk_rows]
+            self.update(np.column_stack([part[c].to_numpy(dtype=np.float64) for c in self.columns]))
+        return self
+
+    def merge(self, other: "CovAccumulator"):
+        return self._merge_moments(other.n, other.mean, other.m2)
+
+    def cov(self, ddof: int = 1) -> pd.DataFrame:
+        c = self.m2 / (self.n - ddof) if self.n > ddof else np.full_like(self.m2, np.nan)
+        return pd.DataFrame(c, index=self.columns, columns=self.columns)
+
+    def corr(self) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(np.diag(self.m2))
+            c = self.m2 / np.outer(sd, sd)
+        return pd.DataFrame(c, index=self.columns, columns=self.columns)
+
+    def to_dict(self) -> dict:
+        return {"columns": self.columns, "n": int(self.n), "mean": self.mean.tolist(), "m2": self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CovAccumulator":
+        acc = cls(d["columns"])
+        acc.n, acc.mean, acc.m2 = d["n"], np.asarray(d["mean"]), np.asarray(d["m2"])
+        return acc
+
+def streaming_corr(df: pd.DataFrame, columns=CORR_COLUMNS, chunk_rows: int = 65536) -> pd.DataFrame:
+    return CovAccumulator(columns).update_frame(df, chunk_rows).corr()
+
+# -----------------------------
+# Per-cell moment partials
+# -----------------------------
+# One row of moments per Date x Region x Channel x Daypart cell (the rollup
+# cube's cells), so a filter slice is a vectorized k-way merge of its cells.
+# M2 is stored as its upper triangle.
+
+MOMENTS_FILE = "moments.parquet"
+MOMENTS_DIR = "moments"  # per-shard partials written by incremental generation
+
+def _pairs(columns):
+    return [(i, j) for i in range(len(columns)) for j in range(i, len(columns))]
+
+def _m2_col(columns, i, j):
+    return f"M2 {columns[i]} x {columns[j]}"
+
+def build_moments(orders: pd.DataFrame, level: str = "Region", columns=CORR_COLUMNS) -> pd.DataFrame:
+    keys = ["Date", level] + (["Region"] if level != "Region" else []) + ["Channel", "Daypart"]
+    x = np.column_stack([orders[c].to_numpy(dtype=np.float64) for c in columns])
+    ok = ~np.isnan(x).any(axis=1)
+    frame = pd.DataFrame({
+        "Date": orders["Order Date"] if "Order Date" in orders.columns else orders["Order Timestamp"].dt.normalize(),
+        **{c: orders[c] for c in keys[1:]},
+    })[ok]
+    x = x[ok]
+    grouped = frame.groupby(keys, observed=True, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    k = int(codes.max()) + 1 if len(codes) else 0
+    n = np.bincount(codes, minlength=k).astype(np.float64)
+    mean = np.column_stack([np.bincount(codes, weights=x[:, i], minlength=k) for i in range(x.shape[1])]) / n[:, None]
+    xc = x - mean[codes]
+    out = grouped.size().reset_index()[keys]
+    out["N"] = n.astype(np.int64)
+    for i, c in enumerate(columns):
+        out[f"Mean {c}"] = mean[:, i]
+    for i, j in _pairs(columns):
+        out[_m2_col(columns, i, j)] = np.bincount(codes, weights=xc[:, i] * xc[:, j], minlength=k)
+    return out
+
+def merge_moments(cells: pd.DataFrame, columns=CORR_COLUMNS) -> CovAccumulator:
+    # k-way Chan merge: M2 = sum(M2_k) + sum(n_k * d_k d_k^T), d_k = mean_k - mean
+    acc = CovAccumulator(columns)
+    if cells is None or len(cells) == 0:
+        return acc
+    n = cells["N"].to_numpy(dtype=np.float64)
+    means = cells[[f"Mean {c}" for c in columns]].to_numpy()
+    total = n.sum()
+    if total == 0:
+        return acc
+    mean = (n[:, None] * means).sum(axis=0) / total
+    d = means - mean
+    m2 = np.einsum("k,ki,kj->ij", n, d, d)
+    for i, j in _pairs(columns):
+        s = cells[_m2_col(columns, i, j)].to_numpy().sum()
+        m2[i, j] += s
+        if i != j:
+            m2[j, i] += s
+    acc.n, acc.mean, acc.m2 = int(total), mean, m2
+    return acc
+
+def combine_moment_tables(parts, columns=CORR_COLUMNS) -> pd.DataFrame:
+    # partial tables (e.g. per shard) can hold the same cell; fold duplicates together
+    t = pd.concat(parts, ignore_index=True)
+    keys = [c for c in t.columns if c != "N" and not c.startswith(("Mean ", "M2 "))]
+    codes = t.groupby(keys, observed=True, sort=True).ngroup().to_numpy()
+    if len(codes) == 0 or codes.max() + 1 == len(t):
+        return t
+    out = t.groupby(keys, observed=True, sort=True).size().reset_index()[keys]
+    k = len(out)
+    n = t["N"].to_numpy(dtype=np.float64)
+    N = np.bincount(codes, weights=n, minlength=k)
+    out["N"] = N.astype(np.int64)
+    means = t[[f"Mean {c}" for c in columns]].to_numpy()
+    merged = np.column_stack([np.bincount(codes, weights=n * means[:, i], minlength=k) for i in range(len(columns))]) / N[:, None]
+    d = means - merged[codes]
+    for i, c in enumerate(columns):
+        out[f"Mean {c}"] = merged[:, i]
+    for i, j in _pairs(columns):
+        col = _m2_col(columns, i, j)
+        out[col] = np.bincount(codes, weights=t[col].to_numpy() + n * d[:, i] * d[:, j], minlength=k)
+    return out
+
+# -----------------------------
+# Sampled mode
+# -----------------------------
+
+def sampled_corr(df: pd.DataFrame, sample_rows: int = 50_000, columns=CORR_COLUMNS, seed: int = 0):
+    # -> (corr, halfwidth): corr from a uniform row sample plus the worst-case
+    # 95% CI half-width over the matrix (Fisher z); 0.0 when nothing was sampled out
+    n = min(sample_rows, len(df))
+    if n == len(df):
+        return streaming_corr(df, columns), 0.0
+    pos = np.sort(np.random.default_rng(seed).choice(len(df), size=n, replace=False))
+    corr = streaming_corr(df.iloc[pos], columns)
+    return corr, corr_halfwidth(corr, n)
+
+def corr_halfwidth(corr: pd.DataFrame, n: int) -> float:
+    # worst-case 95% CI half-width of a correlation matrix estimated from n rows
+    if n <= 3:
+        return float("nan")
+    z = np.arctanh(np.clip(corr.to_numpy(), -0.999999, 0.999999))
+    se = 1.96 / np.sqrt(n - 3)
+    half = (np.tanh(z + se) - np.tanh(z - se)) / 2
+    np.fill_diagonal(half, 0.0)
+    return float(np.nanmax(half))
+
+# -----------------------------
+# Persistence
+# -----------------------------
+
+def save_moments(moments: pd.DataFrame, data_dir: str = "data"):
+    os.makedirs(data_dir, exist_ok=True)
+    moments.to_parquet(os.path.join(data_dir, MOMENTS_FILE), index=False)
+
+def load_moments(data_dir: str = "data"):
+    path = os.path.join(data_dir, MOMENTS_FILE)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    parts = sorted(glob.glob(os.path.join(data_dir, MOMENTS_DIR, "*.parquet")))
+    if parts:
+        return combine_moment_tables([pd.read_parquet(p) for p in parts])
+    return None
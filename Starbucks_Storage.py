@@ -0,0 +1,385 @@
+# Starbucks_Storage.py
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Storage layout
+# -----------------------------
+
+TABLES = {"stores": "stores", "orders": "orders", "items": "order_items"}
+FORMATS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+COMPRESSIONS = {
+    "parquet": ["zstd", "snappy", "gzip", "none"],
+    "feather": ["zstd", "lz4", "none"],
+    "csv": ["none"],
+}
+
+# low-cardinality string columns, written dictionary-encoded
+DICTIONARY_COLUMNS = {
+    "stores": ["Format", "Region", "Market"],
+    "orders": ["Store ID", "Region", "Market", "Daypart", "Channel", "Device",
+               "Payment Method", "Weather Condition"],
+    "items": ["Product Name", "Category", "Subcategory", "Size"],
+}
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+DEFAULT_FORMAT = os.getenv("BREWED_STORAGE_FORMAT", "parquet" if has_pyarrow() else "csv")
+DEFAULT_COMPRESSION = os.getenv("BREWED_STORAGE_COMPRESSION", "zstd")
+
+def table_path(data_dir: str, table: str, fmt: str) -> str:
+    return os.path.join(data_dir, TABLES[table] + FORMATS[fmt])
+
+def detect_format(data_dir: str = "data"):
+    # first format for which all three tables exist, columnar formats first
+    for fmt in FORMATS:
+        if all(os.path.exists(table_path(data_dir, t, fmt)) for t in TABLES):
+            return fmt
+    return None
+
+def _dictionary_encode(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    cols = [c for c in DICTIONARY_COLUMNS[table]
+            if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not cols:
+        return df
+    return df.astype({c: "category" for c in cols})
+
+# -----------------------------
+# Write / read
+# -----------------------------
+
+def save_table(df: pd.DataFrame, path: str, fmt: str, compression: str = DEFAULT_COMPRESSION):
+    if compression not in COMPRESSIONS[fmt]:
+        raise ValueError(f"Unsupported compression {compression!r} for {fmt}; choose from {COMPRESSIONS[fmt]}")
+    comp = None if compression == "none" else compression
+    if fmt == "parquet":
+        df.to_parquet(path, engine="pyarrow", compression=comp, index=False)
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(path, compression=comp or "uncompressed")
+    else:
+        df.to_csv(path, index=False)
+
+def save_tables(stores, orders, items, data_dir="data", fmt=DEFAULT_FORMAT, compression=DEFAULT_COMPRESSION):
+    os.makedirs(data_dir, exist_ok=True)
+    if fmt == "csv":
+        compression = "none"
+    for table, df in (("stores", stores), ("orders", orders), ("items", items)):
+        if fmt != "csv":
+            df = _dictionary_encode(df, table)
+        save_table(df, table_path(data_dir, table, fmt), fmt, compression)
+    drop_other_formats(data_dir, fmt)
+
+def drop_other_formats(data_dir: str, fmt: str):
+    # drop stale copies in other formats so detect_format can't pick them up
+    for other in FORMATS:
+        if other != fmt:
+            for table in TABLES:
+                p = table_path(data_dir, table, other)
+                if os.path.exists(p):
+                    os.remove(p)
+
+class TableWriter:
+    # Appends frames to one table file so a dataset can be written chunk by
+    # chunk in bounded memory: a row group per chunk for parquet, a record
+    # batch for feather, appended rows for csv. The file is built under a
+    # temporary name and renamed into place on close, so a half-written table
+    # is never picked up. Dictionary columns get int32 indices so every chunk
+    # shares one schema; Arrow IPC files can't swap dictionaries mid-file, so
+    # feather stores them as plain strings.
+    def __init__(self, path: str, fmt: str, table: str, compression: str = DEFAULT_COMPRESSION, columns=None):
+        if fmt == "csv":
+            compression = "none"
+        if compression not in COMPRESSIONS[fmt]:
+            raise ValueError(f"Unsupported compression {compression!r} for {fmt}; choose from {COMPRESSIONS[fmt]}")
+        self.path, self.fmt, self.table, self.columns = path, fmt, table, columns
+        self.compression = None if compression == "none" else compression
+        self.rows = 0
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._writer = self._schema = None
+
+    def _target_schema(self, schema):
+        import pyarrow as pa
+        fields = []
+        for f in schema:
+            if pa.types.is_dictionary(f.type):
+                t = pa.dictionary(pa.int32(), f.type.value_type) if self.fmt == "parquet" else f.type.value_type
+                f = f.with_type(t)
+            fields.append(f)
+        out = pa.schema(fields, metadata=schema.metadata)
+        return out if self.fmt == "parquet" else out.remove_metadata()
+
+    def write(self, df: pd.DataFrame):
+        if self.fmt == "csv":
+            df.to_csv(self._tmp, mode="a", header=self.rows == 0, index=False)
+            self.rows += len(df)
+            return
+        import pyarrow as pa
+        t = pa.Table.from_pandas(_dictionary_encode(df, self.table), preserve_index=False)
+        if self._writer is None:
+            self._schema = self._target_schema(t.schema)
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self._tmp, self._schema, compression=self.compression or "none")
+            else:
+                opts = pa.ipc.IpcWriteOptions(compression=self.compression)
+                self._writer = pa.ipc.new_file(self._tmp, self._schema, options=opts)
+        self._writer.write_table(t.cast(self._schema))
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self.rows == 0:
+            # nothing written: still leave a valid empty table behind
+            save_table(pd.DataFrame(columns=self.columns or []), self._tmp, self.fmt,
+                       self.compression or "none")
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def load_table(path: str, fmt: str, memory_map: bool = True, columns=None) -> pd.DataFrame:
+    # memory_map reads the file without a copy into Arrow. Converting with split_blocks (no
+    # consolidation) and self_destruct (each Arrow column freed once converted) keeps peak memory
+    # near one copy of the table; null-free numeric columns of an uncompressed feather file stay
+    # zero-copy views of the mapping
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=memory_map)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    if fmt == "feather":
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=memory_map)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    parse = ["Order Timestamp"] if os.path.basename(path).startswith(TABLES["orders"]) else None
+    return pd.read_csv(path, usecols=columns, parse_dates=parse)
+
+def table_columns(path: str, fmt: str) -> list:
+    # column names without reading the data
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if fmt == "feather":
+        import pyarrow as pa
+        with pa.memory_map(path) as src:
+            return pa.ipc.open_file(src).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def load_tables(data_dir="data", fmt=None, memory_map=True):
+    fmt = fmt or detect_format(data_dir)
+    if fmt is None:
+        raise FileNotFoundError(f"No complete dataset found in {data_dir!r}")
+    stores = load_table(table_path(data_dir, "stores", fmt), fmt, memory_map)
+    orders = load_table(table_path(data_dir, "orders", fmt), fmt, memory_map)
+    items = load_table(table_path(data_dir, "items", fmt), fmt, memory_map)
+    return stores, orders, items
+
+# -----------------------------
+# Partitioned layout
+# -----------------------------
+# orders/ and order_items/ are hive-partitioned as Month=YYYY-MM/Region=<region>.
+# Inside each orders file there is one row group per Channel (rows sorted by
+# time), so channel and date predicates skip row groups as well as directories.
+
+PARTITION_DIRS = {"orders": "orders", "items": "order_items"}
+PARTITION_META = "_partitions.json"
+
+def has_partitions(data_dir: str = "data") -> bool:
+    return (os.path.exists(os.path.join(data_dir, PARTITION_META))
+            and os.path.exists(table_path(data_dir, "stores", "parquet")))
+
+def item_order_positions(orders: pd.DataFrame, items: pd.DataFrame) -> np.ndarray:
+    # row position in `orders` of each item's order; generators emit items
+    # grouped in order sequence, so the common case needs no key lookup
+    if "Num Items" in orders.columns and len(items) == int(orders["Num Items"].sum()):
+        pos = np.repeat(np.arange(len(orders)), orders["Num Items"].to_numpy())
+        if np.array_equal(orders["Order ID"].to_numpy()[pos], items["Order ID"].to_numpy()):
+            return pos
+    first = pd.Series(np.arange(len(orders)), index=orders["Order ID"].to_numpy())
+    first = first[~first.index.duplicated()]
+    return first.reindex(items["Order ID"].to_numpy()).fillna(-1).to_numpy(dtype=np.int64)
+
+def _partition_schema():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("Month", pa.string()), ("Region", pa.string())]), flavor="hive")
+
+def _write_partition(df: pd.DataFrame, path: str, compression: str, group_col=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    comp = None if compression == "none" else compression
+    with pq.ParquetWriter(path, table.schema, compression=comp) as writer:
+        if group_col is None:
+            writer.write_table(table)
+            return
+        keys = df[group_col].to_numpy()
+        bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        for a, b in zip(np.r_[0, bounds], np.r_[bounds, len(df)]):
+            writer.write_table(table.slice(a, b - a))
+
+def _write_partition_meta(data_dir, orders: pd.DataFrame, items: pd.DataFrame, merge=False):
+    meta_path = os.path.join(data_dir, PARTITION_META)
+    ts = orders["Order Timestamp"]
+    meta = {
+        "min_ts": str(ts.min()) if len(ts) else None,
+        "max_ts": str(ts.max()) if len(ts) else None,
+        "regions": sorted(map(str, orders["Region"].dropna().unique())),
+        "channels": sorted(map(str, orders["Channel"].dropna().unique())),
+        "orders_columns": list(orders.columns),
+        "items_columns": list(items.columns),
+    }
+    if merge and os.path.exists(meta_path):
+        with open(meta_path) as fh:
+            old = json.load(fh)
+        if old.get("min_ts"):
+            meta["min_ts"] = min(filter(None, [old["min_ts"], meta["min_ts"]]))
+            meta["max_ts"] = max(filter(None, [old["max_ts"], meta["max_ts"]]))
+        meta["regions"] = sorted(set(old["regions"]) | set(meta["regions"]))
+        meta["channels"] = sorted(set(old["channels"]) | set(meta["channels"]))
+    with open(meta_path, "w") as fh:
+        json.dump(meta, fh, indent=2)
+
+def save_partitioned(stores, orders, items, data_dir="data", compression=DEFAULT_COMPRESSION,
+                     part="part-0", replace=True, write_meta=True):
+    if compression not in COMPRESSIONS["parquet"]:
+        raise ValueError(f"Unsupported compression {compression!r} for parquet; choose from {COMPRESSIONS['parquet']}")
+    os.makedirs(data_dir, exist_ok=True)
+    if replace:
+        for sub in PARTITION_DIRS.values():
+            shutil.rmtree(os.path.join(data_dir, sub), ignore_errors=True)
+    if stores is not None:
+        save_table(_dictionary_encode(stores, "stores"), table_path(data_dir, "stores", "parquet"), "parquet", compression)
+
+    month = orders["Order Timestamp"].dt.strftime("%Y-%m").to_numpy()
+    region = orders["Region"].astype(str).to_numpy()
+    item_pos = item_order_positions(orders, items)
+    o = _dictionary_encode(orders, "orders")
+    it = _dictionary_encode(items, "items")
+    o_groups = pd.DataFrame({"m": month, "r": region}).groupby(["m", "r"], sort=True).indices
+    i_groups = pd.DataFrame({"m": month[item_pos], "r": region[item_pos]}).groupby(["m", "r"], sort=True).indices
+    for (m, r), idx in o_groups.items():
+        sub = (o.iloc[idx].drop(columns="Region")
+                .sort_values(["Channel", "Order Timestamp"], kind="stable"))
+        path = os.path.join(data_dir, PARTITION_DIRS["orders"], f"Month={m}", f"Region={r}", f"{part}.parquet")
+        _write_partition(sub, path, compression, group_col="Channel")
+    for (m, r), idx in i_groups.items():
+        path = os.path.join(data_dir, PARTITION_DIRS["items"], f"Month={m}", f"Region={r}", f"{part}.parquet")
+        _write_partition(it.iloc[idx], path, compression)
+    if write_meta:
+        _write_partition_meta(data_dir, orders, items, merge=not replace)
+
+def refresh_partition_meta(data_dir: str = "data"):
+    # rebuild the bounds/columns summary from what is actually on disk
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    orders_ds = ds.dataset(os.path.join(data_dir, PARTITION_DIRS["orders"]), format="parquet",
+                           partitioning=_partition_schema())
+    items_ds = ds.dataset(os.path.join(data_dir, PARTITION_DIRS["items"]), format="parquet",
+                          partitioning=_partition_schema())
+    t = orders_ds.to_table(columns=["Order Timestamp", "Channel", "Region"])
+    bounds = pc.min_max(t["Order Timestamp"]).as_py() if t.num_rows else {"min": None, "max": None}
+    meta = {
+        "min_ts": str(pd.Timestamp(bounds["min"])) if bounds["min"] is not None else None,
+        "max_ts": str(pd.Timestamp(bounds["max"])) if bounds["max"] is not None else None,
+        "regions": sorted(map(str, pc.unique(t["Region"].combine_chunks()).to_pylist())),
+        "channels": sorted(map(str, pc.unique(t["Channel"].combine_chunks().cast("string")).to_pylist())),
+        "orders_columns": [c for c in orders_ds.schema.names if c != "Month"],
+        "items_columns": [c for c in items_ds.schema.names if c not in ("Month", "Region")],
+    }
+    # partition columns come last in the dataset schema; put Region back where generate() has it
+    cols = [c for c in meta["orders_columns"] if c != "Region"]
+    meta["orders_columns"] = cols[:2] + ["Region"] + cols[2:]
+    with open(os.path.join(data_dir, PARTITION_META), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    return meta
+
+def load_partition_meta(data_dir: str = "data") -> dict:
+    with open(os.path.join(data_dir, PARTITION_META)) as fh:
+        return json.load(fh)
+
+def _partition_filter(start=None, end=None, regions=None):
+    import pyarrow.dataset as ds
+    expr = ds.scalar(True)
+    if start is not None:
+        expr &= ds.field("Month") >= pd.Timestamp(start).strftime("%Y-%m")
+    if end is not None:
+        expr &= ds.field("Month") <= pd.Timestamp(end).strftime("%Y-%m")
+    if regions:
+        expr &= ds.field("Region").isin([str(r) for r in regions])
+    return expr
+
+def load_partitioned(data_dir="data", start=None, end=None, regions=None, channels=None):
+    # reads only the Month/Region directories and Channel row groups the filters
+    # can match; an empty regions/channels list means "no filter", like the app
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    meta = load_partition_meta(data_dir)
+    part_expr = _partition_filter(start, end, regions)
+    expr = part_expr
+    if start is not None:
+        expr &= ds.field("Order Timestamp") >= pa.scalar(pd.Timestamp(start).to_pydatetime(), pa.timestamp("ns"))
+    if end is not None:
+        stop = (pd.Timestamp(end) + pd.Timedelta(days=1)).to_pydatetime()
+        expr &= ds.field("Order Timestamp") < pa.scalar(stop, pa.timestamp("ns"))
+    if channels:
+        expr &= ds.field("Channel").isin([str(c) for c in channels])
+
+    orders_ds = ds.dataset(os.path.join(data_dir, PARTITION_DIRS["orders"]), format="parquet",
+                           partitioning=_partition_schema())
+    orders = orders_ds.to_table(filter=expr).to_pandas()
+    orders = orders.sort_values("Order Timestamp", kind="stable").reset_index(drop=True)
+    orders = orders[[c for c in meta["orders_columns"] if c in orders.columns]]
+
+    items_ds = ds.dataset(os.path.join(data_dir, PARTITION_DIRS["items"]), format="parquet",
+                          partitioning=_partition_schema())
+    ids = pa.array(orders["Order ID"].astype(str).unique())
+    items = items_ds.to_table(filter=part_expr & ds.field("Order ID").isin(ids)).to_pandas()
+    items = items[[c for c in meta["items_columns"] if c in items.columns]]
+    return orders, items
+
+# -----------------------------
+# CSV -> columnar converter
+# -----------------------------
+
+def convert_csv_dir(data_dir="data", fmt=DEFAULT_FORMAT, compression=DEFAULT_COMPRESSION):
+    if fmt == "csv":
+        raise ValueError("Target format must be columnar (parquet or feather)")
+    stores, orders, items = load_tables(data_dir, fmt="csv")
+    save_tables(stores, orders, items, data_dir=data_dir, fmt=fmt, compression=compression)
+    return stores, orders, items
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a CSV data directory to columnar storage.")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--format", default="parquet", choices=["parquet", "feather"])
+    parser.add_argument("--compression", default=DEFAULT_COMPRESSION)
+    args = parser.parse_args(argv)
+    stores, orders, items = convert_csv_dir(args.data_dir, fmt=args.format, compression=args.compression)
+    print(f"Converted {len(stores):,} stores, {len(orders):,} orders, {len(items):,} items "
+          f"in {args.data_dir} to {args.format} ({args.compression})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Starbucks_Stores.py
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Store leaderboard
+# -----------------------------
+# Built once per dataset from the store cube (Starbucks_Rollup), never from
+# orders. The cube is collapsed over Daypart to Date x Store x Channel and
+# kept as arrays sorted by date, so a date range is two searchsorted calls
+# and the per-store totals for any filter are one np.bincount per measure
+# over that slice; cost follows stores x days, not orders. Ranking a
+# metric is an argpartition over the stores plus a sort of the K winners.
+#
+# For the drill-down the full cube is also regrouped CSR-style by store:
+# store i's rows are offsets[i]:offsets[i+1], already in date order.
+
+STORE_METRICS = ["Revenue", "Margin %", "AOV", "Avg Wait Time (mins)"]
+LEADERBOARD_K = 10
+
+def top_k(values: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    # positions of the k largest (or smallest) non-NaN values, best first
+    valid = np.flatnonzero(~np.isnan(values))
+    v = values[valid] if not largest else -values[valid]
+    if len(v) > k:
+        part = np.argpartition(v, k - 1)[:k]
+        return valid[part[np.argsort(v[part], kind="stable")]]
+    return valid[np.argsort(v, kind="stable")]
+
+def top_stores(totals: pd.DataFrame, by: str = "Revenue", k: int = LEADERBOARD_K, largest: bool = True,
+               min_orders: int = 1) -> pd.DataFrame:
+    # totals: StoreBoard.totals(); stores below min_orders aren't ranked
+    values = totals[by].to_numpy(dtype=np.float64).copy()
+    values[totals["Orders"].to_numpy() < min_orders] = np.nan
+    out = totals.iloc[top_k(values, k, largest)].reset_index(drop=True)
+    out.insert(0, "Rank", np.arange(1, len(out) + 1))
+    return out
+
+class StoreBoard:
+    def __init__(self, store_cube: pd.DataFrame, stores: pd.DataFrame):
+        self.stores = stores.reset_index(drop=True)
+        self.store_index = pd.Index(self.stores["Store ID"])
+        self.region, regions = pd.factorize(self.stores["Region"].to_numpy(dtype=object))
+        self.regions = pd.Index(regions)
+        cube = store_cube.assign(_store=self.store_index.get_indexer(store_cube["Store ID"]))
+        cube = cube[cube["_store"].to_numpy() >= 0]  # stores missing from the stores table aren't ranked
+
+        daily = (cube.groupby(["Date", "_store", "Channel"], observed=True, sort=True)
+                     [["Total Amount", "Profit", "Orders"]].sum().reset_index())
+        self.dates = daily["Date"].to_numpy()
+        self.store_code = daily["_store"].to_numpy(dtype=np.int64)
+        self.channel, channels = pd.factorize(daily["Channel"].to_numpy(dtype=object))
+        self.channels = pd.Index(channels)
+        self.revenue = daily["Total Amount"].to_numpy(dtype=np.float64)
+        self.profit = daily["Profit"].to_numpy(dtype=np.float64)
+        self.orders = daily["Orders"].to_numpy(dtype=np.float64)
+
+        perm = np.argsort(cube["_store"].to_numpy(), kind="stable")
+        self.detail_rows = cube.drop(columns="_store").take(perm).reset_index(drop=True)
+        self.offsets = np.r_[0, np.cumsum(np.bincount(cube["_store"].to_numpy(), minlength=len(self.stores)))]
+
+    def __len__(self):
+        return len(self.stores)
+
+    def date_bounds(self, start=None, end=None):
+        # [lo, hi) rows covering calendar days start..end inclusive
+        lo, hi = 0, len(self.dates)
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)).astype(self.dates.dtype)))
+        if end is not None:
+            stop = np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1)).astype(self.dates.dtype)
+            hi = int(np.searchsorted(self.dates, stop))
+        return lo, max(lo, hi)
+
+    def totals(self, start=None, end=None, regions=None, channels=None) -> pd.DataFrame:
+        # one row per store in the selected regions (including stores without orders), with every metric
+        lo, hi = self.date_bounds(start, end)
+        s = self.store_code[lo:hi]
+        keep = np.isin(self.channel[lo:hi], self.channels.get_indexer(list(channels))) if channels else slice(None)
+        S = len(self.stores)
+        revenue = np.bincount(s[keep], weights=self.revenue[lo:hi][keep], minlength=S)
+        profit = np.bincount(s[keep], weights=self.profit[lo:hi][keep], minlength=S)
+        orders = np.bincount(s[keep], weights=self.orders[lo:hi][keep], minlength=S)
+        out = self.stores.assign(
+            Revenue=revenue,
+            Orders=orders.astype(np.int64),
+            Profit=profit,
+            **{"Margin %": np.divide(profit * 100, revenue, out=np.full(S, np.nan), where=revenue > 0),
+               "AOV": np.divide(revenue, orders, out=np.full(S, np.nan), where=orders > 0)},
+        )
+        if regions:
+            out = out[np.isin(self.region, self.regions.get_indexer(list(regions)))]
+        return out.reset_index(drop=True)
+
+    def store(self, store_id) -> pd.Series:
+        return self.stores.iloc[self.store_index.get_loc(store_id)]
+
+    def detail(self, store_id, start=None, end=None, channels=None) -> pd.DataFrame:
+        # the store's Date x Channel x Daypart cube rows inside the filters
+        i = self.store_index.get_loc(store_id)
+        rows = self.detail_rows.iloc[self.offsets[i]:self.offsets[i + 1]]
+        mask = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            mask &= (rows["Date"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (rows["Date"] <= pd.Timestamp(end)).to_numpy()
+        if channels:
+            mask &= rows["Channel"].isin(channels).to_numpy()
+        return rows[mask]
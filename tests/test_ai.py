@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from Starbucks_AI import InsightsService, InsightsCache, OpenAIClient, serve_stub, stub_reply, build_messages
+
+pytest.importorskip("openai")
+
+FACTS = {"revenue": 1234.5, "orders": 100, "aov": 12.35, "gross_margin_pct": 61.0,
+         "top_channels": {"Mobile Order": 700.0}}
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(delay=0.0):
+        server = serve_stub(delay=delay)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def _service(base_url, cache_dir, timeout=10.0):
+    return InsightsService(OpenAIClient(api_key="stub", base_url=base_url), InsightsCache(str(cache_dir)),
+                           timeout=timeout)
+
+def test_streams_answer_then_serves_it_from_disk(stub, tmp_path):
+    service = _service(stub(delay=0.05), tmp_path)
+    job = service.submit(FACTS)
+    assert not job.cached
+    while not job.text and not job.done.is_set():
+        time.sleep(0.01)
+    assert not job.done.is_set()  # partial text is visible while the rest streams in
+    assert job.result(10) == stub_reply(build_messages(FACTS))
+
+    again = service.submit(FACTS)
+    assert again.cached and again.done.is_set()
+    assert again.text == job.text
+    # a new process (new service, same cache dir) pays nothing either
+    fresh = _service("http://127.0.0.1:9/v1", tmp_path)
+    assert fresh.cached(FACTS).text == job.text
+
+def test_repeated_submits_share_one_request(stub, tmp_path):
+    service = _service(stub(delay=0.02), tmp_path)
+    first, second = service.submit(FACTS), service.submit(FACTS)
+    assert first is second
+    first.result(10)
+    assert not first.cached
+
+def test_slow_stream_times_out_and_is_not_cached(stub, tmp_path):
+    service = _service(stub(delay=0.2), tmp_path, timeout=0.5)
+    t0 = time.monotonic()
+    job = service.submit(FACTS)
+    assert job.done.wait(5)
+    assert time.monotonic() - t0 < 2
+    assert job.error
+    assert service.cached(FACTS) is None
+
+def test_stalled_stream_times_out_between_chunks(stub, tmp_path):
+    # one word every 3s: the request timeout fires before a second chunk arrives
+    service = _service(stub(delay=3.0), tmp_path, timeout=0.5)
+    t0 = time.monotonic()
+    job = service.submit(FACTS)
+    assert job.done.wait(5)
+    assert time.monotonic() - t0 < 2
+    assert job.error
+
+def test_missing_client_reports_key(tmp_path):
+    job = InsightsService(None, InsightsCache(str(tmp_path))).submit(FACTS)
+    assert "API key" in job.result(5)
@@ -0,0 +1,37 @@
+from collections import Counter
+from itertools import combinations
+
+import pandas as pd
+import pytest
+
+from Starbucks_Basket import Basket, BASKET_LEVELS
+from Starbucks_Faker import generate
+
+@pytest.fixture(scope="module")
+def items():
+    _, _, items = generate(start="2024-10-21", days=10, stores=12, avg_orders=300, seed=6)
+    return items
+
+def _brute_force(items, level):
+    pairs, support = Counter(), Counter()
+    for _, values in items.groupby("Order ID", sort=False)[level]:
+        basket = sorted(set(values.dropna()))
+        support.update(basket)
+        pairs.update(combinations(basket, 2))
+    return pairs, support
+
+@pytest.mark.parametrize("level", BASKET_LEVELS)
+def test_pair_counts_match_brute_force(items, level):
+    bk = Basket.from_items(items, level)
+    pairs, support = _brute_force(items, level)
+    assert dict(bk.pairs.items()) == dict(pairs)
+    assert dict(bk.support[bk.support > 0].items()) == dict(support)
+    assert bk.orders == items["Order ID"].nunique()
+
+def test_baskets_add_up_across_slices(items):
+    ids = items["Order ID"].drop_duplicates()
+    first = items["Order ID"].isin(ids.iloc[: len(ids) // 2])
+    merged = Basket.from_items(items[first], "Subcategory") + Basket.from_items(items[~first], "Subcategory")
+    whole = Basket.from_items(items, "Subcategory")
+    pd.testing.assert_series_equal(merged.pairs.sort_index(), whole.pairs.sort_index())
+    assert merged.orders == whole.orders
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Features import add_derived_features
+from Starbucks_Forecast import StoreForecast, _design, TEMP_WINDOW
+from Starbucks_Rollup import build_store_cube
+
+@pytest.fixture(scope="module")
+def store_cube():
+    _, orders, items = generate(start="2024-10-21", days=70, stores=8, avg_orders=400, seed=12)
+    return build_store_cube(add_derived_features(orders, items))
+
+def _lstsq_one(cube, store, horizon):
+    # the same model for one store, fitted directly on its (day, daypart) slots
+    first = cube["Date"].min()
+    D = int((cube["Date"].max() - first).days) + 1
+    dayparts = np.sort(cube["Daypart"].unique())
+    P = len(dayparts)
+    c = cube[cube["Store ID"] == store]
+    d = ((c["Date"] - first).dt.days).to_numpy()
+    p = np.searchsorted(dayparts, c["Daypart"].to_numpy())
+    y = np.zeros(D * P)
+    np.add.at(y, d * P + p, c["Total Amount"].to_numpy())
+
+    per_day = c.groupby(d)[["Temperature (C)", "Orders"]].sum()
+    t_day = np.zeros(D)
+    seen = np.zeros(D, dtype=bool)
+    t_day[per_day.index] = per_day["Temperature (C)"] / per_day["Orders"]
+    seen[per_day.index] = True
+    t_mean = per_day["Temperature (C)"].sum() / per_day["Orders"].sum()
+    z = np.where(seen, t_day - t_mean, 0.0)
+
+    X = np.column_stack([_design(first, np.arange(D), P, D), np.repeat(z, P)])
+    coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+    rss = float(((y - X @ coef) ** 2).sum())
+    sigma = np.sqrt(rss / (D * P - X.shape[1]) * P)
+    z_future = z[-TEMP_WINDOW:].sum() / max(seen[-TEMP_WINDOW:].sum(), 1)
+    fc = (_design(first, np.arange(D, D + horizon), P, D) @ coef[:-1]).reshape(horizon, P).sum(axis=1)
+    return coef, sigma, fc + coef[-1] * P * z_future
+
+def test_batched_fit_matches_lstsq_per_store(store_cube):
+    fc = StoreForecast.fit(store_cube, horizon=14)
+    for i in (0, len(fc.stores) - 1):
+        coef, sigma, forecast = _lstsq_one(store_cube, fc.stores[i], 14)
+        np.testing.assert_allclose(fc.coef[i], coef, rtol=1e-3, atol=1e-2)
+        assert fc.sigma[i] == pytest.approx(sigma, rel=1e-3)
+        np.testing.assert_allclose(fc.forecast[i], forecast, rtol=1e-3)
+
+def test_frames_sum_the_selected_stores(store_cube):
+    fc = StoreForecast.fit(store_cube, channels=["In-Store", "Drive-Thru"], horizon=14)
+    region = fc.regions[0]
+    frame = fc.frame(regions=[region])
+    in_region = fc.regions == region
+    np.testing.assert_allclose(frame["Forecast"].dropna().to_numpy(), fc.forecast[in_region].sum(axis=0))
+    assert (frame["Lower"].dropna() <= frame["Forecast"].dropna()).all()
+    stores = fc.store_frame([region])
+    assert set(stores["Store ID"]) == set(fc.stores[in_region])
+    assert fc.frame(regions=["Atlantis"]) is None
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Index import FilterIndex, sort_for_index
+
+FILTERS = [
+    (None, None, [], []),
+    ("2024-10-25", "2024-11-05", [], []),
+    ("2024-10-25", "2024-11-05", ["West", "South"], ["In-Store", "Mobile Order"]),
+    ("2024-11-10", "2024-11-10", ["Midwest"], []),
+    (None, "2024-10-28", [], ["Delivery"]),
+    ("2024-11-01", None, ["Northeast"], ["Drive-Thru"]),
+    ("2024-12-01", "2024-12-31", [], []),          # after the data
+    ("2024-11-05", "2024-11-01", [], []),          # end before start
+    ("2024-10-25", "2024-11-05", ["Atlantis"], []),  # unknown value
+]
+
+@pytest.fixture(scope="module")
+def tables():
+    _, orders, items = generate(start="2024-10-21", days=28, stores=24, avg_orders=400, seed=9)
+    return orders, items
+
+@pytest.fixture(scope="module", params=["unsorted", "presorted"])
+def index(request, tables):
+    orders, items = tables
+    if request.param == "presorted":
+        orders, items = sort_for_index(orders, items)
+    return FilterIndex(orders, items)
+
+def _mask(orders, start, end, regions, channels):
+    ts = orders["Order Timestamp"]
+    m = np.ones(len(orders), dtype=bool)
+    if start is not None:
+        m &= (ts >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        m &= (ts < pd.Timestamp(end) + pd.Timedelta(days=1)).to_numpy()
+    if regions:
+        m &= orders["Region"].isin(regions).to_numpy()
+    if channels:
+        m &= orders["Channel"].isin(channels).to_numpy()
+    return m
+
+def _ids(df):
+    return sorted(df["Order ID"])
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_positions_match_boolean_mask(tables, index, q):
+    orders, _ = tables
+    want = orders[_mask(orders, *q)]
+    got = index.take(index.positions(q[0], q[1], Region=q[2], Channel=q[3]))
+    assert _ids(got) == _ids(want)
+    assert got["Order Timestamp"].is_monotonic_increasing
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_take_items_matches_isin_join(tables, index, q):
+    orders, items = tables
+    ids = orders.loc[_mask(orders, *q), "Order ID"]
+    want = items[items["Order ID"].isin(ids)]
+    pos = index.positions(q[0], q[1], Region=q[2], Channel=q[3])
+    got = index.take_items(pos)
+    assert len(got) == len(want)
+    key = ["Order ID", "Line Item"]
+    pd.testing.assert_frame_equal(got.sort_values(key).reset_index(drop=True),
+                                  want.sort_values(key).reset_index(drop=True))
+    # items come grouped in the order of the selected orders
+    assert list(dict.fromkeys(got["Order ID"])) == list(index.take(pos)["Order ID"])
+
+def test_item_rows_for_slices_and_arrays(index):
+    n = len(index)
+    assert index.item_rows(slice(0, n)) == slice(0, len(index.items))
+    assert index.item_rows(slice(5, 5)) == slice(int(index.offsets[5]), int(index.offsets[5]))
+    pos = np.array([0, 3, 4, n - 1])
+    want = np.concatenate([np.arange(index.offsets[p], index.offsets[p + 1]) for p in pos])
+    np.testing.assert_array_equal(index.item_rows(pos), want)
+    assert len(index.item_rows(np.array([], dtype=np.int64))) == 0
@@ -0,0 +1,46 @@
+import os
+import glob
+import shutil
+
+import pandas as pd
+import pytest
+
+import Starbucks_Manifest as manifest
+from Starbucks_Manifest import sync_dataset, plan_sync, SHARD_PARTS
+from Starbucks_Stats import load_moments, merge_moments
+
+PARAMS = {"start": "2024-10-21", "stores": 12, "avg_orders": 240, "seed": 7}
+
+def _parts(data_dir, sub):
+    return {os.path.basename(p): pd.read_parquet(p)
+            for p in sorted(glob.glob(os.path.join(data_dir, sub, "*.parquet")))}
+
+@pytest.mark.parametrize("added", SHARD_PARTS)
+def test_new_artifact_backfills_old_shards(tmp_path, monkeypatch, added):
+    old, fresh = str(tmp_path / "old"), str(tmp_path / "fresh")
+    # a directory synced before `added` existed: keys without it and no part files
+    os.makedirs(os.path.join(old, added))  # sync still writes every artifact; dropped below
+    with monkeypatch.context() as m:
+        m.setattr(manifest, "SHARD_PARTS", [p for p in SHARD_PARTS if p != added])
+        sync_dataset(old, days=14, **PARAMS)
+    shutil.rmtree(os.path.join(old, added))
+
+    sync_dataset(old, days=21, **PARAMS)
+    sync_dataset(fresh, days=21, **PARAMS)
+    for sub in SHARD_PARTS:
+        got, want = _parts(old, sub), _parts(fresh, sub)
+        assert got.keys() == want.keys()
+        for name in want:
+            pd.testing.assert_frame_equal(got[name], want[name])
+    pd.testing.assert_frame_equal(merge_moments(load_moments(old)).corr(), merge_moments(load_moments(fresh)).corr())
+
+def test_missing_part_file_regenerates_shard(tmp_path):
+    data_dir = str(tmp_path)
+    sync_dataset(data_dir, days=14, **PARAMS)
+    lost = sorted(glob.glob(os.path.join(data_dir, SHARD_PARTS[-1], "*.parquet")))[0]
+    os.remove(lost)
+    _, missing, _ = plan_sync(data_dir, days=14, **PARAMS)
+    assert missing == [os.path.basename(lost)[:-len(".parquet")]]
+    sync_dataset(data_dir, days=14, **PARAMS)
+    assert os.path.exists(lost)
+    assert plan_sync(data_dir, days=14, **PARAMS)[1:] == ([], [])
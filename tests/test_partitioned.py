@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Storage import save_partitioned, load_partitioned
+
+pytest.importorskip("pyarrow")
+
+FILTERS = [
+    (None, None, [], []),
+    ("2024-10-28", "2024-11-12", [], []),            # crosses a Month partition boundary
+    ("2024-10-28", "2024-11-12", ["West"], ["Mobile Order", "Delivery"]),
+    ("2024-11-03", "2024-11-03", [], ["In-Store"]),
+    ("2024-12-01", "2024-12-31", [], []),            # no partitions at all
+    (None, None, ["Atlantis"], []),
+]
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    stores, orders, items = generate(start="2024-10-21", days=35, stores=16, avg_orders=300, seed=4)
+    data_dir = str(tmp_path_factory.mktemp("partitioned"))
+    save_partitioned(stores, orders, items, data_dir)
+    return data_dir, orders, items
+
+def _plain(df, key):
+    # partitions come back dictionary-encoded and in partition order; compare values
+    out = df.astype({c: str for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])
+                     and not pd.api.types.is_datetime64_any_dtype(df[c])})
+    return out.sort_values(key).reset_index(drop=True)[sorted(df.columns)]
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_pushdown_matches_full_load_and_mask(dataset, q):
+    data_dir, orders, items = dataset
+    start, end, regions, channels = q
+    ts = orders["Order Timestamp"]
+    m = np.ones(len(orders), dtype=bool)
+    if start is not None:
+        m &= (ts >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        m &= (ts < pd.Timestamp(end) + pd.Timedelta(days=1)).to_numpy()
+    if regions:
+        m &= orders["Region"].isin(regions).to_numpy()
+    if channels:
+        m &= orders["Channel"].isin(channels).to_numpy()
+    want_o = orders[m]
+    want_i = items[items["Order ID"].isin(want_o["Order ID"])]
+
+    got_o, got_i = load_partitioned(data_dir, start, end, regions, channels)
+    assert len(got_o) == len(want_o) and len(got_i) == len(want_i)
+    assert got_o["Order Timestamp"].is_monotonic_increasing
+    if len(want_o):
+        pd.testing.assert_frame_equal(_plain(got_o, ["Order ID"]), _plain(want_o, ["Order ID"]),
+                                      check_dtype=False)
+        pd.testing.assert_frame_equal(_plain(got_i, ["Order ID", "Line Item"]),
+                                      _plain(want_i, ["Order ID", "Line Item"]), check_dtype=False)
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Features import add_derived_features
+from Starbucks_Storage import save_tables
+from Starbucks_Index import FilterIndex
+from Starbucks_Query import PandasBackend
+
+duckdb = pytest.importorskip("duckdb")
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    from Starbucks_Query import DuckDBBackend
+    stores, orders, items = generate(start="2024-10-21", days=21, stores=12, avg_orders=300, seed=3)
+    orders = add_derived_features(orders, items)
+    data_dir = str(tmp_path_factory.mktemp("data"))
+    save_tables(stores, orders, items, data_dir=data_dir, fmt="parquet")
+    index = FilterIndex(orders, items)
+
+    def select_rows(start, end, regions, channels):
+        pos = index.positions(start, end, Region=regions, Channel=channels)
+        return index.take(pos), index.take_items(pos), None
+    return PandasBackend(select_rows), DuckDBBackend(data_dir)
+
+FILTER = ("2024-10-25", "2024-11-05", ["West", "South"], ["In-Store", "Mobile Order"])
+
+@pytest.mark.parametrize("level", ["Subcategory", "Size"])
+def test_duckdb_basket_matches_pandas(backends, level):
+    pd_sel, db_sel = (b.select(*FILTER) for b in backends)
+    want, got = pd_sel.basket(level), db_sel.basket(level)
+    assert got.orders == want.orders
+    pd.testing.assert_series_equal(got.support.sort_index(), want.support.sort_index(), check_names=False)
+    pd.testing.assert_series_equal(got.pairs.sort_index(), want.pairs.sort_index(), check_names=False)
+
+def test_duckdb_preview_is_limited(backends):
+    pd_sel, db_sel = (b.select(*FILTER) for b in backends)
+    got, want = db_sel.preview(50), pd_sel.preview(50)
+    assert len(got) == 50
+    # same first rows by time; orders sharing a timestamp may come back in either order
+    assert got["Order Timestamp"].tolist() == want["Order Timestamp"].tolist()
+
+def test_duckdb_corr_sample_stays_close(backends):
+    pd_sel, db_sel = (b.select(*FILTER) for b in backends)
+    exact, note = db_sel.corr()
+    assert note == ""
+    pd.testing.assert_frame_equal(exact, pd_sel.corr()[0], atol=1e-9)
+    n = len(pd_sel.f)
+    assert db_sel.corr(n)[1] == ""
+    sampled, note = db_sel.corr(n // 2)
+    half = float(note.split("±")[1].split()[0])
+    assert f"sample of {n // 2:,} orders" in note
+    assert (sampled - exact).abs().to_numpy().max() <= half
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Features import add_derived_features
+from Starbucks_Rollup import build_cube, build_category_cube, slice_cube, cube_kpis, merge_cubes
+
+FILTERS = [
+    (None, None, [], []),
+    ("2024-10-25", "2024-11-05", [], []),
+    ("2024-10-25", "2024-11-05", ["West", "South"], ["In-Store", "Mobile Order"]),
+    ("2024-11-10", "2024-11-10", [], ["Delivery"]),
+    ("2024-12-01", "2024-12-31", [], []),
+]
+
+@pytest.fixture(scope="module")
+def tables():
+    _, orders, items = generate(start="2024-10-21", days=28, stores=24, avg_orders=400, seed=2)
+    return add_derived_features(orders, items), items
+
+def _mask(orders, start, end, regions, channels):
+    ts = orders["Order Timestamp"]
+    m = np.ones(len(orders), dtype=bool)
+    if start is not None:
+        m &= (ts >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        m &= (ts < pd.Timestamp(end) + pd.Timedelta(days=1)).to_numpy()
+    if regions:
+        m &= orders["Region"].isin(regions).to_numpy()
+    if channels:
+        m &= orders["Channel"].isin(channels).to_numpy()
+    return m
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_slice_kpis_match_raw_rows(tables, q):
+    orders, _ = tables
+    got = cube_kpis(slice_cube(build_cube(orders), *q))
+    f = orders[_mask(orders, *q)]
+    revenue = float(f["Total Amount"].sum())
+    assert got["orders"] == f["Order ID"].nunique()
+    assert got["revenue"] == pytest.approx(revenue)
+    assert got["aov"] == pytest.approx(revenue / max(len(f), 1))
+    assert got["gross_margin_pct"] == pytest.approx(f["Profit"].sum() / revenue * 100 if revenue else 0.0)
+
+def test_merged_parts_equal_single_cube(tables):
+    orders, _ = tables
+    cut = orders["Order Timestamp"] < pd.Timestamp("2024-11-04")
+    merged = merge_cubes([build_cube(orders[cut]), build_cube(orders[~cut]), build_cube(orders.iloc[:0])])
+    whole = build_cube(orders)
+    pd.testing.assert_frame_equal(merged[whole.columns], whole, check_dtype=False)
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_category_cube_matches_item_rows(tables, q):
+    orders, items = tables
+    sl = slice_cube(build_category_cube(orders, items), *q)
+    f = orders[_mask(orders, *q)]
+    fi = items.merge(f[["Order ID", "Profit"]], on="Order ID")
+    line = fi["Price"] * fi["Quantity"]
+    want = pd.DataFrame({"Category": fi["Category"], "Revenue": line,
+                         "Profit": fi["Profit"] * line / line.groupby(fi["Order ID"]).transform("sum"),
+                         "Quantity": fi["Quantity"]}).groupby("Category").sum()
+    got = sl.groupby("Category", observed=True)[["Revenue", "Profit", "Quantity"]].sum()
+    pd.testing.assert_frame_equal(got.sort_index(), want[got.columns].sort_index(), check_dtype=False,
+                                  check_names=False)
+    # allocation keeps every order's profit
+    assert sl["Profit"].sum() == pytest.approx(f["Profit"].sum())
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Index import FilterIndex, sort_for_index
+from Starbucks_Shared import SharedDataset, DatasetHandle
+
+@pytest.fixture(scope="module")
+def dataset():
+    stores, orders, items = generate(start="2024-10-21", days=14, stores=10, avg_orders=200, seed=5)
+    orders, items = sort_for_index(orders, items)
+    return SharedDataset("v1", orders, items, stores)
+
+def test_shared_frames_refuse_writes(dataset):
+    orders = dataset.orders
+    with pytest.raises(TypeError):
+        orders["Total Amount"] = 0.0
+    with pytest.raises(TypeError):
+        orders.loc[0, "Total Amount"] = -1
+    with pytest.raises(TypeError):
+        orders.iloc[0, 0] = None
+    with pytest.raises(TypeError):
+        orders.drop(columns="Total Amount", inplace=True)
+    with pytest.raises(ValueError):
+        orders["Total Amount"].to_numpy()[0] = -1  # the buffers themselves are read-only
+    # a copy is a plain frame again
+    own = orders.copy()
+    own.loc[0, "Total Amount"] = -1
+    assert orders["Total Amount"].iloc[0] != -1
+
+def test_index_over_snapshot_does_not_copy(dataset):
+    index = dataset.derived("filter index", lambda ds: FilterIndex(ds.orders, ds.items))
+    assert index is dataset.derived("filter index", lambda ds: pytest.fail("built twice"))
+    assert index.orders is dataset.orders and index.items is dataset.items
+    assert np.shares_memory(index.orders["Total Amount"].to_numpy(), dataset.orders["Total Amount"].to_numpy())
+    with pytest.raises(TypeError):
+        index.orders.loc[0, "Total Amount"] = -1
+
+def _snapshot(version: int) -> SharedDataset:
+    n = 1000
+    orders = pd.DataFrame({"Order ID": np.arange(n), "v": version})
+    items = pd.DataFrame({"Order ID": np.repeat(np.arange(n), 2), "v": version})
+    return SharedDataset(str(version), orders, items, pd.DataFrame({"v": [version]}))
+
+def test_swap_never_mixes_versions():
+    handle = DatasetHandle()
+    handle.swap(_snapshot(0))
+    stop, seen, mixed = threading.Event(), set(), []
+
+    def reader():
+        while not stop.is_set():
+            ds = handle.current()  # a rerun reads the pointer once
+            orders, items, stores, _ = ds.tables()
+            versions = {int(orders["v"].iloc[-1]), int(items["v"].iloc[-1]), int(stores["v"].iloc[0])}
+            if versions != {int(ds.version)}:
+                mixed.append(versions)
+            seen.add(int(ds.version))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for v in range(1, 50):
+        old = handle.swap(_snapshot(v))
+        assert old.version == str(v - 1)  # the old snapshot is untouched for readers still holding it
+        assert int(old.orders["v"].iloc[0]) == v - 1
+    stop.set()
+    for t in threads:
+        t.join()
+    assert not mixed
+    assert handle.current().version == "49" and seen
+
+def test_ensure_loads_a_version_once():
+    handle, calls = DatasetHandle(), []
+
+    def loader(version):
+        calls.append(version)
+        return _snapshot(int(version))
+
+    threads = [threading.Thread(target=handle.ensure, args=("3", loader)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["3"]
+    assert handle.ensure("4", loader).version == "4" and calls == ["3", "4"]
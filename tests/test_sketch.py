@@ -0,0 +1,116 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Cache import approx_bytes
+from Starbucks_Faker import generate
+from Starbucks_Features import add_derived_features
+from Starbucks_Query import PandasBackend
+from Starbucks_Sketch import (bit_length, registers, build_sketch, merge_sketches, sketch_count, sketch_counts_at,
+                              slice_sketch, sketch_precision, approx_nunique_by, precision_for, standard_error,
+                              HLL_ERROR, SKETCH_KEYS)
+
+PRECISION = 12
+
+@pytest.fixture(scope="module")
+def orders():
+    _, orders, items = generate(start="2024-10-21", days=28, stores=40, avg_orders=300, seed=11)
+    return add_derived_features(orders, items)
+
+def test_bit_length_is_exact_above_float_precision():
+    values = [0, 1, 2, 3, 2**52 + 1, 2**53 - 1, 2**53, 2**53 + 1, 2**60 - 1, 2**63, 2**64 - 1]
+    got = bit_length(np.array(values, dtype=np.uint64))
+    assert got.tolist() == [v.bit_length() for v in values]
+
+def test_rank_counts_leading_zeros():
+    width = 64 - PRECISION
+    rest = [1, 2**width - 1, 2**(width - 1), 2**(width - 1) - 1, 0]
+    hashes = np.array([(5 << width) | r for r in rest], dtype=np.uint64)
+    reg, rank = registers(hashes, PRECISION)
+    assert reg.tolist() == [5] * len(rest)
+    assert rank.tolist() == [width - r.bit_length() + 1 for r in rest]
+
+def _best(fn, n=5):
+    best = float("inf")
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def test_sketch_count_within_error(orders):
+    sk = build_sketch(orders, precision=PRECISION)
+    exact = orders["Order ID"].nunique()
+    assert abs(sketch_count(sk) - exact) / exact < 3 * standard_error(PRECISION)
+    assert list(sk.columns[:len(SKETCH_KEYS)]) == SKETCH_KEYS
+    assert sketch_precision(sk) == PRECISION
+
+def test_default_precision_beats_exact_count():
+    # the scale where nunique starts to hurt: 150 stores, ~2,740 orders a day for ten weeks
+    _, orders, _ = generate(start="2024-10-21", days=72, stores=150, avg_orders=2_740, seed=1)
+    sk = build_sketch(orders)
+    p = precision_for(HLL_ERROR)
+    assert sketch_precision(sk) == p
+    exact = orders["Order ID"].nunique()
+    assert abs(sketch_count(sk) - exact) / exact < 3 * standard_error(p)
+    # one row per month x region x channel, a fraction of the ids it stands for
+    assert len(sk) <= 3 * 4 * 4
+    assert approx_bytes(sk) * 5 < approx_bytes(orders[["Order ID"]])
+    assert _best(lambda: sketch_count(sk)) * 5 < _best(lambda: orders["Order ID"].nunique())
+
+def test_monthly_counts_within_error(orders):
+    sk = build_sketch(orders, precision=PRECISION)
+    starts = pd.date_range("2024-10-01", periods=2, freq="MS")
+    got = sketch_counts_at(sk, starts)
+    month = orders["Order Timestamp"].dt.month
+    exact = orders.groupby(month, sort=True)["Order ID"].nunique().to_numpy()
+    assert np.all(np.abs(got - exact) / exact < 3 * standard_error(PRECISION))
+
+def test_slice_needs_whole_buckets(orders):
+    sk = build_sketch(orders, precision=PRECISION)
+    first, last = orders["Order Timestamp"].min(), orders["Order Timestamp"].max()
+    assert len(slice_sketch(sk, first, last)) == len(sk)
+    # a range that cuts through a month can't be answered from the sketch
+    assert slice_sketch(sk, first, "2024-11-05") is None
+    # whole months and any region / channel filter can
+    west = slice_sketch(sk, "2024-11-01", last, ["West"], ["Mobile Order"])
+    exact = orders[(orders["Order Timestamp"] >= "2024-11-01") & (orders["Region"] == "West")
+                   & (orders["Channel"] == "Mobile Order")]["Order ID"].nunique()
+    assert len(west) == 1
+    assert abs(sketch_count(west) - exact) / exact < 3 * standard_error(PRECISION)
+
+def test_backend_counts_exactly_when_sketch_cannot_answer(orders):
+    sk = build_sketch(orders, precision=PRECISION)
+
+    def select_rows(start, end, regions, channels):
+        ts = orders["Order Timestamp"]
+        f = orders[(ts >= pd.Timestamp(start)) & (ts < pd.Timestamp(end) + pd.Timedelta(days=1))]
+        return f, None, None
+    backend = PandasBackend(select_rows, sketch=sk)
+    full = backend.select(orders["Order Timestamp"].min(), orders["Order Timestamp"].max())
+    assert full.sketch is not None
+    part = backend.select("2024-10-25", "2024-11-05")
+    assert part.sketch is None
+    assert part.kpis()["orders"] == part.orders()["Order ID"].nunique()
+
+def test_merged_shards_equal_single_build(orders):
+    whole = build_sketch(orders, precision=PRECISION)
+    cut = orders["Order Timestamp"] < pd.Timestamp("2024-11-04")
+    parts = [build_sketch(orders[cut], precision=PRECISION),
+             build_sketch(orders[~cut], precision=PRECISION),
+             build_sketch(orders.sample(frac=0.3, random_state=0), precision=PRECISION)]  # overlapping ids
+    merged = merge_sketches(parts)
+    pd.testing.assert_frame_equal(merged, whole)
+    assert sketch_count(merged) == sketch_count(whole)
+    with pytest.raises(ValueError):
+        merge_sketches([whole, build_sketch(orders, precision=PRECISION + 1)])
+
+def test_approx_nunique_by_within_error():
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, 50_000, size=200_000)
+    codes = ids % 3
+    got = approx_nunique_by(ids, codes, 3, precision=PRECISION)
+    exact = pd.Series(ids).groupby(codes).nunique().to_numpy()
+    assert np.all(np.abs(got - exact) / exact < 3 * standard_error(PRECISION))
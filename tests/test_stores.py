@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Starbucks_Faker import generate
+from Starbucks_Rollup import build_store_cube
+from Starbucks_Stores import StoreBoard, top_stores, STORE_METRICS
+
+FILTERS = [
+    (None, None, [], []),
+    ("2024-10-25", "2024-11-05", [], []),
+    ("2024-10-25", "2024-11-05", ["West", "South"], ["In-Store", "Mobile Order"]),
+    ("2024-11-10", "2024-11-10", [], ["Delivery"]),
+    ("2024-12-01", "2024-12-31", [], []),
+]
+
+@pytest.fixture(scope="module")
+def tables():
+    stores, orders, _ = generate(start="2024-10-21", days=28, stores=40, avg_orders=200, seed=5)
+    return stores, orders, StoreBoard(build_store_cube(orders), stores)
+
+def _raw_totals(stores, orders, start, end, regions, channels):
+    ts = orders["Order Timestamp"]
+    m = np.ones(len(orders), dtype=bool)
+    if start is not None:
+        m &= (ts >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        m &= (ts < pd.Timestamp(end) + pd.Timedelta(days=1)).to_numpy()
+    if channels:
+        m &= orders["Channel"].isin(channels).to_numpy()
+    g = orders[m].groupby("Store ID").agg(Revenue=("Total Amount", "sum"), Orders=("Order ID", "size"),
+                                         Profit=("Profit", "sum"))
+    out = stores.set_index("Store ID").join(g).fillna({"Revenue": 0.0, "Orders": 0, "Profit": 0.0})
+    if regions:
+        out = out[out["Region"].isin(regions)]
+    return out
+
+@pytest.mark.parametrize("q", FILTERS)
+def test_totals_match_raw_groupby(tables, q):
+    stores, orders, board = tables
+    got = board.totals(*q).set_index("Store ID")
+    want = _raw_totals(stores, orders, *q)
+    assert list(got.index) == list(want.index)
+    np.testing.assert_allclose(got["Revenue"], want["Revenue"])
+    np.testing.assert_allclose(got["Profit"], want["Profit"])
+    np.testing.assert_array_equal(got["Orders"], want["Orders"])
+
+@pytest.mark.parametrize("by", STORE_METRICS)
+@pytest.mark.parametrize("largest", [True, False])
+@pytest.mark.parametrize("k,min_orders", [(10, 1), (3, 15), (100, 1)])
+def test_top_stores_matches_sort_head(tables, by, largest, k, min_orders):
+    _, _, board = tables
+    totals = board.totals("2024-10-25", "2024-11-05", channels=["Drive-Thru"])
+    got = top_stores(totals, by, k, largest, min_orders)
+    want = (totals[(totals["Orders"] >= min_orders) & totals[by].notna()]
+            .sort_values(by, ascending=not largest).head(k))
+    # ties may come back in either order, so compare the ranked values
+    np.testing.assert_allclose(got[by], want[by])
+    assert list(got["Rank"]) == list(range(1, len(want) + 1))
+    assert (got["Orders"] >= min_orders).all()